@@ -11,11 +11,20 @@ import json
 from datetime import datetime
 
 # Import utility functions
+from utils.bootstrap import apply_theme
+from utils.metrics import span
+from utils.session_memory import manage_session_memory
 from utils.api_connector import setup_gemini, is_valid_api_key_format
 from utils.audio_utils import generate_audio, get_download_link, split_text_into_chunks
-from utils.image_utils import generate_image_descriptions, generate_placeholder_images
-from utils.text_utils import get_explanation, generate_study_notes, generate_summary
-from utils.storage import save_session, load_session, get_session_list
+from utils.image_utils import generate_placeholder_images
+from utils.api_connector import get_session_service
+from utils.storage import save_session, load_session, session_exists, save_user_preferences
+from utils.preferences import preference, FONT_SIZES
+from utils.pipeline import generate_learning_materials, pregenerated_session_id, TOPIC_TYPES, DETAIL_LEVELS
+from utils.search_index import search_sessions, highlight_markdown, find_matches
+from utils.events import record_event, EVENT_GENERATION, EVENT_AUDIO_PLAY
+from utils.review_scheduler import add_topic
+from utils.retention import start_retention_worker
 
 # Set page configuration
 st.set_page_config(
@@ -25,6 +34,12 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Periodic retention and index compaction for this server process (idempotent)
+start_retention_worker()
+
+# Bring back the heavy state this page reads; evict the rest if over the ceiling
+manage_session_memory(needed=("explanation", "notes", "summary", "images", "text_chunks"))
+
 # Initialize session state variables
 if 'explanation' not in st.session_state:
     st.session_state.explanation = ""
@@ -36,43 +51,16 @@ if 'audio_file' not in st.session_state:
     st.session_state.audio_file = None
 if 'images' not in st.session_state:
     st.session_state.images = []
-if 'gemini_model' not in st.session_state:
-    st.session_state.gemini_model = None
+if 'gemini_api_key' not in st.session_state:
+    st.session_state.gemini_api_key = None
 if 'api_configured' not in st.session_state:
     st.session_state.api_configured = False
 if 'user_id' not in st.session_state:
     st.session_state.user_id = f"user_{int(time.time())}"
 if 'study_history' not in st.session_state:
     st.session_state.study_history = []
-if 'dark_mode' not in st.session_state:
-    st.session_state.dark_mode = False
-if 'font_size' not in st.session_state:
-    st.session_state.font_size = "medium"
-
-# Apply theme based on dark_mode setting
-if st.session_state.dark_mode:
-    st.markdown("""
-    <style>
-        .main {background-color: #1E1E1E; color: #FFFFFF;}
-        .stTextInput > div > div > input {background-color: #2E2E2E; color: #FFFFFF;}
-        .stSelectbox > div > div > select {background-color: #2E2E2E; color: #FFFFFF;}
-    </style>
-    """, unsafe_allow_html=True)
-
-# Apply font size
-font_size_map = {
-    "small": "0.9rem",
-    "medium": "1rem",
-    "large": "1.2rem",
-    "x-large": "1.5rem"
-}
-st.markdown(f"""
-<style>
-    .main p, .main li {{
-        font-size: {font_size_map[st.session_state.font_size]};
-    }}
-</style>
-""", unsafe_allow_html=True)
+# Apply the user's theme and font size (also loads their preferences into the session)
+apply_theme()
 
 
 # Main app UI
@@ -105,7 +93,7 @@ def main():
     # Sidebar for settings and navigation
     with st.sidebar:
         st.header("Settings")
-        api_key = ""
+        api_key = os.environ.get("GEMINI_API_KEY", "")
         if api_key and is_valid_api_key_format(api_key):
             if st.button("Connect API") or not st.session_state.api_configured:
                 api_configured = setup_gemini(api_key)
@@ -118,12 +106,17 @@ def main():
 
         # Quick settings in sidebar
         st.subheader("Quick Settings")
-        st.session_state.dark_mode = st.toggle("Dark Mode", st.session_state.dark_mode)
-        st.session_state.font_size = st.select_slider(
+        prefs = st.session_state.preferences
+        dark_mode = st.toggle("Dark Mode", prefs["theme"] == "Dark")
+        font_size = st.select_slider(
             "Font Size",
-            options=["small", "medium", "large", "x-large"],
-            value=st.session_state.font_size
+            options=list(FONT_SIZES),
+            value=prefs["font_size"]
         )
+        if dark_mode != (prefs["theme"] == "Dark") or font_size != prefs["font_size"]:
+            # Saved like any other preference, so the Settings page and other tabs follow
+            save_user_preferences({"theme": "Dark" if dark_mode else "Light", "font_size": font_size})
+            st.rerun()
 
         # Recent topics section
         if st.session_state.study_history:
@@ -131,7 +124,21 @@ def main():
             for i, topic_data in enumerate(st.session_state.study_history[-5:]):
                 if st.button(f"📚 {topic_data['topic']}", key=f"recent_{i}"):
                     load_session(topic_data['session_id'])
-                    st.experimental_rerun()
+                    st.rerun()
+
+        # Full-text search across every saved session
+        st.subheader("Search Study Materials")
+        history_query = st.text_input("Search all saved topics, notes and summaries:", key="search_history")
+        if history_query:
+            hits = search_sessions(history_query, st.session_state.user_id, limit=10)
+            if not hits:
+                st.info("No saved materials match your search.")
+            for i, hit in enumerate(hits):
+                st.markdown(f"**{hit['topic']}** ({hit['date']})")
+                st.caption(highlight_markdown(hit['snippet'], hit['highlights']))
+                if st.button("Open", key=f"search_hit_{i}"):
+                    load_session(hit['session_id'])
+                    st.rerun()
 
     # Main input area
     st.header("What would you like to learn about today?")
@@ -142,8 +149,8 @@ def main():
         topic = st.text_input("Enter a topic, chapter, or book title:")
 
     with col2:
-        topic_type = st.selectbox("Learning Type", ["Topic", "Chapter", "Book"], index=0)
-        detail_level = st.selectbox("Detail Level", ["basic", "medium", "advanced"], index=1)
+        topic_type = st.selectbox("Learning Type", TOPIC_TYPES, index=0)
+        detail_level = st.selectbox("Detail Level", DETAIL_LEVELS, index=1)
 
     # Process button
     if st.button("Generate Learning Materials") and topic and st.session_state.api_configured:
@@ -152,34 +159,49 @@ def main():
         # Create a session ID for this learning session
         session_id = f"{st.session_state.user_id}_{int(time.time())}"
 
-        with st.spinner("Generating your personalized learning materials..."):
-            # Generate explanation
-            st.session_state.explanation = get_explanation(topic, detail_level)
+        # Topics pre-warmed by pregenerate.py load instantly from storage
+        pregenerated_id = pregenerated_session_id(topic, topic_type, detail_level)
+        use_pregenerated = session_exists(pregenerated_id)
 
-            if st.session_state.explanation:
-                # Generate study notes and summary
-                st.session_state.notes = generate_study_notes(topic, st.session_state.explanation)
-                st.session_state.summary = generate_summary(topic, st.session_state.explanation)
-
-                # Generate image descriptions and create placeholder images
-                image_descriptions = generate_image_descriptions(topic, st.session_state.explanation, 3)
+        with st.spinner("Generating your personalized learning materials..."):
+            if use_pregenerated:
+                session_id = pregenerated_id
+                load_session(session_id)
+                session_data = None
+            else:
+                session_data, errors = generate_learning_materials(
+                    get_session_service(), topic, topic_type, detail_level, num_images=3, num_questions=5)
+                for stage, error in errors.items():
+                    st.error(f"Error generating {stage.replace('_', ' ')}: {error}")
+
+                st.session_state.explanation = session_data.get('explanation', '')
+                st.session_state.notes = session_data.get('notes', '')
+                st.session_state.summary = session_data.get('summary', '')
+                st.session_state.quiz_text = session_data.get('quiz', '')
+
+            if st.session_state.explanation and session_data:
+                # Create placeholder images from the generated descriptions
+                image_descriptions = session_data['image_descriptions']
                 st.session_state.images = generate_placeholder_images(image_descriptions)
                 st.session_state.image_descriptions = image_descriptions
 
                 # Generate audio for the explanation
                 text = st.session_state.explanation
                 text_chunks = split_text_into_chunks(text)
+                st.session_state.audio_files = []
 
                 if len(text_chunks) == 1:
-                    st.session_state.audio_file = generate_audio(text, "en-US", 1.0)
+                    st.session_state.audio_file = generate_audio(text, "en-US", preference("speech_speed"))
                     st.session_state.has_multiple_chunks = False
                 else:
                     # For longer text, only generate audio for the first chunk
                     first_chunk = text_chunks[0]
-                    st.session_state.audio_file = generate_audio(first_chunk, "en-US", 1.0)
+                    st.session_state.audio_file = generate_audio(first_chunk, "en-US", preference("speech_speed"))
                     st.session_state.text_chunks = text_chunks
                     st.session_state.has_multiple_chunks = True
 
+            if st.session_state.explanation:
+
                 # Save to study history
                 topic_data = {
                     "topic": topic,
@@ -193,17 +215,13 @@ def main():
                 if not any(d['topic'] == topic for d in st.session_state.study_history):
                     st.session_state.study_history.append(topic_data)
 
+                record_event(st.session_state.user_id, EVENT_GENERATION, topic=topic,
+                             topic_type=topic_type, detail_level=detail_level)
+                add_topic(st.session_state.user_id, topic, session_id)
+
                 # Save session
-                save_session(session_id, {
-                    "topic": topic,
-                    "topic_type": topic_type,
-                    "explanation": st.session_state.explanation,
-                    "notes": st.session_state.notes,
-                    "summary": st.session_state.summary,
-                    "image_descriptions": image_descriptions,
-                    "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                    "detail_level": detail_level
-                })
+                if session_data:
+                    save_session(session_id, session_data)
 
     # Display results if available
     if st.session_state.explanation:
@@ -216,10 +234,9 @@ def main():
             # Add a search function for the explanation
             search_term = st.text_input("Search in explanation:", key="search_explanation")
             if search_term:
-                highlighted_text = st.session_state.explanation.replace(
-                    search_term, f"**{search_term}**"
-                )
-                st.markdown(highlighted_text)
+                matches = find_matches(st.session_state.explanation, search_term)
+                st.caption(f"{len(matches)} match(es) found")
+                st.markdown(highlight_markdown(st.session_state.explanation, matches))
             else:
                 st.markdown(st.session_state.explanation)
 
@@ -228,12 +245,15 @@ def main():
                                          height=100, key="selected_text")
             if selected_text and st.button("Listen to Selected Text"):
                 with st.spinner("Generating audio..."):
-                    selected_audio = generate_audio(selected_text, "en-US", 1.0)
+                    selected_audio = generate_audio(selected_text, "en-US", preference("speech_speed"))
                     st.audio(selected_audio)
+                    record_event(st.session_state.user_id, EVENT_AUDIO_PLAY,
+                                 topic=st.session_state.current_topic, source="selection")
 
         with tab2:
             st.subheader("Audio Narration")
-            if st.session_state.audio_file:
+            # Narration files are swept once unused, so a long-idle session may have lost its file
+            if st.session_state.audio_file and os.path.exists(st.session_state.audio_file):
                 st.audio(st.session_state.audio_file)
                 st.markdown(get_download_link(st.session_state.audio_file, "Download Audio File"),
                             unsafe_allow_html=True)
@@ -253,9 +273,15 @@ def main():
 
                     if st.button("Generate Audio for Selected Part"):
                         with st.spinner(f"Generating audio for {chunk_options[selected_chunk_index]}..."):
-                            chunk_text = st.session_state.text_chunks[selected_chunk_index]
-                            st.session_state.audio_file = generate_audio(chunk_text, "en-US", 1.0)
-                            st.experimental_rerun()
+                            audio_files = st.session_state.get('audio_files') or []
+                            if selected_chunk_index < len(audio_files):
+                                st.session_state.audio_file = audio_files[selected_chunk_index]
+                            else:
+                                chunk_text = st.session_state.text_chunks[selected_chunk_index]
+                                st.session_state.audio_file = generate_audio(chunk_text, "en-US", preference("speech_speed"))
+                            record_event(st.session_state.user_id, EVENT_AUDIO_PLAY,
+                                         topic=st.session_state.current_topic, part=selected_chunk_index + 1)
+                            st.rerun()
 
         with tab3:
             st.subheader("Visual Aids")
@@ -318,4 +344,5 @@ def main():
 
 # Run the app
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("page.run", page="home"):
+        main()
\ No newline at end of file
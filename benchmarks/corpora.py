@@ -0,0 +1,89 @@
+# benchmarks/corpora.py - Deterministic synthetic inputs for the benchmark suite
+#
+# Everything is generated from a seeded RNG so two runs (and two machines)
+# benchmark exactly the same data.
+
+import os
+import json
+import random
+
+WORDS = (
+    "energy matrix vector cell protein force motion light wave system equation function theory "
+    "process structure reaction element value model network signal pressure current field "
+    "particle orbit population market memory language history culture balance growth"
+).split()
+
+
+def synthetic_explanation(kilobytes, seed=0):
+    """Explanation-like text of roughly `kilobytes` KB, in paragraphs of 3-6 sentences"""
+    rng = random.Random(seed)
+    target = kilobytes * 1024
+    paragraphs, size = [], 0
+    while size < target:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:target]
+
+
+def well_formed_quiz(num_questions, seed=0):
+    """Quiz text in exactly the format quiz_prompt() asks for"""
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(1, num_questions + 1):
+        options = [" ".join(rng.choice(WORDS) for _ in range(5)) for _ in range(4)]
+        blocks.append(
+            f"Q{i}: What is the role of {rng.choice(WORDS)} in {rng.choice(WORDS)} theory?\n"
+            f"A. {options[0]}\nB. {options[1]}\nC. {options[2]}\nD. {options[3]}\n"
+            f"Correct Answer: {'ABCD'[rng.randrange(4)]}"
+        )
+    return "\n\n".join(blocks)
+
+
+def malformed_quiz(num_questions, kind, seed=0):
+    """Quiz text with the defects models actually produce"""
+    text = well_formed_quiz(num_questions, seed)
+    if kind == "missing_answers":
+        # Answer lines dropped: the parser must scan to the end for every question
+        return "\n".join(line for line in text.splitlines() if not line.startswith("Correct Answer"))
+    if kind == "markdown":
+        # Bold question labels and lettered options in parentheses
+        return text.replace("Q", "**Q").replace("A. ", "(A) ").replace("B. ", "(B) ")
+    if kind == "truncated":
+        return text[:len(text) * 2 // 3]
+    if kind == "prose":
+        return synthetic_explanation(max(1, num_questions // 2), seed)
+    raise ValueError(f"unknown malformed quiz kind: {kind}")
+
+
+MALFORMED_KINDS = ("missing_answers", "markdown", "truncated", "prose")
+
+
+def session_payload(index, explanation_kb=2, seed=0):
+    """One saved-session dict shaped like the ones app.py writes"""
+    rng = random.Random(seed * 1000003 + index)
+    topic = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {index}"
+    explanation = synthetic_explanation(explanation_kb, seed + index)
+    return {
+        "topic": topic,
+        "topic_type": rng.choice(["Topic", "Concept", "Question", "Text"]),
+        "explanation": explanation,
+        "notes": explanation[:512],
+        "summary": explanation[:256],
+        "image_descriptions": [f"Diagram {i} of {topic}" for i in range(1, 4)],
+        "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 10:00",
+        "detail_level": "medium",
+    }
+
+
+def write_session_files(directory, count, explanation_kb=1, seed=0):
+    """Populate a user_sessions directory directly (bypassing indexing) with `count` sessions"""
+    os.makedirs(directory, exist_ok=True)
+    existing = sum(1 for name in os.listdir(directory) if name.endswith(".json"))
+    for index in range(existing, count):
+        with open(os.path.join(directory, f"bench_{index:06d}.json"), "w") as f:
+            json.dump(session_payload(index, explanation_kb, seed), f)
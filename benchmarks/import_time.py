@@ -0,0 +1,82 @@
+# benchmarks/import_time.py - Cold-start import report for the app and every page
+#
+# Usage:
+#     python benchmarks/import_time.py            # all entry scripts
+#     python benchmarks/import_time.py app.py -n 20
+#
+# Each script is executed in a fresh interpreter with `python -X importtime`
+# (Streamlit runs in bare mode, so no server is needed). The report shows the
+# wall time until the script finished and the slowest imports by cumulative time.
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCRIPTS = ["app.py"] + sorted(
+    os.path.join("pages", name) for name in os.listdir(os.path.join(ROOT, "pages")) if name.endswith(".py")
+)
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (module, self_us, cumulative_us, depth) tuples"""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def measure_script(script):
+    """Run one entry script in a fresh interpreter and collect its import timings"""
+    code = (
+        "import runpy, sys; "
+        f"sys.path.insert(0, {ROOT!r}); "
+        f"runpy.run_path({os.path.join(ROOT, script)!r}, run_name='__main__')"
+    )
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    return {
+        "script": script,
+        "wall_seconds": wall,
+        "returncode": proc.returncode,
+        "imports": parse_importtime(proc.stderr),
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else ""
+    }
+
+
+def format_report(result, top):
+    """Format the slowest top-level imports for one script"""
+    imports = result["imports"]
+    total_ms = sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000
+    lines = [f"{result['script']}: {result['wall_seconds'] * 1000:.0f} ms wall, {total_ms:.0f} ms importing"]
+    if result["returncode"]:
+        lines.append(f"  exited with {result['returncode']}: {result['error']}")
+    for module, _, cumulative, _ in sorted(
+            (entry for entry in imports if entry[3] == 0), key=lambda entry: -entry[2])[:top]:
+        lines.append(f"  {cumulative / 1000:9.1f} ms  {module}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report cold-start import time of the app pages")
+    parser.add_argument("scripts", nargs="*", default=DEFAULT_SCRIPTS)
+    parser.add_argument("-n", "--top", type=int, default=10, help="number of slowest imports to list")
+    args = parser.parse_args()
+
+    for script in args.scripts:
+        print(format_report(measure_script(script), args.top))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# benchmarks/load_test.py - Simulated classroom load against a local Streamlit server
+#
+# Usage:
+#     python benchmarks/load_test.py --students 1,4,8,16
+#     python benchmarks/load_test.py --students 20 --model-latency 1.5 --tts-latency 0.5 --json report.json
+#
+# The harness starts the app on a free port through benchmarks/stub_server.py,
+# which replaces Gemini and gTTS with StubModel/StubTTS at the given latencies,
+# and with a scratch data directory. Each simulated student is a websocket client
+# speaking Streamlit's browser protocol: it sends the same rerun requests and
+# widget states a browser would and waits for the script run to finish.
+#
+# A student repeatedly generates a topic, takes the quiz on it, asks the tutor a
+# question and reloads the session from the sidebar. The report gives p50/p95/p99
+# per action, server RSS per connected session and throughput at each
+# concurrency level; the ceiling is the level after which adding students stops
+# adding throughput.
+#
+# Streamlit's AppTest is not used because it swaps process-wide singletons on
+# every run, so sessions cannot run concurrently in one process.
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A well-formed dummy key so the app connects; every call goes to the stub backend
+STUB_API_KEY = "AIza" + "LoadTestStubKey" * 3
+
+TOPICS = [
+    "Photosynthesis", "Newton's laws of motion", "Eigenvalues and eigenvectors", "The French Revolution",
+    "Supply and demand", "Cell division", "Plate tectonics", "Recursion", "Chemical equilibrium",
+    "The water cycle", "Probability distributions", "Electromagnetic induction",
+]
+CHAT_QUESTIONS = [
+    "Can you explain the key idea again in simpler words?",
+    "What is a real-world example of this?",
+    "What mistakes do students usually make here?",
+]
+
+ACTIONS = ("generate", "quiz_create", "quiz_answer", "chat", "load_session")
+
+# Minimum throughput gain (relative) for a higher concurrency level to count as scaling
+SCALING_GAIN = 0.10
+
+
+class PageError(Exception):
+    """The page raised an exception or did not show what the student expected"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, env, log_path, model_latency, tts_latency, timeout=60):
+    """Start the app on the stub backends and wait until its health check passes"""
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "stub_server.py"),
+         "--model-latency", str(model_latency), "--tts-latency", str(tts_latency),
+         "--server.headless", "true", "--server.port", str(port), "--server.address", "127.0.0.1",
+         "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with {process.returncode}; see {log_path}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"server did not become healthy within {timeout}s; see {log_path}")
+
+
+def process_rss(pid):
+    """Resident set size of a process in bytes (Linux)"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(-(-q * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class BrowserSession:
+    """Minimal Streamlit websocket client: reruns the script and records the elements it draws"""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+        self.pages = {}
+        self.page_hash = ""
+        self.elements = []
+        self.exceptions = []
+        self.values = {}
+
+    async def connect(self):
+        import websockets
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, widgets=(), page=None):
+        """Send a rerun request and wait for the script to finish.
+
+        `widgets` are extra WidgetState protos for this run (e.g. a button
+        trigger); text values set earlier are re-sent like a browser does.
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        if page is not None:
+            self.page_hash = self.pages[page]
+            self.values.clear()
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = self.page_hash
+        for widget_id, value in self.values.items():
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id, state.string_value = widget_id, value
+        for state in widgets:
+            message.rerun_script.widget_states.widgets.add().CopyFrom(state)
+        await self.ws.send(message.SerializeToString())
+
+        elements, exceptions = {}, []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind in ("new_session", "navigation"):
+                info = getattr(forward, kind)
+                if info.app_pages:
+                    self.pages = {page.page_name: page.page_script_hash for page in info.app_pages}
+                self.page_hash = info.page_script_hash
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                elements[tuple(forward.metadata.delta_path)] = element
+                if element.WhichOneof("type") == "exception":
+                    exceptions.append(f"{element.exception.type}: {element.exception.message}")
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun(): the server starts the next run by itself
+                    elements, exceptions = {}, []
+                    continue
+                break
+        self.elements = [elements[path] for path in sorted(elements)]
+        self.exceptions = exceptions
+        if exceptions:
+            raise PageError(exceptions[0].splitlines()[0][:200])
+
+    def widget(self, kind, label=None, prefix=None):
+        for element in self.elements:
+            if element.WhichOneof("type") != kind:
+                continue
+            proto = getattr(element, kind)
+            text = getattr(proto, "label", "") or getattr(proto, "placeholder", "")
+            if label is None and prefix is None or text == label or (prefix and text.startswith(prefix)):
+                return proto
+        raise PageError(f"{kind} not found: {label or prefix}")
+
+    def labels(self, kind):
+        return [getattr(element, kind).label for element in self.elements if element.WhichOneof("type") == kind]
+
+    async def click(self, label=None, prefix=None):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        button = self.widget("button", label, prefix)
+        if button.disabled:
+            raise PageError(f"button is disabled: {button.label}")
+        await self.rerun([WidgetState(id=button.id, trigger_value=True)])
+
+    def set_text(self, label_prefix, value):
+        self.values[self.widget("text_input", prefix=label_prefix).id] = value
+
+    async def chat(self, text):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        chat_input = self.widget("chat_input")
+        state = WidgetState(id=chat_input.id)
+        state.chat_input_value.data = text
+        await self.rerun([state])
+
+
+class Student:
+    """One simulated student working through the study loop"""
+
+    def __init__(self, index, url, rng, timeout):
+        self.index = index
+        self.rng = rng
+        self.session = BrowserSession(url, timeout)
+
+    async def start(self):
+        await self.session.connect()
+        await self.session.rerun()
+
+    async def generate(self):
+        topic = f"{self.rng.choice(TOPICS)} ({self.index}-{self.rng.randrange(10**6)})"
+        await self.session.rerun(page="app")
+        self.session.set_text("Enter a topic", topic)
+        await self.session.click("Generate Learning Materials")
+        if "Generate Audio for Selected Part" not in self.session.labels("button") and \
+                not any(element.WhichOneof("type") == "audio" for element in self.session.elements):
+            raise PageError("no learning materials were shown")
+
+    async def quiz_create(self):
+        await self.session.rerun(page="Interactive Quizzes")
+        await self.session.click("Create Quiz from Current Topic")
+
+    async def quiz_answer(self):
+        """Answer every question and finish the quiz"""
+        for _ in range(20):
+            await self.session.click(prefix=f"{self.rng.choice('ABCD')}. ")
+            labels = self.session.labels("button")
+            if "Next Question ➡️" in labels:
+                await self.session.click("Next Question ➡️")
+            elif "Finish Quiz" in labels:
+                await self.session.click("Finish Quiz")
+                return
+            else:
+                raise PageError("quiz has no next or finish button")
+        raise PageError("quiz did not finish")
+
+    async def chat(self):
+        await self.session.rerun(page="Learning Chat")
+        await self.session.chat(self.rng.choice(CHAT_QUESTIONS))
+
+    async def load_session(self):
+        await self.session.rerun(page="app")
+        await self.session.click(prefix="📚 ")
+
+
+async def run_student(index, url, iterations, think_time, timeout, seed, samples, errors, ready, release):
+    rng = random.Random(seed * 7919 + index)
+    student = Student(index, url, rng, timeout)
+    try:
+        await student.start()
+    except Exception as e:
+        errors.setdefault("connect", {}).setdefault(f"{type(e).__name__}: {e}", 0)
+        errors["connect"][f"{type(e).__name__}: {e}"] += 1
+        ready.set_result(None) if not ready.done() else None
+        return
+
+    for _ in range(iterations):
+        for action in ACTIONS:
+            start = time.perf_counter()
+            try:
+                await getattr(student, action)()
+                samples.setdefault(action, []).append(time.perf_counter() - start)
+            except Exception as e:
+                message = f"{type(e).__name__}: {e}".splitlines()[0][:200]
+                errors.setdefault(action, {}).setdefault(message, 0)
+                errors[action][message] += 1
+                if action == "generate":
+                    # Nothing else in this iteration works without a topic
+                    break
+            if think_time:
+                await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+    # Stay connected until every student is done, so RSS covers all live sessions
+    ready.set_result(None) if not ready.done() else None
+    await release.wait()
+    await student.session.close()
+
+
+async def run_level(url, server_pid, students, iterations, think_time, timeout, seed):
+    """Run one concurrency level and summarise it"""
+    samples, errors = {}, {}
+    release = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    readies = [loop.create_future() for _ in range(students)]
+    rss_before = process_rss(server_pid)
+
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(run_student(i, url, iterations, think_time, timeout, seed,
+                                               samples, errors, readies[i], release))
+             for i in range(students)]
+    await asyncio.gather(*readies)
+    wall = time.perf_counter() - started
+    rss_after = process_rss(server_pid)
+    release.set()
+    await asyncio.gather(*tasks)
+
+    actions = {}
+    for action in ACTIONS:
+        values = sorted(samples.get(action, []))
+        actions[action] = {
+            "count": len(values),
+            "errors": sum(errors.get(action, {}).values()),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "mean_ms": round(statistics.fmean(values) * 1000, 1) if values else 0.0,
+        }
+    completed = sum(len(values) for values in samples.values())
+    return {
+        "students": students,
+        "wall_seconds": round(wall, 2),
+        "actions_completed": completed,
+        "throughput_per_second": round(completed / wall, 2) if wall else 0.0,
+        "server_rss_bytes": rss_after,
+        "rss_per_session_bytes": max(0, rss_after - rss_before) // students,
+        "actions": actions,
+        "errors": errors,
+    }
+
+
+def find_ceiling(levels):
+    """Highest concurrency level that still added at least SCALING_GAIN throughput"""
+    ceiling = levels[0]
+    for previous, level in zip(levels, levels[1:]):
+        if level["throughput_per_second"] < previous["throughput_per_second"] * (1 + SCALING_GAIN):
+            break
+        ceiling = level
+    return {"students": ceiling["students"], "throughput_per_second": ceiling["throughput_per_second"]}
+
+
+def format_level(level):
+    lines = [f"\n{level['students']} students: {level['actions_completed']} actions in {level['wall_seconds']}s "
+             f"({level['throughput_per_second']}/s), server RSS {level['server_rss_bytes'] / 2**20:.0f} MiB, "
+             f"{level['rss_per_session_bytes'] / 2**10:.0f} KiB per session"]
+    lines.append(f"  {'action':14s} {'count':>6s} {'errors':>6s} {'p50':>10s} {'p95':>10s} {'p99':>10s}")
+    for action, stats in level["actions"].items():
+        lines.append(f"  {action:14s} {stats['count']:6d} {stats['errors']:6d} {stats['p50_ms']:8.1f}ms "
+                     f"{stats['p95_ms']:8.1f}ms {stats['p99_ms']:8.1f}ms")
+    for action, messages in level["errors"].items():
+        for message, count in messages.items():
+            lines.append(f"  ! {action}: {count}x {message}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app with simulated students")
+    parser.add_argument("--students", default="1,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=2, help="study loops per student")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between actions (seconds)")
+    parser.add_argument("--model-latency", type=float, default=0.5, help="mean stub Gemini latency (seconds)")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="stub TTS latency (seconds)")
+    parser.add_argument("--rpm", type=int, default=6000,
+                        help="client-side Gemini requests per minute (the app default is 60 per key)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-run timeout (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        sys.exit("The load test needs the 'websockets' package (pip install websockets)")
+
+    scratch = tempfile.mkdtemp(prefix="learnmate_load_")
+    env = dict(os.environ,
+               TMPDIR=scratch,
+               GEMINI_API_KEY=STUB_API_KEY,
+               GEMINI_REQUESTS_PER_MINUTE=str(args.rpm))
+    port = free_port()
+    log_path = os.path.join(scratch, "server.log")
+    server = start_server(port, env, log_path, args.model_latency, args.tts_latency)
+    print(f"server pid {server.pid} on port {port}; data and log in {scratch}")
+
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    levels = []
+    try:
+        for students in (int(value) for value in args.students.split(",")):
+            level = asyncio.run(run_level(url, server.pid, students, args.iterations, args.think_time,
+                                          args.timeout, args.seed))
+            levels.append(level)
+            print(format_level(level), flush=True)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    report = {"config": vars(args), "levels": levels, "ceiling": find_ceiling(levels)}
+    print(f"\nthroughput ceiling: {report['ceiling']['throughput_per_second']}/s "
+          f"at {report['ceiling']['students']} concurrent students")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
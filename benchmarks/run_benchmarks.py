@@ -0,0 +1,299 @@
+# benchmarks/run_benchmarks.py - Micro-benchmarks for the hot utility paths
+#
+# Usage:
+#     python benchmarks/run_benchmarks.py                    # default scales
+#     python benchmarks/run_benchmarks.py --full             # adds 1000 KB texts and 100k sessions
+#     python benchmarks/run_benchmarks.py -k quiz            # only benchmarks whose name contains "quiz"
+#     python benchmarks/run_benchmarks.py --save             # record benchmarks/baseline.json
+#     python benchmarks/run_benchmarks.py --compare          # compare against the baseline
+#
+# Inputs come from benchmarks/corpora.py; model and TTS calls go to StubModel and
+# StubTTS, and all files are written under a throwaway data directory, so a run
+# needs no network and never touches real study data. Each benchmark is timed
+# over several rounds after a warm-up; --compare checks the fastest round (the
+# least noisy statistic on a shared machine) against the baseline.
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpora  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+EXPLANATION_KB = (1, 10, 100)
+FULL_EXPLANATION_KB = EXPLANATION_KB + (1000,)
+SESSION_COUNTS = (10, 1000, 10000)
+FULL_SESSION_COUNTS = SESSION_COUNTS + (100000,)
+
+_benchmarks = []
+
+
+def benchmark(name, params=(None,), full_params=None):
+    """Register a benchmark; the function takes a param and returns the callable to time"""
+    def decorator(setup):
+        _benchmarks.append((name, setup, tuple(params), tuple(full_params or params)))
+        return setup
+    return decorator
+
+
+def use_data_root(path):
+    """Point ensure_data_dir() (which lives under tempfile.gettempdir()) at a scratch directory"""
+    os.makedirs(path, exist_ok=True)
+    tempfile.tempdir = path
+    from utils import retrieval
+    from utils.storage import ensure_data_dir
+    # The process-wide vector index stays in the data root it was first opened in
+    retrieval._index = None
+    return ensure_data_dir()
+
+
+# --- text chunking -----------------------------------------------------------
+
+@benchmark("split_text_into_chunks", EXPLANATION_KB, FULL_EXPLANATION_KB)
+def bench_split_text(kb):
+    from utils.audio_utils import split_text_into_chunks
+    text = corpora.synthetic_explanation(kb)
+    return lambda: split_text_into_chunks(text)
+
+
+@benchmark("retrieval.chunk_text", EXPLANATION_KB, FULL_EXPLANATION_KB)
+def bench_chunk_text(kb):
+    from utils.retrieval import chunk_text
+    text = corpora.synthetic_explanation(kb)
+    return lambda: chunk_text(text)
+
+
+# --- quiz parsing ------------------------------------------------------------
+
+@benchmark("parse_quiz.well_formed", (5, 20, 100))
+def bench_parse_quiz(num_questions):
+    from utils.generation import parse_quiz
+    text = corpora.well_formed_quiz(num_questions)
+    return lambda: parse_quiz(text)
+
+
+@benchmark("parse_quiz.malformed", [f"{kind}:20" for kind in corpora.MALFORMED_KINDS])
+def bench_parse_malformed_quiz(spec):
+    from utils.generation import parse_quiz
+    kind, num_questions = spec.split(":")
+    text = corpora.malformed_quiz(int(num_questions), kind)
+    return lambda: parse_quiz(text)
+
+
+# --- image rendering ---------------------------------------------------------
+
+@benchmark("generate_placeholder_images", (1, 3))
+def bench_placeholder_images(count):
+    from utils.image_utils import generate_placeholder_images
+    descriptions = [f"A labelled diagram showing concept {i} with arrows between its parts" for i in range(count)]
+    return lambda: generate_placeholder_images(descriptions)
+
+
+# --- storage -----------------------------------------------------------------
+
+@benchmark("get_session_list", SESSION_COUNTS, FULL_SESSION_COUNTS)
+def bench_session_list(count):
+    from utils.storage import get_session_list
+    _, sessions_dir = use_data_root(os.path.join(_scratch, f"sessions_{count}"))
+    corpora.write_session_files(sessions_dir, count)
+    return get_session_list
+
+
+@benchmark("save_session", EXPLANATION_KB, FULL_EXPLANATION_KB)
+def bench_save_session(kb):
+    from utils.storage import save_session
+    payload = corpora.session_payload(0, kb)
+    session_id = f"bench_save_{kb}"
+    roots = []
+
+    def reset():
+        # Each round re-saves into fresh full-text and vector indexes, so the
+        # timing does not drift as re-saves pile up tombstoned index rows
+        if roots:
+            shutil.rmtree(roots.pop(), ignore_errors=True)
+        roots.append(tempfile.mkdtemp(prefix="save_", dir=_scratch))
+        use_data_root(roots[-1])
+        save_session(session_id, payload)
+
+    def save():
+        save_session(session_id, payload)
+
+    save.reset = reset
+    return save
+
+
+@benchmark("load_session", EXPLANATION_KB, FULL_EXPLANATION_KB)
+def bench_load_session(kb):
+    from utils.storage import save_session, load_session
+    from utils.pipeline import pregenerate_audio
+    from utils.stub_model import StubTTS
+    use_data_root(os.path.join(_scratch, "save_load"))
+    session_id = f"bench_load_{kb}"
+    payload = corpora.session_payload(0, kb)
+    # Stored narration is reused on load, so the benchmark never calls gTTS
+    payload["audio_files"] = pregenerate_audio(session_id, payload["explanation"], tts_factory=StubTTS)
+    save_session(session_id, payload)
+    return lambda: load_session(session_id)
+
+
+# --- end-to-end with the fake model and TTS ----------------------------------
+
+@benchmark("pipeline.generate_learning_materials", ("combined", "separate"))
+def bench_pipeline(mode):
+    from utils.generation import GenerationService
+    from utils.pipeline import generate_learning_materials
+    from utils.stub_model import StubModel
+    service = GenerationService(StubModel())
+    return lambda: generate_learning_materials(service, "Photosynthesis", num_images=3, num_questions=5,
+                                               combined=mode == "combined")
+
+
+@benchmark("pipeline.pregenerate_audio", (10, 100))
+def bench_pregenerate_audio(kb):
+    from utils.pipeline import pregenerate_audio
+    from utils.stub_model import StubTTS
+    use_data_root(os.path.join(_scratch, "audio"))
+    text = corpora.synthetic_explanation(kb)
+    return lambda: pregenerate_audio(f"bench_audio_{kb}", text, tts_factory=StubTTS)
+
+
+# --- runner ------------------------------------------------------------------
+
+def time_callable(fn, rounds, min_round_time):
+    """Median/min/mean seconds per call over `rounds` rounds of at least `min_round_time` each.
+
+    If fn has a `reset` attribute it is called, untimed, before the warm-up and
+    before every round.
+    """
+    reset = getattr(fn, "reset", lambda: None)
+    reset()
+    fn()  # warm-up: imports, caches, first-connect work
+    start = time.perf_counter()
+    fn()
+    single = time.perf_counter() - start
+    loops = max(1, int(min_round_time / single)) if single > 0 else 1000
+
+    samples = []
+    for _ in range(rounds):
+        reset()
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+def run(selected, full, rounds, min_round_time):
+    results = {}
+    for name, setup, params, full_params in _benchmarks:
+        for param in (full_params if full else params):
+            key = name if param is None else f"{name}[{param}]"
+            if selected and not any(pattern in key for pattern in selected):
+                continue
+            fn = setup(param)
+            results[key] = time_callable(fn, rounds, min_round_time)
+            print(f"{key:55s} {format_seconds(results[key]['median']):>12s}  "
+                  f"(min {format_seconds(results[key]['min'])}, {results[key]['loops']} loops)", flush=True)
+    return results
+
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print changes in the fastest round against a baseline; return the keys that regressed beyond threshold"""
+    regressions = []
+    print(f"\n{'benchmark':55s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for key, current in results.items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            print(f"{key:55s} {'-':>12s} {format_seconds(current['min']):>12s} {'new':>8s}")
+            continue
+        change = current["min"] / previous["min"] - 1 if previous["min"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:55s} {format_seconds(previous['min']):>12s} {format_seconds(current['min']):>12s} "
+              f"{change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    global _scratch
+    parser = argparse.ArgumentParser(description="Run the utility benchmarks")
+    parser.add_argument("-k", dest="selected", action="append", default=[],
+                        help="only run benchmarks whose name contains this text (repeatable)")
+    parser.add_argument("--full", action="store_true", help="include the largest scales")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-round-time", type=float, default=0.05, help="seconds per timing round")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="write results to a baseline file")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="compare with a baseline file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown reported as a regression")
+    parser.add_argument("--keep-data", action="store_true", help="keep the scratch data directory")
+    args = parser.parse_args()
+
+    _scratch = tempfile.mkdtemp(prefix="learnmate_bench_")
+    # Benchmark the work itself, not the stage instrumentation around it
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    try:
+        results = run(args.selected, args.full, args.rounds, args.min_round_time)
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(_scratch, ignore_errors=True)
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != machine_info():
+            print("note: baseline was recorded on a different machine or Python version")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+            status = 1
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"machine": machine_info(), "recorded": time.strftime("%Y-%m-%d %H:%M"),
+                       "results": results}, f, indent=2, sort_keys=True)
+        print(f"\nbaseline written to {args.save}")
+    return status
+
+
+_scratch = None
+
+if __name__ == "__main__":
+    sys.exit(main())
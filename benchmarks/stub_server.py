@@ -0,0 +1,43 @@
+# benchmarks/stub_server.py - The app's Streamlit server with the stub backends installed
+#
+# Usage (load_test.py starts it this way):
+#     python benchmarks/stub_server.py --model-latency 0.5 --tts-latency 0.2 [streamlit run options]
+#
+# Installs one shared StubModel and StubTTS in place of Gemini and gTTS, then
+# runs `streamlit run app.py` in this process, so every session's script runs
+# use them. The app itself has no switch for the stubs.
+
+import os
+import sys
+import argparse
+import functools
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def install_stub_backends(model_latency, tts_latency):
+    """Route model and TTS calls to the stubs (model latency jitters by +/-25%)"""
+    from utils.stub_model import StubModel, StubTTS
+    from utils.model_pool import install_model
+    from utils.audio_utils import install_tts_factory
+
+    install_model(StubModel(latency=model_latency * 0.75, jitter=model_latency * 0.5))
+    install_tts_factory(functools.partial(StubTTS, latency=tts_latency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the app against the stub model and TTS")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="mean stub Gemini latency (seconds)")
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="stub TTS latency (seconds)")
+    args, streamlit_args = parser.parse_known_args()
+
+    install_stub_backends(args.model_latency, args.tts_latency)
+
+    from streamlit.web import cli
+    sys.argv = ["streamlit", "run", os.path.join(ROOT, "app.py"), *streamlit_args]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
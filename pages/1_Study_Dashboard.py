@@ -1,8 +1,6 @@
 # pages/1_Study_Dashboard.py - Progress tracking and learning paths
 
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 from datetime import datetime, timedelta
 import json
 import os
@@ -10,8 +8,17 @@ import time
 import random
 
 # Import utility functions
-from utils.storage import load_session, get_session_list
+from utils.bootstrap import apply_theme, lazy_import
+from utils.metrics import record_span
+from utils.session_memory import manage_session_memory
+from utils.storage import load_session, get_session_list, get_usage_statistics
 from utils.api_connector import setup_gemini
+from utils.analytics import cached, cached_figure
+from utils.review_scheduler import get_due_reviews, get_upcoming_reviews
+
+# Heavy libraries are only imported once a chart or table is actually drawn
+pd = lazy_import("pandas")
+px = lazy_import("plotly.express")
 
 # Page configuration
 st.set_page_config(
@@ -20,31 +27,11 @@ st.set_page_config(
     layout="wide"
 )
 
-# Apply theme based on dark_mode setting if available
-if 'dark_mode' in st.session_state and st.session_state.dark_mode:
-    st.markdown("""
-    <style>
-        .main {background-color: #1E1E1E; color: #FFFFFF;}
-        .stTextInput > div > div > input {background-color: #2E2E2E; color: #FFFFFF;}
-        .stSelectbox > div > div > select {background-color: #2E2E2E; color: #FFFFFF;}
-    </style>
-    """, unsafe_allow_html=True)
-
-# Apply font size if available
-if 'font_size' in st.session_state:
-    font_size_map = {
-        "small": "0.9rem",
-        "medium": "1rem",
-        "large": "1.2rem",
-        "x-large": "1.5rem"
-    }
-    st.markdown(f"""
-    <style>
-        .main p, .main li {{
-            font-size: {font_size_map[st.session_state.font_size]};
-        }}
-    </style>
-    """, unsafe_allow_html=True)
+# Apply theme and font size
+apply_theme()
+# Bring back the heavy state this page reads; evict the rest if over the ceiling
+manage_session_memory()
+_page_started = time.perf_counter()
 
 # Check if API is configured
 if 'api_configured' not in st.session_state or not st.session_state.api_configured:
@@ -55,15 +42,8 @@ if 'api_configured' not in st.session_state or not st.session_state.api_configur
 st.title("📊 Study Dashboard")
 st.write("Track your learning journey and get personalized recommendations")
 
-# Initialize session state for dashboard metrics if not exists
-if 'study_streak' not in st.session_state:
-    st.session_state.study_streak = random.randint(1, 5)  # Simulated data
-if 'total_study_time' not in st.session_state:
-    st.session_state.total_study_time = random.randint(120, 480)  # Simulated minutes
-if 'topics_covered' not in st.session_state:
-    st.session_state.topics_covered = len(st.session_state.study_history) if 'study_history' in st.session_state else 0
-if 'last_study_date' not in st.session_state:
-    st.session_state.last_study_date = datetime.now().strftime("%Y-%m-%d")
+# Read metrics from the study event rollups
+usage_stats = get_usage_statistics()
 
 # Get study history
 if 'study_history' not in st.session_state:
@@ -74,35 +54,35 @@ st.subheader("Learning Metrics")
 metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
 
 with metric_col1:
-    st.metric("Study Streak", f"{st.session_state.study_streak} days")
+    st.metric("Study Streak", f"{usage_stats.get('study_streak', 0)} days")
 
 with metric_col2:
-    st.metric("Total Study Time", f"{st.session_state.total_study_time} min")
+    st.metric("Total Study Time", f"{usage_stats.get('total_study_minutes', 0)} min")
 
 with metric_col3:
-    st.metric("Topics Covered", st.session_state.topics_covered)
+    st.metric("Topics Covered", usage_stats.get('topics_covered', len(st.session_state.study_history)))
 
 with metric_col4:
-    st.metric("Last Study", st.session_state.last_study_date)
+    st.metric("Last Study", usage_stats.get('last_study_date', "-"))
 
 # Study history visualization
 if st.session_state.study_history:
     st.subheader("Your Learning Journey")
 
-    # Create a DataFrame from study history
-    history_data = []
-    for entry in st.session_state.study_history:
-        # Add random study duration for demonstration purposes
-        study_duration = random.randint(15, 60)
-        history_data.append({
-            'Topic': entry['topic'],
-            'Date': entry['date'],
-            'Type': entry.get('type', 'Topic'),
-            'Detail Level': entry.get('detail_level', 'medium'),
-            'Study Duration (min)': study_duration
-        })
-
-    history_df = pd.DataFrame(history_data)
+    user_id = st.session_state.get('user_id', 'anonymous')
+    history_key = len(st.session_state.study_history)
+
+    def build_history_df():
+        # Columnar build from the history records, with time per topic from the rollups
+        df = pd.DataFrame.from_records(st.session_state.study_history)
+        df = df.reindex(columns=['topic', 'date', 'type', 'detail_level'])
+        df = df.fillna({'type': 'Topic', 'detail_level': 'medium'})
+        df.columns = ['Topic', 'Date', 'Type', 'Detail Level']
+        topic_minutes = pd.Series(usage_stats.get('subject_distribution', {}), dtype=float)
+        df['Study Duration (min)'] = df['Topic'].map(topic_minutes).fillna(0)
+        return df
+
+    history_df = cached(user_id, f"history_df:{history_key}", build_history_df)
 
     # Display as table
     with st.expander("View Study History Table"):
@@ -113,16 +93,18 @@ if st.session_state.study_history:
 
     with viz_tab1:
         # Topic type distribution
-        fig1 = px.pie(history_df, names='Type', title='Distribution of Learning Types',
-                      color_discrete_sequence=px.colors.sequential.Viridis)
+        fig1 = cached_figure(user_id, f"type_pie:{history_key}", lambda: px.pie(
+            history_df, names='Type', title='Distribution of Learning Types',
+            color_discrete_sequence=px.colors.sequential.Viridis))
         st.plotly_chart(fig1, use_container_width=True)
 
     with viz_tab2:
         # Study time by topic
-        fig2 = px.bar(history_df, x='Topic', y='Study Duration (min)',
-                      title='Time Spent on Each Topic',
-                      color='Detail Level',
-                      color_discrete_sequence=px.colors.sequential.Plasma)
+        fig2 = cached_figure(user_id, f"topic_time_bar:{history_key}", lambda: px.bar(
+            history_df, x='Topic', y='Study Duration (min)',
+            title='Time Spent on Each Topic',
+            color='Detail Level',
+            color_discrete_sequence=px.colors.sequential.Plasma))
         st.plotly_chart(fig2, use_container_width=True)
 
 # Learning recommendations
@@ -175,7 +157,7 @@ if len(st.session_state.study_history) >= 2:
                 if st.button("Study This Topic", key=f"rec_{i}"):
                     # Set as current topic and redirect to main page
                     st.session_state.redirect_topic = rec['topic']
-                    st.experimental_rerun()
+                    st.rerun()
 else:
     st.info("Study at least 2 topics to get personalized recommendations!")
 
@@ -203,37 +185,41 @@ else:
             if st.button("Study This Topic", key=f"gen_{i}"):
                 # Set as current topic and redirect to main page
                 st.session_state.redirect_topic = topic
-                st.experimental_rerun()
+                st.rerun()
 
 # Spaced repetition section
 st.subheader("Review Reminders")
 st.write("Based on spaced repetition principles, here are topics you should review:")
 
-# Create some mock review suggestions
-if 'study_history' in st.session_state and st.session_state.study_history:
-    # Take up to 3 oldest topics
-    review_topics = st.session_state.study_history[:3]
-
+# Due topics from the spaced-repetition queue, most overdue first; otherwise the next ones coming up
+review_user = st.session_state.get('user_id', 'anonymous')
+review_topics = get_due_reviews(review_user, limit=3) or get_upcoming_reviews(review_user, limit=3)
+if review_topics:
+    now = datetime.now()
     review_cols = st.columns(len(review_topics))
-    for i, topic in enumerate(review_topics):
-        days_ago = random.randint(3, 14)
-        review_date = (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+    for i, card in enumerate(review_topics):
+        due = datetime.fromtimestamp(card['due_ts'])
+        due_text = "Due now" if due <= now else f"Due {due.strftime('%Y-%m-%d')}"
+        if card['last_review_ts']:
+            last_text = f"Last reviewed: {datetime.fromtimestamp(card['last_review_ts']).strftime('%Y-%m-%d')}"
+        else:
+            last_text = "Not reviewed yet"
 
         with review_cols[i]:
             st.markdown(f"""
             <div style='padding: 15px; border-radius: 10px; background-color: #f0f8ff; border: 1px solid #ddd;'>
-                <h4>{topic['topic']}</h4>
-                <p>Last studied: {review_date}</p>
-                <p>Review now to strengthen retention</p>
+                <h4>{card['topic']}</h4>
+                <p>{last_text}</p>
+                <p>{due_text} (interval {card['interval_days']:g} days)</p>
             </div>
             """, unsafe_allow_html=True)
 
             if st.button("Review This Topic", key=f"review_{i}"):
                 # Load the session for this topic
-                if 'session_id' in topic:
-                    load_session(topic['session_id'])
-                    st.success(f"Loaded '{topic['topic']}' for review!")
-                    st.experimental_rerun()
+                if card['session_id']:
+                    load_session(card['session_id'])
+                    st.success(f"Loaded '{card['topic']}' for review!")
+                    st.rerun()
 else:
     st.info("Your review schedule will appear here after you study some topics.")
 
@@ -303,4 +289,6 @@ with st.expander("Generate Learning Path"):
 
 # Footer with navigation help
 st.markdown("---")
-st.info("📚 Navigate to other pages using the sidebar to continue your learning journey!")
\ No newline at end of file
+st.info("📚 Navigate to other pages using the sidebar to continue your learning journey!")
+
+record_span("page.run", time.perf_counter() - _page_started, page="dashboard")
@@ -1,15 +1,24 @@
 # pages/2_Interactive_Quizzes.py - Enhanced quiz functionality
 
 import streamlit as st
-import re
 import random
 import time
-import pandas as pd
 from datetime import datetime
 
 # Import utility functions
+from utils.bootstrap import apply_theme, lazy_import
+from utils.metrics import span
+from utils.session_memory import manage_session_memory
 from utils.text_utils import generate_quiz
-from utils.storage import save_session
+from utils.generation import parse_quiz
+from utils.preferences import preference, QUIZ_DIFFICULTY
+from utils.retrieval import condense_for_prompt
+from utils.api_connector import study_material
+from utils.events import record_event, EVENT_QUIZ_ANSWER
+from utils.review_scheduler import record_quiz_results
+
+# pandas is only needed for the quiz history table
+pd = lazy_import("pandas")
 
 # Page configuration
 st.set_page_config(
@@ -18,59 +27,10 @@ st.set_page_config(
     layout="wide"
 )
 
-# Apply theme based on dark_mode setting if available
-if 'dark_mode' in st.session_state and st.session_state.dark_mode:
-    st.markdown("""
-    <style>
-        .main {background-color: #1E1E1E; color: #FFFFFF;}
-        .stTextInput > div > div > input {background-color: #2E2E2E; color: #FFFFFF;}
-        .stSelectbox > div > div > select {background-color: #2E2E2E; color: #FFFFFF;}
-    </style>
-    """, unsafe_allow_html=True)
-
-# Apply font size if available
-if 'font_size' in st.session_state:
-    font_size_map = {
-        "small": "0.9rem",
-        "medium": "1rem",
-        "large": "1.2rem",
-        "x-large": "1.5rem"
-    }
-    st.markdown(f"""
-    <style>
-        .main p, .main li {{
-            font-size: {font_size_map[st.session_state.font_size]};
-        }}
-    </style>
-    """, unsafe_allow_html=True)
-
-
-# Helper function to parse quiz questions
-def parse_quiz(quiz_text):
-    """Parse quiz text into a structured format"""
-    questions = []
-
-    # Pattern to find questions, options and answers
-    pattern = r'Q(\d+):\s*(.*?)\s*(?:(?:A|a)\.)\s*(.*?)\s*(?:(?:B|b)\.)\s*(.*?)\s*(?:(?:C|c)\.)\s*(.*?)\s*(?:(?:D|d)\.)\s*(.*?)\s*(?:Correct Answer:|Correct:|Answer:)\s*([A-Da-d])'
-
-    matches = re.findall(pattern, quiz_text, re.DOTALL)
-
-    for match in matches:
-        q_num, question, option_a, option_b, option_c, option_d, correct = match
-
-        questions.append({
-            'question_number': int(q_num),
-            'question': question.strip(),
-            'options': {
-                'A': option_a.strip(),
-                'B': option_b.strip(),
-                'C': option_c.strip(),
-                'D': option_d.strip()
-            },
-            'correct_answer': correct.strip().upper()
-        })
-
-    return questions
+# Apply theme and font size
+apply_theme()
+# Bring back the heavy state this page reads; evict the rest if over the ceiling
+manage_session_memory(needed=("explanation", "quiz_text", "quiz_questions", "quiz_results", "quiz_history"))
 
 
 # Main function
@@ -110,13 +70,16 @@ def main():
 
         with col2:
             num_questions = st.number_input("Number of Questions:", min_value=3, max_value=10, value=5)
-            difficulty = st.selectbox("Difficulty:", ["easy", "medium", "hard"], index=1)
+            levels = ["easy", "medium", "hard"]
+            difficulty = st.selectbox("Difficulty:", levels,
+                                      index=levels.index(QUIZ_DIFFICULTY[preference("default_difficulty")]))
 
         if st.button("Generate Quiz") and new_topic:
             with st.spinner(f"Creating quiz about {new_topic}..."):
-                # In a real implementation, you'd get an explanation first
-                # For simplicity, we'll generate quiz directly
-                explanation = f"Creating a quiz about {new_topic} at {difficulty} difficulty level."
+                # Ground the quiz in the student's saved materials when we have any
+                explanation = study_material(new_topic)
+                if not explanation:
+                    explanation = f"Creating a quiz about {new_topic} at {difficulty} difficulty level."
 
                 quiz_text = generate_quiz(new_topic, explanation, num_questions)
                 st.session_state.quiz_questions = parse_quiz(quiz_text)
@@ -129,7 +92,7 @@ def main():
                 # Reset timer
                 st.session_state.quiz_start_time = time.time()
 
-                st.experimental_rerun()
+                st.rerun()
 
     with quiz_tab2:
         # Check if there's a current topic
@@ -141,9 +104,15 @@ def main():
 
             if st.button("Create Quiz from Current Topic"):
                 with st.spinner("Creating quiz from your current topic..."):
-                    quiz_text = generate_quiz(st.session_state.current_topic, st.session_state.explanation,
-                                              num_questions)
-                    st.session_state.quiz_questions = parse_quiz(quiz_text)
+                    # Pre-generated sessions ship with a quiz; use it when it is long enough
+                    questions = parse_quiz(st.session_state.get('quiz_text', ''))
+                    if len(questions) < num_questions:
+                        # Long explanations are trimmed to their most relevant passages
+                        explanation = condense_for_prompt(st.session_state.current_topic,
+                                                          st.session_state.explanation)
+                        quiz_text = generate_quiz(st.session_state.current_topic, explanation, num_questions)
+                        questions = parse_quiz(quiz_text)
+                    st.session_state.quiz_questions = questions[:num_questions]
                     st.session_state.current_question = 0
                     st.session_state.user_answers = {}
                     st.session_state.quiz_started = True
@@ -153,7 +122,7 @@ def main():
                     # Reset timer
                     st.session_state.quiz_start_time = time.time()
 
-                    st.experimental_rerun()
+                    st.rerun()
         else:
             st.info("No current topic loaded. Please generate content on the main page first or create a new quiz.")
 
@@ -221,6 +190,13 @@ def main():
         elif option_d_selected:
             st.session_state.user_answers[st.session_state.current_question] = "D"
 
+        if option_a_selected or option_b_selected or option_c_selected or option_d_selected:
+            answer = st.session_state.user_answers[st.session_state.current_question]
+            record_event(st.session_state.get('user_id'), EVENT_QUIZ_ANSWER,
+                         topic=st.session_state.current_quiz_topic,
+                         correct=answer == current_q['correct_answer'],
+                         question=current_q['question'])
+
         # Show feedback if the user has answered
         if st.session_state.current_question in st.session_state.user_answers:
             user_answer = st.session_state.user_answers[st.session_state.current_question]
@@ -239,14 +215,14 @@ def main():
                 if st.session_state.current_question > 0:
                     if st.button("⬅️ Previous Question"):
                         st.session_state.current_question -= 1
-                        st.experimental_rerun()
+                        st.rerun()
 
             with nav_col2:
                 # Next button or Finish
                 if st.session_state.current_question < len(st.session_state.quiz_questions) - 1:
                     if st.button("Next Question ➡️"):
                         st.session_state.current_question += 1
-                        st.experimental_rerun()
+                        st.rerun()
                 else:
                     if st.button("Finish Quiz"):
                         # Calculate results
@@ -274,6 +250,12 @@ def main():
 
                         st.session_state.quiz_finished = True
 
+                        # Reschedule the topic and each question for spaced review
+                        record_quiz_results(st.session_state.get('user_id', 'anonymous'),
+                                            st.session_state.current_quiz_topic,
+                                            st.session_state.quiz_questions,
+                                            st.session_state.user_answers)
+
                         # Save results to history
                         if 'quiz_history' not in st.session_state:
                             st.session_state.quiz_history = []
@@ -284,7 +266,7 @@ def main():
                             'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
                         })
 
-                        st.experimental_rerun()
+                        st.rerun()
 
     # Display results if finished
     elif st.session_state.quiz_finished:
@@ -338,7 +320,7 @@ def main():
                 st.session_state.quiz_started = True
                 st.session_state.quiz_finished = False
                 st.session_state.quiz_start_time = time.time()
-                st.experimental_rerun()
+                st.rerun()
 
         with col2:
             if st.button("New Quiz"):
@@ -348,7 +330,7 @@ def main():
                 st.session_state.user_answers = {}
                 st.session_state.quiz_started = False
                 st.session_state.quiz_finished = False
-                st.experimental_rerun()
+                st.rerun()
 
     # Display quiz history
     if not st.session_state.quiz_started and 'quiz_history' in st.session_state and st.session_state.quiz_history:
@@ -370,9 +352,10 @@ def main():
         # Add option to clear history
         if st.button("Clear Quiz History"):
             st.session_state.quiz_history = []
-            st.experimental_rerun()
+            st.rerun()
 
 
 # Run the app
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("page.run", page="quizzes"):
+        main()
\ No newline at end of file
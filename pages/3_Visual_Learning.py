@@ -1,52 +1,165 @@
 import streamlit as st
 import os
 import sys
-import pandas as pd
-from PIL import Image
-import io
-import base64
+import math
 
 # Add the parent directory to sys.path to import utils
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
-from utils.api_connector import generate_mind_map, generate_image
-from utils.storage import save_visual_aid, get_user_visuals
+from utils.bootstrap import apply_theme
+from utils.metrics import span
+from utils.session_memory import manage_session_memory
+from utils.api_connector import generate_mind_map, generate_image, topic_context
+from utils.storage import save_visual_aid, get_user_visuals, delete_user_visual
+from utils.visual_store import load_thumbnail, load_visual, PAGE_SIZE
 from utils.text_utils import extract_key_concepts
+from utils.mind_map import saved_map_svg
 
 st.set_page_config(page_title="Visual Learning", page_icon="🎨", layout="wide")
+apply_theme()
+# Bring back the heavy state this page reads; evict the rest if over the ceiling
+manage_session_memory(needed=("explanation",))
 
+VISUAL_FILTERS = {"All": None, "Mind Maps": "mind_map", "Visual Aids": "image"}
+GALLERY_COLUMNS = 3
 
-def display_mind_map(topic, concepts):
-    """Generate and display a mind map for the given topic and concepts"""
+
+def display_mind_map(topic, depth=3, style="Hierarchical"):
+    """Generate a mind map for the given topic and keep it for display"""
     with st.spinner(f"Creating mind map for '{topic}'..."):
-        mind_map_content = generate_mind_map(topic, concepts)
-        if mind_map_content:
-            st.markdown("### Mind Map")
-            st.graphviz_chart(mind_map_content)
-
-            if st.button("Save Mind Map"):
-                save_visual_aid(topic, "mind_map", mind_map_content)
-                st.success(f"Mind map for '{topic}' saved successfully!")
+        context = topic_context(topic)
+        # Local key concepts seed the model and are the fallback map if it fails
+        concepts = extract_key_concepts(f"{topic}. {context}", max_concepts=8,
+                                        user_id=st.session_state.get('user_id', 'anonymous'))
+        mind_map = generate_mind_map(topic, concepts, depth, style, context=context)
+        if mind_map:
+            st.session_state.mind_map = dict(mind_map, topic=topic)
         else:
             st.error("Failed to generate mind map. Please try again.")
 
 
+def show_mind_map():
+    """Show the current mind map from its laid-out SVG (no layout work on reruns)"""
+    mind_map = st.session_state.get('mind_map')
+    if not mind_map:
+        return
+    st.markdown("### Mind Map")
+    st.image(mind_map["svg"], use_container_width=True)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Save Mind Map"):
+            save_visual_aid(mind_map["topic"], "mind_map",
+                            {key: mind_map[key] for key in ("hash", "style", "tree")})
+            st.success(f"Mind map for '{mind_map['topic']}' saved successfully!")
+    with col2:
+        st.download_button("Download SVG", mind_map["svg"], file_name="mind_map.svg", mime="image/svg+xml")
+    with col3:
+        st.download_button("Download DOT", mind_map["dot"], file_name="mind_map.dot", mime="text/vnd.graphviz")
+
+
 def display_visual_aid(topic, description):
-    """Generate and display a visual aid for the given topic"""
+    """Generate a visual aid for the given topic and keep it for display"""
     with st.spinner(f"Creating visual aid for '{topic}'..."):
-        image_data = generate_image(description)
-        if image_data:
-            st.markdown("### Visual Aid")
-            st.image(image_data, caption=topic)
-
-            if st.button("Save Visual Aid"):
-                save_visual_aid(topic, "image", image_data)
-                st.success(f"Visual aid for '{topic}' saved successfully!")
+        image = generate_image(description)
+        if image is not None:
+            st.session_state.visual_aid = {"topic": topic, "image": image}
         else:
             st.error("Failed to generate visual aid. Please try again.")
 
 
+def show_visual_aid():
+    """Show the current visual aid with its save button"""
+    visual_aid = st.session_state.get('visual_aid')
+    if not visual_aid:
+        return
+    st.markdown("### Visual Aid")
+    st.image(visual_aid["image"], caption=visual_aid["topic"])
+
+    if st.button("Save Visual Aid"):
+        save_visual_aid(visual_aid["topic"], "image", visual_aid["image"])
+        st.success(f"Visual aid for '{visual_aid['topic']}' saved successfully!")
+
+
+def reset_gallery_page():
+    st.session_state.visuals_page = 0
+
+
+def show_saved_visual(visual):
+    """Load and show the full asset of one saved visual"""
+    content = load_visual(visual)
+    st.markdown(f"### {visual['topic']} ({visual['date']})")
+    if content is None:
+        st.warning("This visual's file is missing.")
+    elif visual["type"] == "mind_map":
+        st.image(saved_map_svg(content), use_container_width=True)
+    else:  # image
+        st.image(content, caption=visual["topic"])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Close"):
+            del st.session_state.open_visual
+            st.rerun()
+    with col2:
+        if st.button("Delete", key=f"delete_{visual['id']}"):
+            delete_user_visual(visual["id"])
+            del st.session_state.open_visual
+            # Shown by the gallery after the rerun
+            st.session_state.visuals_flash = f"Deleted '{visual['topic']}'"
+            st.rerun()
+
+
+def show_saved_visuals():
+    """Paginated thumbnail gallery; only the opened visual loads its full asset"""
+    visual_filter = st.radio("Filter by type:", list(VISUAL_FILTERS), horizontal=True, on_change=reset_gallery_page)
+    page = st.session_state.get('visuals_page', 0)
+    visuals, total = get_user_visuals(VISUAL_FILTERS[visual_filter], page)
+    if not visuals and page > 0:
+        # The last item of the last page was deleted
+        reset_gallery_page()
+        st.rerun()
+
+    flash = st.session_state.pop('visuals_flash', None)
+    if flash:
+        st.success(flash)
+
+    if total == 0:
+        st.info("You haven't saved any visual aids yet. Create some mind maps or visual aids to see them here!")
+        return
+
+    opened = st.session_state.get('open_visual')
+    if opened:
+        show_saved_visual(opened)
+        st.markdown("---")
+
+    columns = st.columns(GALLERY_COLUMNS)
+    for i, visual in enumerate(visuals):
+        with columns[i % GALLERY_COLUMNS]:
+            thumbnail = load_thumbnail(visual)
+            if thumbnail is not None:
+                st.image(thumbnail, use_container_width=True)
+            st.caption(f"{visual['topic']} ({visual['date']})")
+            if st.button("Open", key=f"open_{visual['id']}"):
+                st.session_state.open_visual = visual
+                st.rerun()
+
+    pages = math.ceil(total / PAGE_SIZE)
+    if pages > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("Previous", disabled=page == 0):
+                st.session_state.visuals_page = page - 1
+                st.rerun()
+        with col2:
+            st.markdown(f"Page {page + 1} of {pages} ({total} visuals)")
+        with col3:
+            if st.button("Next", disabled=page >= pages - 1):
+                st.session_state.visuals_page = page + 1
+                st.rerun()
+
+
 def main():
     st.title("🎨 Visual Learning")
     st.markdown("""
@@ -66,8 +179,9 @@ def main():
                 style = st.selectbox("Mind Map Style", ["Hierarchical", "Radial", "Circular"])
 
             if st.button("Generate Mind Map"):
-                concepts = extract_key_concepts(topic)
-                display_mind_map(topic, concepts)
+                display_mind_map(topic, depth, style)
+
+        show_mind_map()
 
     with tab2:
         st.subheader("Generate Visual Aids")
@@ -80,32 +194,13 @@ def main():
             if st.button("Generate Visual Aid"):
                 display_visual_aid(topic, description)
 
+        show_visual_aid()
+
     with tab3:
         st.subheader("Your Saved Visuals")
-        saved_visuals = get_user_visuals()
-
-        if not saved_visuals or len(saved_visuals) == 0:
-            st.info("You haven't saved any visual aids yet. Create some mind maps or visual aids to see them here!")
-        else:
-            visual_type = st.radio("Filter by type:", ["All", "Mind Maps", "Visual Aids"])
-
-            filtered_visuals = saved_visuals
-            if visual_type == "Mind Maps":
-                filtered_visuals = [v for v in saved_visuals if v["type"] == "mind_map"]
-            elif visual_type == "Visual Aids":
-                filtered_visuals = [v for v in saved_visuals if v["type"] == "image"]
-
-            for visual in filtered_visuals:
-                with st.expander(f"{visual['topic']} ({visual['date']})"):
-                    if visual["type"] == "mind_map":
-                        st.graphviz_chart(visual["content"])
-                    else:  # image
-                        st.image(visual["content"], caption=visual["topic"])
-
-                    if st.button("Delete", key=f"delete_{visual['id']}"):
-                        # Add delete functionality
-                        st.success(f"Deleted '{visual['topic']}'")
+        show_saved_visuals()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("page.run", page="visual_learning"):
+        main()
\ No newline at end of file
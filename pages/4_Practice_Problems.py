@@ -1,22 +1,34 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
 import sys
 import json
-import pandas as pd
 from datetime import datetime
 
 # Add the parent directory to sys.path to import utils
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
-from utils.api_connector import generate_practice_problems, check_solution
+from utils.bootstrap import apply_theme, lazy_import
+from utils.metrics import span
+from utils.session_memory import manage_session_memory
+from utils.api_connector import generate_practice_problems, check_solution, check_solutions
 from utils.storage import save_practice_session, get_practice_history
+from utils.preferences import preference
 from utils.text_utils import format_problems
+from utils.events import record_event, EVENT_PRACTICE_SUBMIT
+from utils.review_scheduler import record_practice_results
+from utils.practice_timer import start_attempt, seconds_remaining, submit_attempt, countdown_html, GRACE_SECONDS
+
+pd = lazy_import("pandas")
 
 st.set_page_config(page_title="Practice Problems", page_icon="✏️", layout="wide")
+apply_theme()
+# Bring back the heavy state this page reads; evict the rest if over the ceiling
+manage_session_memory(needed=("problems",))
 
 
-def display_problem(problem, index):
+def display_problem(problem, index, time_up=False):
     """Display a single practice problem with answer box"""
     st.markdown(f"### Problem {index + 1}")
     st.markdown(problem["question"])
@@ -31,7 +43,12 @@ def display_problem(problem, index):
     else:
         answer = st.text_area("Your answer:", key=f"problem_{index}")
 
-    check_button = st.button("Check Answer", key=f"check_{index}")
+    if problem.get("hints"):
+        with st.expander("Hints"):
+            for hint in problem["hints"]:
+                st.markdown(f"- {hint}")
+
+    check_button = st.button("Check Answer", key=f"check_{index}", disabled=time_up)
 
     if check_button:
         is_correct, feedback = check_solution(problem, answer)
@@ -60,7 +77,7 @@ def main():
             topic = st.text_input("Learning Topic:")
             difficulty = st.select_slider("Difficulty Level:",
                                           options=["Beginner", "Intermediate", "Advanced"],
-                                          value="Intermediate")
+                                          value=preference("default_difficulty"))
         with col2:
             problem_type = st.selectbox("Problem Type:",
                                         ["Mixed", "Multiple Choice", "Short Answer", "Calculation", "Essay"])
@@ -92,8 +109,12 @@ def main():
                         st.session_state.show_problems = True
                         if time_limit > 0:
                             st.session_state.time_limit = time_limit * 60  # Convert to seconds
+                            # The deadline lives on the server; the page only displays it
+                            st.session_state.timed_attempt, _ = start_attempt(
+                                st.session_state.get('user_id', 'anonymous'), st.session_state.time_limit)
                         else:
                             st.session_state.time_limit = None
+                            st.session_state.timed_attempt = None
                         st.success(f"Generated {len(generated_problems)} practice problems!")
                     else:
                         st.error("Failed to generate practice problems. Please try again.")
@@ -102,28 +123,51 @@ def main():
             st.markdown("---")
             st.subheader("Practice Problems")
 
-            if 'time_limit' in st.session_state and st.session_state.time_limit:
+            attempt_id = st.session_state.get('timed_attempt')
+            remaining = seconds_remaining(attempt_id) if attempt_id else None
+            if remaining is not None:
                 time_limit_mins = st.session_state.time_limit // 60
                 st.info(f"Time Limit: {time_limit_mins} minutes")
-                # Time tracking would be implemented here
+                # Counts down in the browser, so a class of timed students causes no extra reruns
+                components.html(countdown_html(remaining), height=60)
+            time_up = remaining is not None and remaining < -GRACE_SECONDS
 
             responses = []
             for i, problem in enumerate(st.session_state.problems):
-                response = display_problem(problem, i)
+                response = display_problem(problem, i, time_up)
                 responses.append(response)
 
-            if st.button("Submit All Answers"):
+            st.download_button("Download Problems", format_problems(st.session_state.problems),
+                               file_name="practice_problems.md", mime="text/markdown")
+
+            submitted = st.button("Submit All Answers")
+            overdue = 0.0
+            if submitted and attempt_id:
+                # Checked against the stored deadline; a timed set can only be submitted once
+                accepted, overdue = submit_attempt(attempt_id, st.session_state.get('user_id', 'anonymous'))
+                if not accepted:
+                    st.warning("These answers were already submitted. Generate a new set to practice again.")
+                    submitted = False
+                elif overdue:
+                    st.warning(f"Submitted {overdue:.0f} seconds after the time limit; this attempt is marked late.")
+
+            if submitted:
                 correct_count = 0
+                # The generated set can be shorter than the slider asked for
+                problem_count = len(st.session_state.problems)
+
+                # Grade everything at once: answers already checked come from the grade cache
+                grades = check_solutions([(resp["problem"], resp["user_answer"]) for resp in responses])
 
                 # Create results summary
                 results = []
-                for i, resp in enumerate(responses):
-                    is_correct, feedback = check_solution(resp["problem"], resp["user_answer"])
+                for i, (resp, (is_correct, feedback)) in enumerate(zip(responses, grades)):
                     if is_correct:
                         correct_count += 1
 
                     results.append({
                         "problem_number": i + 1,
+                        "question": resp["problem"]["question"],
                         "correct": is_correct,
                         "feedback": feedback,
                         "user_answer": resp["user_answer"]
@@ -134,19 +178,25 @@ def main():
                     "topic": topic,
                     "difficulty": difficulty,
                     "problem_type": problem_type,
-                    "num_problems": num_problems,
+                    "num_problems": problem_count,
                     "correct_count": correct_count,
                     "results": results,
+                    "time_limit": st.session_state.get('time_limit'),
+                    "late": overdue > 0,
+                    "overdue_seconds": round(overdue, 1),
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 }
 
                 save_practice_session(session_data)
+                record_event(st.session_state.get('user_id'), EVENT_PRACTICE_SUBMIT, topic=topic,
+                             correct=correct_count, answered=len(results), difficulty=difficulty)
+                record_practice_results(st.session_state.get('user_id', 'anonymous'), topic, results)
 
                 # Display results
                 st.markdown("---")
                 st.subheader("Results")
-                st.metric("Score", f"{correct_count}/{num_problems}",
-                          f"{(correct_count / num_problems) * 100:.1f}%")
+                st.metric("Score", f"{correct_count}/{problem_count}",
+                          f"{(correct_count / problem_count) * 100:.1f}%")
 
                 for result in results:
                     if result["correct"]:
@@ -180,4 +230,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("page.run", page="practice"):
+        main()
\ No newline at end of file
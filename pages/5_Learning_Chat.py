@@ -2,19 +2,26 @@ import streamlit as st
 import os
 import sys
 from datetime import datetime
-import pandas as pd
 import time
 
 # Add the parent directory to sys.path to import utils
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
-from utils.api_connector import generate_response, generate_audio
+from utils.bootstrap import apply_theme
+from utils.metrics import span
+from utils.session_memory import manage_session_memory
+from utils.api_connector import generate_response
 from utils.storage import save_chat_history, get_chat_history
-from utils.text_utils import extract_key_concepts
-from utils.audio_utils import play_audio
+from utils.text_utils import conversation_concepts
+from utils.audio_utils import generate_audio
+from utils.preferences import preference
+from utils.events import record_event, EVENT_CHAT_TURN
 
 st.set_page_config(page_title="Learning Chat", page_icon="💬", layout="wide")
+apply_theme()
+# Bring back the heavy state this page reads; evict the rest if over the ceiling
+manage_session_memory(needed=("messages",))
 
 
 def display_message(role, content, with_audio=False):
@@ -24,7 +31,7 @@ def display_message(role, content, with_audio=False):
     else:
         st.markdown(f"**Tutor**: {content}")
         if with_audio and content:
-            audio_data = generate_audio(content)
+            audio_data = generate_audio(content, "en-US", preference("speech_speed"))
             if audio_data:
                 st.audio(audio_data, format="audio/mp3")
 
@@ -57,12 +64,12 @@ def main():
                 st.success(f"Topic set to: {new_topic}")
 
         # Audio settings
-        enable_audio = st.checkbox("Enable Audio Responses", value=False)
+        enable_audio = st.checkbox("Enable Audio Responses", value=preference("enable_audio"))
 
         if enable_audio:
-            voice_style = st.selectbox("Voice Style:",
-                                       ["Friendly", "Professional", "Instructional"],
-                                       index=0)
+            voice_styles = ["Friendly", "Professional", "Instructional", "Energetic"]
+            voice_style = st.selectbox("Voice Style:", voice_styles,
+                                       index=voice_styles.index(preference("voice_type")))
 
         # Tutor persona
         tutor_persona = st.selectbox("Tutor Persona:",
@@ -93,12 +100,12 @@ def main():
                     selected_chat)
                 st.session_state.messages = chat_history[selected_index]["messages"]
                 st.session_state.current_topic = chat_history[selected_index]["topic"]
-                st.experimental_rerun()
+                st.rerun()
 
         if st.button("Start New Chat"):
             st.session_state.messages = []
             st.session_state.current_topic = ""
-            st.experimental_rerun()
+            st.rerun()
 
     # Display chat history
     for message in st.session_state.messages:
@@ -127,14 +134,15 @@ def main():
             if response:
                 # Add assistant message to chat history
                 st.session_state.messages.append({"role": "assistant", "content": response})
+                record_event(st.session_state.get('user_id'), EVENT_CHAT_TURN,
+                             topic=st.session_state.current_topic, persona=tutor_persona)
 
                 # Display with audio if enabled
                 display_message("assistant", response, with_audio=enable_audio)
 
                 # If no topic is set, try to extract one from the conversation
                 if not st.session_state.current_topic and len(st.session_state.messages) >= 3:
-                    combined_text = " ".join([msg["content"] for msg in st.session_state.messages])
-                    potential_topics = extract_key_concepts(combined_text, max_concepts=1)
+                    potential_topics = conversation_concepts(st.session_state.messages, max_concepts=1)
                     if potential_topics:
                         st.session_state.current_topic = potential_topics[0]
                         st.sidebar.success(f"Topic detected: {st.session_state.current_topic}")
@@ -151,7 +159,7 @@ def main():
             if st.session_state.current_topic:
                 prompt = f"Please explain the concept of {st.session_state.current_topic} in simple terms."
                 st.session_state.messages.append({"role": "user", "content": prompt})
-                st.experimental_rerun()
+                st.rerun()
             else:
                 st.warning("Please set a learning topic first")
     with col2:
@@ -159,7 +167,7 @@ def main():
             if st.session_state.current_topic:
                 prompt = f"Can you provide 3 practice questions about {st.session_state.current_topic}?"
                 st.session_state.messages.append({"role": "user", "content": prompt})
-                st.experimental_rerun()
+                st.rerun()
             else:
                 st.warning("Please set a learning topic first")
     with col3:
@@ -167,10 +175,11 @@ def main():
             if len(st.session_state.messages) > 2:
                 prompt = "Can you summarize what we've discussed so far?"
                 st.session_state.messages.append({"role": "user", "content": prompt})
-                st.experimental_rerun()
+                st.rerun()
             else:
                 st.warning("We need more conversation to summarize")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("page.run", page="chat"):
+        main()
\ No newline at end of file
@@ -3,15 +3,25 @@ import os
 import sys
 import json
 from datetime import datetime
-import pandas as pd
 
 # Add the parent directory to sys.path to import utils
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
+from utils.bootstrap import apply_theme
+from utils.metrics import (span, stage_summary, counter_values, cache_hit_rates, recent_spans,
+                           render_prometheus, iter_jsonl, get_registry, ADMIN_PANEL)
+from utils.session_memory import manage_session_memory, session_memory_report, SESSION_MEMORY_LIMIT
 from utils.storage import save_user_preferences, get_user_preferences, get_usage_statistics
+from utils.analytics import get_activity_frame
+from utils.artifacts import new_artifact_path
+from utils.export import EXPORT_CATEGORIES, EXPORT_FORMATS, count_records, export_user_data
+from utils.retention import CATEGORY_EVENTS, ALL_USER_DATA, delete_user_data
 
 st.set_page_config(page_title="Settings", page_icon="⚙️", layout="wide")
+apply_theme()
+# Bring back the heavy state this page reads; evict the rest if over the ceiling
+manage_session_memory()
 
 
 def main():
@@ -23,8 +33,12 @@ def main():
     # Get current preferences
     user_prefs = get_user_preferences()
 
-    tabs = st.tabs(
-        ["Learning Preferences", "Interface Settings", "Audio Settings", "Data Management", "Usage Statistics"])
+    tab_names = ["Learning Preferences", "Interface Settings", "Audio Settings", "Data Management",
+                 "Usage Statistics"]
+    if ADMIN_PANEL:
+        # Server-wide metrics; set METRICS_ADMIN=1 on the server to show them
+        tab_names.append("Performance")
+    tabs = st.tabs(tab_names)
 
     with tabs[0]:
         st.subheader("Learning Preferences")
@@ -194,35 +208,58 @@ def main():
             st.subheader("Export Your Data")
             export_options = st.multiselect(
                 "Select data to export:",
-                ["Learning history", "Practice sessions", "Quiz results", "Chat history", "Visual aids"]
+                list(EXPORT_CATEGORIES)
             )
 
             export_format = st.selectbox(
                 "Export format:",
-                ["JSON", "CSV", "PDF"]
+                list(EXPORT_FORMATS),
+                help="ZIP bundles one JSON Lines file per category with your saved images and mind maps."
             )
 
             if st.button("Export Selected Data"):
                 if export_options:
-                    st.success(f"Data export initiated in {export_format} format!")
+                    user_id = st.session_state.get('user_id', 'anonymous')
+                    total = max(count_records(user_id, export_options), 1)
+                    progress_bar = st.progress(0.0, text="Exporting...")
+
+                    def report(written, category):
+                        label = f"Exporting {category.lower()}..." if category else "Export complete"
+                        progress_bar.progress(min(written / total, 1.0), text=f"{label} ({written} records)")
+
+                    extension, mime = EXPORT_FORMATS[export_format]
+                    path = new_artifact_path("exports", extension)
+                    try:
+                        counts = export_user_data(user_id, export_options, export_format, path, progress=report)
+                        st.session_state.export_file = {
+                            "path": path,
+                            "mime": mime,
+                            "file_name": f"learning_data_export_{datetime.now().strftime('%Y%m%d')}{extension}",
+                        }
+                        st.success("Exported " + ", ".join(f"{n} {c.lower()}" for c, n in counts.items()))
+                    except Exception as e:
+                        st.error(f"Error exporting data: {e}")
+                else:
+                    st.warning("Please select at least one data category to export.")
+
+            export_file = st.session_state.get('export_file')
+            if export_file and os.path.exists(export_file["path"]):
+                with open(export_file["path"], "rb") as f:
                     st.download_button(
                         label="Download Exported Data",
-                        data="Placeholder for actual data export",
-                        file_name=f"learning_data_export_{datetime.now().strftime('%Y%m%d')}.{export_format.lower()}",
-                        mime="application/json" if export_format == "JSON" else "text/csv"
+                        data=f,
+                        file_name=export_file["file_name"],
+                        mime=export_file["mime"]
                     )
-                else:
-                    st.warning("Please select at least one data category to export.")
 
         with delete_col:
             st.subheader("Delete Data")
             delete_options = st.multiselect(
                 "Select data to delete:",
-                ["Learning history", "Practice sessions", "Quiz results", "Chat history", "Visual aids",
-                 "All user data"]
+                list(CATEGORY_EVENTS) + [ALL_USER_DATA]
             )
 
-            if "All user data" in delete_options:
+            if ALL_USER_DATA in delete_options:
                 st.warning("⚠️ Warning: This will delete ALL of your data and cannot be undone!")
 
             confirm_delete = st.text_input("Type 'DELETE' to confirm deletion:")
@@ -230,12 +267,21 @@ def main():
             if st.button("Delete Selected Data"):
                 if not delete_options:
                     st.warning("Please select data to delete.")
-                elif "All user data" in delete_options and confirm_delete != "DELETE":
+                elif ALL_USER_DATA in delete_options and confirm_delete != "DELETE":
                     st.error("Please type 'DELETE' to confirm full data deletion.")
                 elif confirm_delete != "DELETE":
                     st.error("Please type 'DELETE' to confirm deletion.")
                 else:
-                    st.success("Selected data has been deleted.")
+                    try:
+                        with st.spinner("Deleting..."):
+                            counts = delete_user_data(st.session_state.get('user_id', 'anonymous'), delete_options)
+                        # Drop in-session copies of what was deleted
+                        if ALL_USER_DATA in delete_options or "Quiz results" in delete_options:
+                            st.session_state.pop('quiz_history', None)
+                        st.session_state.pop('export_file', None)
+                        st.success("Deleted " + ", ".join(f"{n} {c.lower()}" for c, n in counts.items()))
+                    except Exception as e:
+                        st.error(f"Error deleting data: {e}")
 
     with tabs[4]:
         st.subheader("Usage Statistics")
@@ -261,18 +307,56 @@ def main():
                 st.bar_chart(subject_data)
 
             st.subheader("Learning Activity")
-            activity_data = usage_data.get('activity_timeline', {})
-            if activity_data:
-                activity_df = pd.DataFrame(list(activity_data.items()), columns=['Date', 'Minutes'])
-                activity_df['Date'] = pd.to_datetime(activity_df['Date'])
-                activity_df = activity_df.sort_values('Date')
-                st.line_chart(activity_df.set_index('Date'))
+            if usage_data.get('activity_timeline'):
+                st.line_chart(get_activity_frame(st.session_state.get('user_id', 'anonymous')))
 
             st.subheader("Improvement Over Time")
             improvement_data = usage_data.get('improvement_metrics', {})
             if improvement_data:
                 st.line_chart(improvement_data)
 
+    if ADMIN_PANEL:
+        with tabs[5]:
+            st.subheader("Performance")
+            st.caption("Latency, token and cache metrics collected by this server process since it started.")
+
+            stage_rows = stage_summary()
+            if not stage_rows:
+                st.info("No metrics recorded yet. Generate some content to see timings here.")
+            else:
+                st.dataframe(stage_rows, use_container_width=True)
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown("**Model tokens**")
+                    st.json(counter_values("model_tokens_total"))
+                with col2:
+                    st.markdown("**Cache hit rates**")
+                    st.json(cache_hit_rates())
+
+                with st.expander("Recent spans"):
+                    st.dataframe(recent_spans(), use_container_width=True)
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.download_button("Download Prometheus metrics", render_prometheus(),
+                                   file_name="metrics.prom", mime="text/plain")
+            with col2:
+                st.download_button("Download JSONL", "\n".join(iter_jsonl()) + "\n",
+                                   file_name="metrics.jsonl", mime="application/jsonl")
+            with col3:
+                if st.button("Reset metrics"):
+                    get_registry().reset()
+                    st.rerun()
+
+            st.markdown("**This session's memory**")
+            memory_rows = session_memory_report()
+            total = sum(row["bytes"] for row in memory_rows)
+            st.caption(f"{total / 2 ** 20:.2f} MB of session state (ceiling {SESSION_MEMORY_LIMIT / 2 ** 20:.0f} MB; "
+                       f"evicted values are restored on the page that reads them)")
+            st.dataframe(memory_rows, use_container_width=True)
+            st.json(counter_values("session_evictions_total"))
+
     # Save button (at the bottom of the page)
     if st.button("Save Settings", type="primary"):
         # Collect all settings
@@ -313,10 +397,13 @@ def main():
             new_preferences["reminder_frequency"] = reminder_freq
 
         # Save the preferences
-        save_user_preferences(new_preferences)
-        st.success("Settings saved successfully!")
+        if save_user_preferences(new_preferences):
+            # Re-apply the theme now rather than on the next rerun
+            apply_theme()
+            st.success("Settings saved successfully!")
 
 
 # Run the main function when the script is executed
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("page.run", page="settings"):
+        main()
\ No newline at end of file
@@ -0,0 +1,202 @@
+# pregenerate.py - Pre-warm learning materials for a syllabus of topics
+#
+# Usage:
+#     python pregenerate.py syllabus.txt --workers 4
+#     python pregenerate.py syllabus.txt --stub --stub-latency 0.2   # offline run
+#
+# The topic file has one topic per line, optionally followed by "| type | detail":
+#
+#     # Week 1
+#     Photosynthesis | Topic | medium
+#     Newton's laws of motion
+#
+# Each topic runs the same pipeline as the "Generate Learning Materials" button
+# and is saved under pregenerated_session_id(), which app.py checks before
+# calling the model. Finished topics are appended to <topics>.checkpoint.jsonl,
+# so an interrupted run picks up where it stopped.
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.generation import GenerationService
+from utils.pipeline import (generate_learning_materials, pregenerate_audio, pregenerated_session_id, TOPIC_TYPES,
+                            DETAIL_LEVELS)
+from utils.resilience import ResilientClient, PRIORITY_BACKGROUND
+from utils.storage import save_session, session_exists
+
+
+def parse_topic_file(path):
+    """Read (topic, topic_type, detail_level) entries, skipping blanks and # comments"""
+    entries = []
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [part.strip() for part in line.split('|')]
+            topic = parts[0]
+            topic_type = parts[1] if len(parts) > 1 and parts[1] else "Topic"
+            detail_level = parts[2] if len(parts) > 2 and parts[2] else "medium"
+            if topic_type not in TOPIC_TYPES:
+                raise ValueError(f"{path}:{line_number}: unknown topic type '{topic_type}' "
+                                 f"(expected one of {', '.join(TOPIC_TYPES)})")
+            if detail_level not in DETAIL_LEVELS:
+                raise ValueError(f"{path}:{line_number}: unknown detail level '{detail_level}' "
+                                 f"(expected one of {', '.join(DETAIL_LEVELS)})")
+            entries.append((topic, topic_type, detail_level))
+    return entries
+
+
+def load_checkpoint(path):
+    """Session ids already completed by a previous run"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if record.get("status") == "ok":
+                done.add(record["session_id"])
+    return done
+
+
+class Checkpoint:
+    """Append-only JSONL log of finished topics, safe to call from worker threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, **entry):
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+
+
+def pregenerate_topic(service, topic, topic_type, detail_level, num_images=3, num_questions=5,
+                      with_audio=True, tts_factory=None):
+    """Generate, narrate and save one topic; returns (session_id, errors)"""
+    session_id = pregenerated_session_id(topic, topic_type, detail_level)
+    session_data, errors = generate_learning_materials(
+        service, topic, topic_type, detail_level, num_images=num_images, num_questions=num_questions)
+    if "explanation" in errors:
+        return session_id, errors
+
+    if with_audio:
+        try:
+            session_data["audio_files"] = pregenerate_audio(session_id, session_data["explanation"],
+                                                            tts_factory=tts_factory)
+        except Exception as e:
+            errors["audio"] = str(e)
+
+    if not save_session(session_id, session_data):
+        errors["save"] = "could not write session"
+    return session_id, errors
+
+
+def build_service(args):
+    """Model client for the run: the offline stub or the shared pooled Gemini model"""
+    if args.stub:
+        from utils.stub_model import StubModel, StubTTS
+        model = StubModel(latency=args.stub_latency, failure_rate=args.stub_failure_rate)
+        return GenerationService(ResilientClient(model, "stub", PRIORITY_BACKGROUND)), StubTTS
+
+    from utils.model_pool import credential_key, get_model
+    api_key = args.api_key or os.environ.get("GEMINI_API_KEY", "")
+    if not api_key:
+        sys.exit("An API key is required: pass --api-key, set GEMINI_API_KEY, or use --stub")
+    model = get_model(api_key)
+    return GenerationService(ResilientClient(model, credential_key(api_key), PRIORITY_BACKGROUND)), None
+
+
+def run(entries, service, checkpoint_path, workers=4, num_images=3, num_questions=5, with_audio=True,
+        tts_factory=None, force=False):
+    """Pre-generate every pending entry with bounded concurrency and return a run report"""
+    done = set() if force else load_checkpoint(checkpoint_path)
+    pending, skipped = [], 0
+    for topic, topic_type, detail_level in entries:
+        session_id = pregenerated_session_id(topic, topic_type, detail_level)
+        if not force and (session_id in done or session_exists(session_id)):
+            skipped += 1
+        else:
+            pending.append((topic, topic_type, detail_level))
+
+    checkpoint = Checkpoint(checkpoint_path)
+    completed, failures, partial = 0, [], []
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(pregenerate_topic, service, topic, topic_type, detail_level,
+                            num_images, num_questions, with_audio, tts_factory): topic
+            for topic, topic_type, detail_level in pending
+        }
+        for future in as_completed(futures):
+            topic = futures[future]
+            try:
+                session_id, errors = future.result()
+            except Exception as e:
+                session_id, errors = None, {"pipeline": str(e)}
+
+            if "explanation" in errors or "save" in errors or session_id is None:
+                failures.append({"topic": topic, "errors": errors})
+                checkpoint.record(session_id=session_id, topic=topic, status="failed", errors=errors)
+                status = "FAILED"
+            else:
+                completed += 1
+                if errors:
+                    partial.append({"topic": topic, "errors": errors})
+                checkpoint.record(session_id=session_id, topic=topic, status="ok", errors=errors)
+                status = "ok" if not errors else "partial"
+            print(f"[{completed + len(failures)}/{len(pending)}] {status}: {topic}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "topics": len(entries),
+        "skipped": skipped,
+        "completed": completed,
+        "partial": partial,
+        "failed": failures,
+        "elapsed_seconds": round(elapsed, 3),
+        "topics_per_minute": round(completed / elapsed * 60, 2) if elapsed and completed else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate learning materials for a list of topics")
+    parser.add_argument("topics", help="topic list file (one topic per line, optional '| type | detail')")
+    parser.add_argument("--workers", type=int, default=4, help="topics generated concurrently")
+    parser.add_argument("--images", type=int, default=3, help="image descriptions per topic")
+    parser.add_argument("--questions", type=int, default=5, help="quiz questions per topic (0 to skip)")
+    parser.add_argument("--no-audio", action="store_true", help="skip narration")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <topics>.checkpoint.jsonl)")
+    parser.add_argument("--force", action="store_true", help="regenerate topics that already exist")
+    parser.add_argument("--api-key", help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument("--stub", action="store_true", help="use the offline stub model and TTS")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds per stub model call")
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0, help="fraction of stub calls that fail")
+    args = parser.parse_args(argv)
+
+    try:
+        entries = parse_topic_file(args.topics)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    service, tts_factory = build_service(args)
+    report = run(entries, service, args.checkpoint or f"{args.topics}.checkpoint.jsonl",
+                 workers=max(1, args.workers), num_images=args.images, num_questions=args.questions,
+                 with_audio=not args.no_audio, tts_factory=tts_factory, force=args.force)
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
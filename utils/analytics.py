@@ -0,0 +1,189 @@
+# utils/analytics.py
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+
+from utils.metrics import record_cache
+from utils.events import (get_daily_rollups, get_topic_rollups, get_data_version,
+                          EVENT_QUIZ_ANSWER, EVENT_PRACTICE_SUBMIT)
+
+# Number of cached frames, metrics and figure specs kept across all users
+CACHE_SIZE = 512
+
+# Window (in days) used for rolling quiz accuracy and recent-vs-previous improvement
+TREND_WINDOW = 7
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cached(user_id, name, builder):
+    """Return builder() for (user_id, name), rebuilt only when the user's event data changes"""
+    key = (user_id, name)
+    version = get_data_version(user_id)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] == version:
+            _cache.move_to_end(key)
+            record_cache("analytics", True)
+            return hit[1]
+
+    record_cache("analytics", False)
+
+    value = builder()
+    with _cache_lock:
+        _cache[key] = (version, value)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def invalidate(user_id):
+    """Drop a user's cached frames and figures (after their events were deleted)"""
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == user_id]:
+            del _cache[key]
+
+
+def _load_daily_frame(user_id):
+    columns = get_daily_rollups(user_id)
+    return {
+        "day": np.array(columns["day"], dtype="datetime64[D]"),
+        "event_type": np.array(columns["event_type"], dtype=object),
+        "study_seconds": np.array(columns["study_seconds"], dtype=np.float64),
+        "correct": np.array(columns["correct"], dtype=np.int64),
+        "answered": np.array(columns["answered"], dtype=np.int64)
+    }
+
+
+def _load_topic_frame(user_id):
+    columns = get_topic_rollups(user_id)
+    return {
+        "topic": np.array(columns["topic"], dtype=object),
+        "study_seconds": np.array(columns["study_seconds"], dtype=np.float64),
+        "correct": np.array(columns["correct"], dtype=np.int64),
+        "answered": np.array(columns["answered"], dtype=np.int64),
+        "last_ts": np.array(columns["last_ts"], dtype=np.float64)
+    }
+
+
+def get_daily_frame(user_id):
+    """Columnar per-day, per-event-type rollups for a user"""
+    return cached(user_id, "daily_frame", lambda: _load_daily_frame(user_id))
+
+
+def get_topic_frame(user_id):
+    """Columnar per-topic rollups for a user"""
+    return cached(user_id, "topic_frame", lambda: _load_topic_frame(user_id))
+
+
+def compute_streak(days, today=None):
+    """Length of the run of consecutive days ending today (or yesterday) in a sorted unique day array"""
+    if days.size == 0:
+        return 0
+    # Rollup days are local dates, while numpy's "today" is the UTC date
+    today = np.datetime64(today or datetime.now().strftime("%Y-%m-%d"), "D")
+    if days[-1] < today - 1:
+        return 0
+    breaks = np.flatnonzero(np.diff(days).astype(np.int64) != 1)
+    start = breaks[-1] + 1 if breaks.size else 0
+    return int(days.size - start)
+
+
+def compute_daily_series(daily):
+    """Collapse event types into one row per day: study minutes and answer accuracy"""
+    days, index = np.unique(daily["day"], return_inverse=True)
+    minutes = np.bincount(index, weights=daily["study_seconds"], minlength=days.size) / 60
+    correct = np.bincount(index, weights=daily["correct"], minlength=days.size)
+    answered = np.bincount(index, weights=daily["answered"], minlength=days.size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = np.where(answered > 0, 100 * correct / answered, np.nan)
+    return {"day": days, "minutes": minutes, "correct": correct, "answered": answered, "accuracy": accuracy}
+
+
+def compute_quiz_trend(series, window=TREND_WINDOW):
+    """Rolling accuracy over the last `window` active days, weighted by answers"""
+    correct = np.cumsum(series["correct"])
+    answered = np.cumsum(series["answered"])
+    correct[window:] = correct[window:] - correct[:-window].copy()
+    answered[window:] = answered[window:] - answered[:-window].copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(answered > 0, 100 * correct / answered, np.nan)
+
+
+def compute_improvement(series, window=TREND_WINDOW):
+    """Accuracy slope (points per day) and recent-vs-previous window change"""
+    mask = series["answered"] > 0
+    days = series["day"][mask].astype(np.int64)
+    accuracy = series["accuracy"][mask]
+    improvement = {"accuracy_slope": 0.0, "recent_accuracy": None, "accuracy_change": None}
+    if days.size == 0:
+        return improvement
+    if days.size >= 2:
+        improvement["accuracy_slope"] = float(np.polyfit(days - days[0], accuracy, 1)[0])
+
+    recent = series["day"][mask] > series["day"][mask][-1] - window
+    correct = series["correct"][mask]
+    answered = series["answered"][mask]
+    improvement["recent_accuracy"] = float(100 * correct[recent].sum() / answered[recent].sum())
+    if (~recent).any():
+        previous = float(100 * correct[~recent].sum() / answered[~recent].sum())
+        improvement["accuracy_change"] = improvement["recent_accuracy"] - previous
+    return improvement
+
+
+def _build_usage_summary(user_id):
+    daily = get_daily_frame(user_id)
+    if daily["day"].size == 0:
+        return {}
+    topics = get_topic_frame(user_id)
+    series = compute_daily_series(daily)
+
+    quiz = daily["event_type"] == EVENT_QUIZ_ANSWER
+    practice = daily["event_type"] == EVENT_PRACTICE_SUBMIT
+    quiz_answered = int(daily["answered"][quiz].sum())
+    day_labels = np.datetime_as_string(series["day"]).tolist()
+    has_answers = series["answered"] > 0
+    total_minutes = float(series["minutes"].sum())
+
+    return {
+        "study_streak": compute_streak(series["day"]),
+        "total_study_minutes": round(total_minutes),
+        "total_study_time": round(total_minutes / 60, 1),
+        "topics_covered": int(topics["topic"].size),
+        "last_study_date": day_labels[-1],
+        "total_problems": int(daily["answered"][practice].sum()),
+        "quiz_success_rate": round(100 * int(daily["correct"][quiz].sum()) / quiz_answered, 1) if quiz_answered else 0,
+        "subject_distribution": dict(zip(topics["topic"].tolist(),
+                                         np.round(topics["study_seconds"] / 60, 1).tolist())),
+        "activity_timeline": dict(zip(day_labels, np.round(series["minutes"], 1).tolist())),
+        "improvement_metrics": dict(zip(np.array(day_labels)[has_answers].tolist(),
+                                        np.round(series["accuracy"][has_answers], 1).tolist())),
+        "quiz_trend": dict(zip(np.array(day_labels)[has_answers].tolist(),
+                               np.round(compute_quiz_trend(series)[has_answers], 1).tolist())),
+        **compute_improvement(series)
+    }
+
+
+def get_usage_summary(user_id):
+    """Dashboard and Settings statistics, recomputed only when new events arrive"""
+    return cached(user_id, "usage_summary", lambda: _build_usage_summary(user_id))
+
+
+def get_activity_frame(user_id):
+    """Study minutes per day as a pandas DataFrame indexed by date"""
+    def build():
+        import pandas as pd
+
+        series = compute_daily_series(get_daily_frame(user_id))
+        return pd.DataFrame({"Minutes": series["minutes"]},
+                            index=pd.DatetimeIndex(series["day"], name="Date"))
+
+    return cached(user_id, "activity_frame", build)
+
+
+def cached_figure(user_id, name, builder):
+    """Cache a Plotly figure as a plain dict spec until the user's event data changes"""
+    return cached(user_id, f"figure:{name}", lambda: builder().to_dict())
@@ -1,20 +1,151 @@
 # utils/api_connector.py
-import google.generativeai as genai
 import streamlit as st
 import re
 
+from utils.model_pool import get_model, credential_key
+from utils.generation import GenerationService
+from utils.resilience import ResilientClient, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+
 def setup_gemini(api_key):
     """Setup connection to Google Gemini API"""
     try:
-        genai.configure(api_key=api_key)
-        # Initialize models once and store in session state
-        st.session_state.gemini_model = genai.GenerativeModel('gemini-2.0-flash')
+        # The client and model are pooled per process; the session only keeps its credentials
+        get_model(api_key)
+        st.session_state.gemini_api_key = api_key
         return True
     except Exception as e:
         st.error(f"Error setting up Gemini API: {e}")
         return False
 
+
+def get_session_model():
+    """Return the shared Gemini model for the current session's credentials"""
+    api_key = st.session_state.get('gemini_api_key')
+    if not api_key:
+        raise RuntimeError("Gemini API is not configured")
+    return get_model(api_key)
+
+
+def get_session_service(priority=PRIORITY_INTERACTIVE):
+    """Return a rate-limited, retrying generation service bound to the current session's model"""
+    try:
+        model = get_session_model()
+        return GenerationService(ResilientClient(model, credential_key(st.session_state.gemini_api_key), priority))
+    except RuntimeError:
+        # Unconfigured sessions still get a service; its calls fail with a readable error
+        return GenerationService(_UnconfiguredClient())
+
+
+class _UnconfiguredClient:
+    def generate_content(self, prompt):
+        raise RuntimeError("Gemini API is not configured")
+
+
 def is_valid_api_key_format(api_key):
     """Check if string matches typical Gemini API key format"""
     # Basic check for Google API key format
     return bool(api_key and len(api_key) > 20 and api_key.startswith("AIza"))
+
+
+def study_material(query):
+    """Passages of the student's saved sessions relevant to the query ("" if the index cannot be read)"""
+    from utils.retrieval import build_context
+
+    try:
+        return build_context(query, st.session_state.get('user_id', 'anonymous'))
+    except Exception as e:
+        st.warning(f"Could not search your saved sessions: {e}")
+        return ""
+
+
+def generate_response(user_message, context):
+    """Generate a tutor reply grounded in passages from the student's saved sessions"""
+    topic = context.get("topic", "")
+    result = get_session_service().chat_response(
+        user_message,
+        topic=topic,
+        persona=context.get("persona", "Helpful Guide"),
+        chat_history=context.get("chat_history", []),
+        study_material=study_material(f"{topic} {user_message}".strip())
+    )
+    if not result.ok:
+        st.error(f"Error generating response: {result.error}")
+    return result.value
+
+
+def check_solutions(responses):
+    """Grade (problem, answer) pairs, locally where possible and the rest in one model call.
+
+    Returns (is_correct, feedback) tuples in the same order.
+    """
+    from utils.grading import grade_answers
+
+    grades = grade_answers(get_session_service(), responses)
+    return [(grade.correct, grade.feedback) for grade in grades]
+
+
+def check_solution(problem, answer):
+    """Grade a single practice answer; returns (is_correct, feedback)"""
+    return check_solutions([(problem, answer)])[0]
+
+
+def generate_practice_problems(topic, difficulty="Intermediate", problem_type="Mixed", num_problems=5,
+                               include_hints=True, include_solutions=True):
+    """Serve a practice set from the problem bank, generating only what the bank lacks"""
+    from utils.problem_bank import PROBLEM_TYPES, serve_problems
+
+    problems, error = serve_problems(
+        get_session_service(), st.session_state.get('user_id', 'anonymous'), topic, difficulty,
+        PROBLEM_TYPES.get(problem_type), num_problems,
+        background_service=get_session_service(PRIORITY_BACKGROUND)
+    )
+    if error and len(problems) < num_problems:
+        st.error(f"Error generating practice problems: {error}")
+    for problem in problems:
+        if not include_hints:
+            problem.pop("hints", None)
+        if not include_solutions:
+            problem.pop("solution", None)
+    return problems
+
+
+def topic_context(topic):
+    """The session's explanation when it is about this topic, otherwise passages of saved sessions"""
+    explanation = ""
+    if st.session_state.get('current_topic', '').strip().lower() == topic.strip().lower():
+        explanation = st.session_state.get('explanation') or ""
+    return explanation or study_material(topic)
+
+
+def generate_mind_map(topic, concepts=(), depth=3, style="Hierarchical", context=None):
+    """Build and lay out a mind map for a topic; returns {hash, style, tree, svg, dot} or None.
+
+    The concept tree is grounded in `context` (default: topic_context(topic)).
+    If the model call fails, the locally extracted concepts become a one-level map.
+    """
+    from utils.mind_map import layout_mind_map, seed_tree, to_dot
+
+    explanation = topic_context(topic) if context is None else context
+    result = get_session_service().mind_map(topic, explanation, list(concepts)[:8], depth)
+    tree = result.value
+    if not result.ok:
+        if not concepts:
+            st.error(f"Error generating mind map: {result.error}")
+            return None
+        st.warning(f"Showing a map of the key concepts only ({result.error})")
+        tree = seed_tree(topic, concepts)
+
+    map_hash, svg = layout_mind_map(tree, style)
+    return {"hash": map_hash, "style": style, "tree": tree, "svg": svg, "dot": to_dot(tree, style)}
+
+
+def generate_image(description):
+    """Render a visual aid for a description (the text model has no image output, so this is drawn locally)"""
+    from utils.image_utils import render_placeholder_image
+
+    try:
+        return render_placeholder_image(description, 0)
+    except Exception as e:
+        st.error(f"Error generating image: {e}")
+        return None
@@ -0,0 +1,267 @@
+# utils/artifacts.py - Lifecycle of generated files (narration, spilled session state)
+#
+# Scratch artifacts live under <data dir>/scratch/<pid>/<kind>/ and are owned by
+# the browser session that created them. Every page run renews its session's
+# lease; a background sweeper deletes files whose owner has gone idle, unowned
+# files past their maximum age, and - while the data directory is over its disk
+# quota - the least recently used scratch files and saved-session narration
+# (load_session regenerates narration that is missing). On startup, scratch
+# directories of dead processes and narration of sessions that were never saved
+# are removed.
+
+import os
+import time
+import uuid
+import shutil
+import threading
+
+from utils.storage import ensure_data_dir
+from utils.metrics import increment, observe_size
+
+# Disk budget for everything under the data directory except saved session JSON
+QUOTA_BYTES = int(float(os.environ.get("LEARNMATE_ARTIFACT_QUOTA_MB", 512)) * 2 ** 20)
+# Unowned scratch files (e.g. from background threads) are kept this long
+MAX_AGE = float(os.environ.get("LEARNMATE_ARTIFACT_MAX_AGE", 15 * 60))
+# A session that has not run a page for this long releases its files
+LEASE_SECONDS = float(os.environ.get("LEARNMATE_ARTIFACT_LEASE", 2 * 3600))
+SWEEP_INTERVAL = float(os.environ.get("LEARNMATE_ARTIFACT_SWEEP_INTERVAL", 60))
+# Narration directories younger than this may belong to a session still being generated
+ORPHAN_GRACE = 3600
+
+
+def current_owner():
+    """Id of the browser session running this script, or None outside a page run"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _remove(path):
+    """Delete a file or directory tree; return the bytes freed"""
+    size = _tree_size(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            return 0
+    return size
+
+
+def _tree_size(path):
+    if not os.path.isdir(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ArtifactManager:
+    """Tracks which session owns each scratch file and garbage-collects the rest"""
+
+    def __init__(self, data_dir, quota=QUOTA_BYTES, max_age=MAX_AGE, lease=LEASE_SECONDS,
+                 clock=time.time):
+        self.data_dir = data_dir
+        self.scratch_root = os.path.join(data_dir, "scratch")
+        self.scratch_dir = os.path.join(self.scratch_root, str(os.getpid()))
+        self.quota = quota
+        self.max_age = max_age
+        self.lease = lease
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._owners = {}   # path -> owning session id (None when unowned)
+        self._seen = {}     # session id -> last page run
+        self._sweeper = None
+        self._stop = threading.Event()
+        # A restarted process can get its predecessor's pid (PID 1 in a container), and
+        # nothing in a directory left by that process is tracked here
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        os.makedirs(self.scratch_dir, exist_ok=True)
+
+    # --- references ----------------------------------------------------------
+
+    def new_path(self, kind, suffix="", owner=None):
+        """Reserve a fresh scratch path owned by the given (default: current) session"""
+        directory = os.path.join(self.scratch_dir, kind)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, uuid.uuid4().hex + suffix)
+        self.acquire(path, owner)
+        return path
+
+    def scratch_subdir(self, kind, name, owner=None):
+        """A scratch directory tracked like a single file (e.g. a session's spilled state)"""
+        path = os.path.join(self.scratch_dir, kind, name)
+        os.makedirs(path, exist_ok=True)
+        self.acquire(path, owner)
+        return path
+
+    def acquire(self, path, owner=None):
+        owner = owner or current_owner()
+        with self._lock:
+            self._owners[path] = owner
+            if owner is not None:
+                self._seen[owner] = self._clock()
+
+    def release(self, path):
+        """Drop a reference; the file is deleted on the next sweep"""
+        with self._lock:
+            if path in self._owners:
+                self._owners[path] = None
+
+    def touch(self, owner=None):
+        """Renew the lease on every file the session owns"""
+        owner = owner or current_owner()
+        if owner is not None:
+            with self._lock:
+                self._seen[owner] = self._clock()
+
+    # --- collection ----------------------------------------------------------
+
+    def disk_usage(self):
+        """Bytes used by scratch files and saved-session narration"""
+        return _tree_size(self.scratch_root) + _tree_size(os.path.join(self.data_dir, "audio"))
+
+    def _delete(self, path, reason):
+        freed = _remove(path)
+        with self._lock:
+            self._owners.pop(path, None)
+        increment("artifact_deletions_total", reason=reason)
+        return freed
+
+    def sweep(self):
+        """One garbage-collection pass; returns bytes freed per reason"""
+        now = self._clock()
+        freed = {"expired": 0, "unowned": 0, "quota": 0}
+        with self._lock:
+            idle = {owner for owner, seen in self._seen.items() if now - seen > self.lease}
+            for owner in idle:
+                del self._seen[owner]
+            tracked = dict(self._owners)
+
+        candidates = []
+        for path, owner in tracked.items():
+            if not os.path.exists(path):
+                with self._lock:
+                    self._owners.pop(path, None)
+                continue
+            mtime = os.path.getmtime(path)
+            if owner in idle:
+                freed["expired"] += self._delete(path, "expired")
+            elif owner is None and now - mtime > self.max_age:
+                freed["unowned"] += self._delete(path, "unowned")
+            elif owner is None:
+                candidates.append((0, mtime, path))
+            else:
+                candidates.append((2, self._seen.get(owner, mtime), path))
+
+        usage = self.disk_usage()
+        if usage > self.quota:
+            # Over quota: unowned files first, then saved-session narration (it can be
+            # regenerated), then files of the least recently active sessions
+            audio_root = os.path.join(self.data_dir, "audio")
+            if os.path.isdir(audio_root):
+                for name in os.listdir(audio_root):
+                    path = os.path.join(audio_root, name)
+                    candidates.append((1, os.path.getmtime(path), path))
+            for _, _, path in sorted(candidates):
+                if usage <= self.quota:
+                    break
+                size = self._delete(path, "quota")
+                freed["quota"] += size
+                usage -= size
+        observe_size("artifact_disk_bytes", usage)
+        return freed
+
+    def reconcile(self):
+        """Remove what a crashed or restarted process left behind; returns bytes freed"""
+        freed = 0
+        now = self._clock()
+        if os.path.isdir(self.scratch_root):
+            for name in os.listdir(self.scratch_root):
+                # This process's own directory was emptied when the manager was created
+                if name != str(os.getpid()) and not (name.isdigit() and _pid_alive(int(name))):
+                    freed += _remove(os.path.join(self.scratch_root, name))
+
+        # Narration whose session JSON was never written (the process died mid-generation)
+        audio_root = os.path.join(self.data_dir, "audio")
+        _, sessions_dir = ensure_data_dir()
+        if os.path.isdir(audio_root):
+            for session_id in os.listdir(audio_root):
+                path = os.path.join(audio_root, session_id)
+                saved = os.path.exists(os.path.join(sessions_dir, f"{session_id}.json"))
+                if not saved and now - os.path.getmtime(path) > ORPHAN_GRACE:
+                    freed += _remove(path)
+
+        if freed:
+            increment("artifact_deletions_total", reason="startup")
+        return freed
+
+    def start_sweeper(self, interval=SWEEP_INTERVAL):
+        """Run sweep() every `interval` seconds on a daemon thread (idempotent)"""
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._run, args=(interval,),
+                                             name="artifact-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception:
+                # A failed pass (e.g. a file vanishing mid-walk) is retried on the next one
+                increment("artifact_sweep_errors_total")
+
+    def stop(self):
+        self._stop.set()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_artifact_manager():
+    """Return the process-wide manager, reconciling leftovers and starting the sweeper on first use"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                data_dir, _ = ensure_data_dir()
+                manager = ArtifactManager(data_dir)
+                manager.reconcile()
+                manager.start_sweeper()
+                _manager = manager
+    return _manager
+
+
+def new_artifact_path(kind, suffix=""):
+    """Fresh scratch path owned by the current browser session"""
+    return get_artifact_manager().new_path(kind, suffix)
+
+
+def touch_session():
+    """Renew the current session's lease on its artifacts"""
+    get_artifact_manager().touch()
@@ -1,19 +1,46 @@
 
 # utils/audio_utils.py
 import os
-import tempfile
-from gtts import gTTS
 import base64
 import streamlit as st
 
+from utils.bootstrap import lazy_import
+from utils.metrics import span, observe_size
+
+gtts = lazy_import("gtts")
+
+# gTTS-compatible factory that replaces gTTS for every caller (see install_tts_factory)
+_installed_tts_factory = None
+
+
+def install_tts_factory(tts_factory):
+    """Synthesize all speech with this gTTS-compatible factory (used by offline harnesses); None restores gTTS"""
+    global _installed_tts_factory
+    _installed_tts_factory = tts_factory
+
+
+def synthesize_speech(text, out_path, voice='en-US', speed=1.0, tts_factory=None):
+    """Write spoken text to out_path (no Streamlit calls; tts_factory defaults to gTTS)"""
+    if tts_factory is None:
+        tts_factory = _installed_tts_factory or gtts.gTTS
+    with span("tts.synthesize"):
+        tts = tts_factory(text=text, lang=voice[:2], slow=speed < 1.0)
+        tts.save(out_path)
+    observe_size("audio_file_bytes", os.path.getsize(out_path))
+    return out_path
+
+
 def generate_audio(text, voice='en-US', speed=1.0):
     """Generate audio file from text using gTTS"""
+    from utils.artifacts import get_artifact_manager
+
+    # Owned by the current session, so the sweeper deletes it once the session is gone
+    manager = get_artifact_manager()
+    path = manager.new_path("audio", ".mp3")
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_audio:
-            tts = gTTS(text=text, lang=voice[:2], slow=False)
-            tts.save(temp_audio.name)
-            return temp_audio.name
+        return synthesize_speech(text, path, voice, speed)
     except Exception as e:
+        manager.release(path)
         st.error(f"Error generating audio: {e}")
         return None
 
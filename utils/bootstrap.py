@@ -0,0 +1,81 @@
+# utils/bootstrap.py
+import sys
+import types
+import importlib
+import threading
+from functools import lru_cache
+
+import streamlit as st
+
+FONT_SIZE_MAP = {
+    "small": "0.9rem",
+    "medium": "1rem",
+    "large": "1.2rem",
+    "x-large": "1.5rem"
+}
+
+DARK_MODE_CSS = """
+    .main {background-color: #1E1E1E; color: #FFFFFF;}
+    .stTextInput > div > div > input {background-color: #2E2E2E; color: #FFFFFF;}
+    .stSelectbox > div > div > select {background-color: #2E2E2E; color: #FFFFFF;}
+"""
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that performs the real import on first attribute access"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """Return the module if it is already imported, otherwise a proxy that imports it on first use"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+@lru_cache(maxsize=None)
+def build_theme_css(dark_mode, font_size):
+    """Build the theme stylesheet for a dark-mode / font-size combination"""
+    return f"""
+    <style>
+        {DARK_MODE_CSS if dark_mode else ""}
+        .main p, .main li {{
+            font-size: {FONT_SIZE_MAP.get(font_size, FONT_SIZE_MAP["medium"])};
+        }}
+    </style>
+    """
+
+
+def apply_theme():
+    """Inject the theme and font-size CSS for the current session's preferences"""
+    from utils.preferences import sync_preferences
+
+    sync_preferences()
+    dark_mode = bool(st.session_state.get('dark_mode', False))
+    font_size = st.session_state.get('font_size', "medium")
+    st.markdown(build_theme_css(dark_mode, font_size), unsafe_allow_html=True)
@@ -0,0 +1,296 @@
+# utils/events.py
+import os
+import json
+import time
+import heapq
+import atexit
+import threading
+from datetime import datetime
+
+from utils.storage import ensure_data_dir, connect_db
+
+# Event types written to the study log
+EVENT_GENERATION = "generation"
+EVENT_AUDIO_PLAY = "audio_play"
+EVENT_QUIZ_ANSWER = "quiz_answer"
+EVENT_PRACTICE_SUBMIT = "practice_submit"
+EVENT_CHAT_TURN = "chat_turn"
+
+# Buffered events are written once either limit is reached
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 5.0
+
+# Gaps between events shorter than IDLE_GAP count as study time;
+# the first event after a break is credited DEFAULT_EVENT_SECONDS
+IDLE_GAP = 15 * 60
+DEFAULT_EVENT_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    user_id TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    topic TEXT,
+    study_seconds REAL NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_by_user ON events (user_id, event_type, ts);
+CREATE INDEX IF NOT EXISTS events_by_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_by_user_id ON events (user_id, id);
+CREATE INDEX IF NOT EXISTS events_by_user_type_id ON events (user_id, event_type, id);
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    study_seconds REAL NOT NULL,
+    correct INTEGER NOT NULL,
+    answered INTEGER NOT NULL,
+    PRIMARY KEY (user_id, day, event_type)
+);
+CREATE TABLE IF NOT EXISTS topic_rollup (
+    user_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    study_seconds REAL NOT NULL,
+    correct INTEGER NOT NULL,
+    answered INTEGER NOT NULL,
+    first_ts REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    PRIMARY KEY (user_id, topic)
+);
+CREATE TABLE IF NOT EXISTS user_state (
+    user_id TEXT PRIMARY KEY,
+    last_ts REAL NOT NULL
+);
+"""
+
+_buffer = []
+_buffer_lock = threading.Lock()
+_last_flush = time.time()
+
+
+def get_events_path():
+    """Return the path of the study event database"""
+    data_dir, _ = ensure_data_dir()
+    return os.path.join(data_dir, "study_events.db")
+
+
+def _connect():
+    """Return this thread's connection to the event database"""
+    return connect_db("study_events.db", _SCHEMA)
+
+
+def record_event(user_id, event_type, topic=None, duration=None, correct=None, answered=None, **data):
+    """Buffer a study event; events are written to disk in batches"""
+    global _last_flush
+    event = {
+        "ts": time.time(),
+        "user_id": user_id or "anonymous",
+        "event_type": event_type,
+        "topic": topic or None,
+        "duration": duration,
+        "correct": int(correct or 0),
+        "answered": int(answered if answered is not None else correct is not None),
+        "data": data
+    }
+    with _buffer_lock:
+        _buffer.append(event)
+        due = len(_buffer) >= BATCH_SIZE or event["ts"] - _last_flush >= FLUSH_INTERVAL
+    if due:
+        flush_events()
+
+
+def flush_events():
+    """Write buffered events and fold them into the daily and per-topic rollups"""
+    global _last_flush
+    with _buffer_lock:
+        batch = _buffer[:]
+        _buffer.clear()
+        _last_flush = time.time()
+    if not batch:
+        return 0
+
+    batch.sort(key=lambda e: e["ts"])
+    conn = _connect()
+    with conn:
+        users = {e["user_id"] for e in batch}
+        last_seen = dict(conn.execute(
+            f"SELECT user_id, last_ts FROM user_state WHERE user_id IN ({', '.join('?' * len(users))})",
+            tuple(users)
+        ).fetchall())
+
+        event_rows = []
+        daily = {}
+        topics = {}
+        for e in batch:
+            if e["duration"] is not None:
+                seconds = float(e["duration"])
+            else:
+                gap = e["ts"] - last_seen.get(e["user_id"], float("-inf"))
+                seconds = gap if 0 < gap <= IDLE_GAP else DEFAULT_EVENT_SECONDS
+            last_seen[e["user_id"]] = e["ts"]
+
+            event_rows.append((e["ts"], e["user_id"], e["event_type"], e["topic"], seconds,
+                               json.dumps({**e["data"], "correct": e["correct"], "answered": e["answered"]})))
+
+            day = datetime.fromtimestamp(e["ts"]).strftime("%Y-%m-%d")
+            d = daily.setdefault((e["user_id"], day, e["event_type"]), [0, 0.0, 0, 0])
+            d[0] += 1
+            d[1] += seconds
+            d[2] += e["correct"]
+            d[3] += e["answered"]
+
+            if e["topic"]:
+                t = topics.setdefault((e["user_id"], e["topic"]), [0, 0.0, 0, 0, e["ts"], e["ts"]])
+                t[0] += 1
+                t[1] += seconds
+                t[2] += e["correct"]
+                t[3] += e["answered"]
+                t[5] = e["ts"]
+
+        conn.executemany(
+            "INSERT INTO events (ts, user_id, event_type, topic, study_seconds, data) VALUES (?, ?, ?, ?, ?, ?)",
+            event_rows
+        )
+        conn.executemany("""
+            INSERT INTO daily_rollup VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, day, event_type) DO UPDATE SET
+                events = events + excluded.events,
+                study_seconds = study_seconds + excluded.study_seconds,
+                correct = correct + excluded.correct,
+                answered = answered + excluded.answered
+        """, [(*key, *values) for key, values in daily.items()])
+        conn.executemany("""
+            INSERT INTO topic_rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, topic) DO UPDATE SET
+                events = events + excluded.events,
+                study_seconds = study_seconds + excluded.study_seconds,
+                correct = correct + excluded.correct,
+                answered = answered + excluded.answered,
+                last_ts = max(last_ts, excluded.last_ts)
+        """, [(*key, *values) for key, values in topics.items()])
+        conn.executemany("""
+            INSERT INTO user_state VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET last_ts = max(last_ts, excluded.last_ts)
+        """, [(user_id, last_seen[user_id]) for user_id in users])
+    return len(batch)
+
+
+atexit.register(flush_events)
+
+
+def get_data_version(user_id):
+    """Return a token that changes whenever new events are recorded for the user"""
+    flush_events()
+    row = _connect().execute("SELECT last_ts FROM user_state WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def count_events(user_id, event_types=None):
+    """Number of recorded events for a user (optionally of the given types)"""
+    flush_events()
+    where = "user_id = ?"
+    if event_types:
+        where += f" AND event_type IN ({', '.join('?' * len(event_types))})"
+    return _connect().execute(f"SELECT COUNT(*) FROM events WHERE {where}",
+                              (user_id, *(event_types or ()))).fetchone()[0]
+
+
+def _iter_event_rows(conn, user_id, event_type, batch_size):
+    """A user's event rows (of one type, or all) in id order, one indexed range read per batch"""
+    where = "user_id = ? AND id > ?" + (" AND event_type = ?" if event_type else "")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, ts, event_type, topic, study_seconds, data FROM events WHERE {where} ORDER BY id LIMIT ?",
+            (user_id, last_id, *((event_type,) if event_type else ()), batch_size)
+        ).fetchall()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+
+def iter_events(user_id, event_types=None, batch_size=500):
+    """Yield a user's events oldest first as dicts, reading batch_size rows at a time"""
+    flush_events()
+    conn = _connect()
+    if event_types:
+        # Each type is paged along its own index range and the streams merged by id
+        rows = heapq.merge(*(_iter_event_rows(conn, user_id, event_type, batch_size)
+                             for event_type in set(event_types)))
+    else:
+        rows = _iter_event_rows(conn, user_id, None, batch_size)
+    for event_id, ts, event_type, topic, seconds, data in rows:
+        yield {"id": event_id, "ts": ts, "event_type": event_type, "topic": topic,
+               "study_seconds": seconds, **json.loads(data or "{}")}
+
+
+def delete_events(user_id, event_types=None):
+    """Delete a user's events (all, or of the given types) and take them out of the rollups"""
+    flush_events()
+    type_filter, params = "", (user_id,)
+    if event_types:
+        type_filter = f" AND event_type IN ({', '.join('?' * len(event_types))})"
+        params += tuple(event_types)
+    conn = _connect()
+    with conn:
+        if not event_types:
+            for table in ("daily_rollup", "topic_rollup", "user_state"):
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+        else:
+            conn.execute(f"DELETE FROM daily_rollup WHERE user_id = ?{type_filter}", params)
+            # Topic rollups mix event types: subtract what the deleted events contributed
+            conn.execute(f"""
+                UPDATE topic_rollup SET
+                    events = topic_rollup.events - d.n,
+                    study_seconds = topic_rollup.study_seconds - d.seconds,
+                    correct = topic_rollup.correct - d.n_correct,
+                    answered = topic_rollup.answered - d.n_answered
+                FROM (
+                    SELECT topic, COUNT(*) AS n, SUM(study_seconds) AS seconds,
+                           SUM(json_extract(data, '$.correct')) AS n_correct,
+                           SUM(json_extract(data, '$.answered')) AS n_answered
+                    FROM events WHERE user_id = ?{type_filter} AND topic IS NOT NULL GROUP BY topic
+                ) AS d
+                WHERE topic_rollup.user_id = ? AND topic_rollup.topic = d.topic
+            """, params + (user_id,))
+            conn.execute("DELETE FROM topic_rollup WHERE user_id = ? AND events <= 0", (user_id,))
+        deleted = conn.execute(f"DELETE FROM events WHERE user_id = ?{type_filter}", params).rowcount
+    return deleted
+
+
+def delete_events_before(cutoff_ts):
+    """Delete raw events older than cutoff_ts for all users; the rollups keep their totals"""
+    flush_events()
+    conn = _connect()
+    with conn:
+        return conn.execute("DELETE FROM events WHERE ts < ?", (cutoff_ts,)).rowcount
+
+
+def _columns(names, rows):
+    """Transpose query rows into a dict of column lists"""
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: list(values) for name, values in zip(names, columns)}
+
+
+def get_daily_rollups(user_id):
+    """Return the user's per-day, per-event-type aggregates as columns ordered by day"""
+    flush_events()
+    rows = _connect().execute("""
+        SELECT day, event_type, events, study_seconds, correct, answered
+        FROM daily_rollup WHERE user_id = ? ORDER BY day
+    """, (user_id,)).fetchall()
+    return _columns(("day", "event_type", "events", "study_seconds", "correct", "answered"), rows)
+
+
+def get_topic_rollups(user_id):
+    """Return the user's per-topic aggregates as columns, most recently studied first"""
+    flush_events()
+    rows = _connect().execute("""
+        SELECT topic, events, study_seconds, correct, answered, first_ts, last_ts
+        FROM topic_rollup WHERE user_id = ? ORDER BY last_ts DESC
+    """, (user_id,)).fetchall()
+    return _columns(("topic", "events", "study_seconds", "correct", "answered", "first_ts", "last_ts"), rows)
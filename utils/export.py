@@ -0,0 +1,196 @@
+# utils/export.py - Streaming export of a user's data
+#
+# Every category is a generator that reads its source a file or a batch of rows
+# at a time, and the writers emit each record as soon as it is read, so the
+# export's memory use does not grow with the number of records. Output goes to
+# a scratch file (JSON Lines, CSV or a zip with one JSON Lines file per category
+# plus the saved visual assets) which the caller hands to the browser.
+
+import os
+import csv
+import json
+import zipfile
+from datetime import datetime
+
+from utils.metrics import span, increment
+
+# Records between progress callbacks
+PROGRESS_EVERY = 200
+
+EXPORT_FORMATS = {
+    "JSON Lines": (".jsonl", "application/x-ndjson"),
+    "CSV": (".csv", "text/csv"),
+    "ZIP": (".zip", "application/zip"),
+}
+
+CSV_COLUMNS = ("category", "id", "date", "topic", "data")
+
+
+def _date(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def iter_learning_history(user_id):
+    from utils.storage import iter_user_sessions
+
+    for session_id, data in iter_user_sessions(user_id):
+        # Narration paths point into this server's data directory and mean nothing elsewhere
+        record = {key: value for key, value in data.items() if key != "audio_files"}
+        yield {"id": session_id, "date": data.get("date", ""), "topic": data.get("topic", ""), **record}
+
+
+def iter_practice_sessions(user_id):
+    from utils.storage import iter_jsonl, _practice_history_path
+
+    for i, session in enumerate(iter_jsonl(_practice_history_path(user_id)), 1):
+        yield {"id": i, "date": session.get("timestamp", ""), **session}
+
+
+def iter_quiz_results(user_id):
+    from utils.events import iter_events, EVENT_QUIZ_ANSWER
+
+    for event in iter_events(user_id, (EVENT_QUIZ_ANSWER,)):
+        ts = event.pop("ts")
+        yield {**event, "date": _date(ts), "topic": event.get("topic") or ""}
+
+
+def iter_chat_history(user_id):
+    from utils.storage import iter_jsonl, _chat_history_path
+
+    for i, chat in enumerate(iter_jsonl(_chat_history_path(user_id)), 1):
+        yield {"id": i, "date": chat.get("timestamp", ""), **chat}
+
+
+def iter_visual_aids(user_id):
+    from utils.visual_store import iter_visuals, load_visual
+
+    for visual in iter_visuals(user_id):
+        if visual["type"] == "mind_map":
+            # Mind maps are small records; images are only included in the zip bundle
+            visual["mind_map"] = load_visual(visual)
+        yield visual
+
+
+EXPORT_CATEGORIES = {
+    "Learning history": iter_learning_history,
+    "Practice sessions": iter_practice_sessions,
+    "Quiz results": iter_quiz_results,
+    "Chat history": iter_chat_history,
+    "Visual aids": iter_visual_aids,
+}
+
+
+def _count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    lines = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+    return lines
+
+
+def count_records(user_id, categories):
+    """Number of records an export of these categories will contain (for progress reporting)"""
+    from utils.storage import user_session_ids, _practice_history_path, _chat_history_path
+    from utils.events import count_events, EVENT_QUIZ_ANSWER
+    from utils.visual_store import list_visuals
+
+    total = 0
+    for category in categories:
+        if category == "Learning history":
+            total += len(user_session_ids(user_id))
+        elif category == "Practice sessions":
+            total += _count_lines(_practice_history_path(user_id))
+        elif category == "Quiz results":
+            total += count_events(user_id, (EVENT_QUIZ_ANSWER,))
+        elif category == "Chat history":
+            total += _count_lines(_chat_history_path(user_id))
+        elif category == "Visual aids":
+            total += list_visuals(user_id, page_size=0)[1]
+    return total
+
+
+def _slug(category):
+    return category.lower().replace(" ", "_")
+
+
+def _records(user_id, categories):
+    """(category, record) pairs across the selected categories, in order"""
+    for category in categories:
+        for record in EXPORT_CATEGORIES[category](user_id):
+            yield category, record
+
+
+def _write_jsonl(f, records, tick):
+    for category, record in records:
+        f.write(json.dumps({"category": _slug(category), **record}, default=str) + "\n")
+        tick(category)
+
+
+def _write_csv(f, records, tick):
+    writer = csv.writer(f)
+    writer.writerow(CSV_COLUMNS)
+    for category, record in records:
+        rest = {key: value for key, value in record.items() if key not in ("id", "date", "topic")}
+        writer.writerow((_slug(category), record.get("id", ""), record.get("date", ""), record.get("topic", ""),
+                         json.dumps(rest, default=str)))
+        tick(category)
+
+
+def _write_zip(path, user_id, categories, tick, counts):
+    from utils.visual_store import asset_paths, iter_visuals
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for category in categories:
+            with bundle.open(f"{_slug(category)}.jsonl", "w") as member:
+                for record in EXPORT_CATEGORIES[category](user_id):
+                    if category == "Visual aids":
+                        record["file"] = f"visuals/{os.path.basename(asset_paths(record['hash'], record['type'])[0])}"
+                    member.write((json.dumps(record, default=str) + "\n").encode())
+                    tick(category)
+            if category == "Visual aids":
+                # A second pass, since a zip member cannot be added while another is open for writing
+                for visual in iter_visuals(user_id):
+                    asset, _ = asset_paths(visual["hash"], visual["type"])
+                    if os.path.exists(asset):
+                        bundle.write(asset, f"visuals/{os.path.basename(asset)}")
+        bundle.writestr("manifest.json", json.dumps({
+            "user_id": user_id,
+            "exported": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "records": {_slug(category): count for category, count in counts.items()},
+        }, indent=2))
+
+
+def export_user_data(user_id, categories, export_format, path, progress=None):
+    """Write the selected categories of a user's data to `path`; returns records written per category.
+
+    `progress(records_written, category)` is called every PROGRESS_EVERY records
+    and once at the end.
+    """
+    unknown = [c for c in categories if c not in EXPORT_CATEGORIES]
+    if unknown:
+        raise ValueError(f"Unknown export categories: {', '.join(unknown)}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    counts = {category: 0 for category in categories}
+    written = [0]
+
+    def tick(category):
+        counts[category] += 1
+        written[0] += 1
+        if progress is not None and written[0] % PROGRESS_EVERY == 0:
+            progress(written[0], category)
+
+    with span("export.write", format=export_format):
+        if export_format == "ZIP":
+            _write_zip(path, user_id, categories, tick, counts)
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = _write_csv if export_format == "CSV" else _write_jsonl
+                writer(f, _records(user_id, categories), tick)
+    if progress is not None:
+        progress(written[0], None)
+    increment("export_records_total", written[0], format=export_format)
+    return counts
@@ -0,0 +1,550 @@
+# utils/generation.py - Streamlit-free generation service
+#
+# Everything here takes an injected client (anything with a Gemini-style
+# ``generate_content(prompt)`` returning an object with ``.text``) and returns a
+# GenerationResult instead of touching st.session_state or st.error, so it can
+# run in worker threads, batch jobs and benchmarks. The Streamlit-facing helpers
+# in text_utils / image_utils / api_connector are thin adapters over it.
+
+import re
+import json
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from utils.metrics import span, count_tokens, increment
+from utils.grading import parse_number
+
+
+@dataclass
+class GenerationResult:
+    """Outcome of one generation call: a value on success, an error message otherwise"""
+    value: Any = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def unwrap_or(self, default):
+        """Return the value, or `default` if the call failed"""
+        return self.value if self.ok else default
+
+
+def explanation_prompt(topic, detail_level="medium"):
+    return f"""
+        Create a comprehensive explanation about '{topic}'.
+        Make it {detail_level} level of detail, clear, and easy to understand.
+        Include key concepts, important details, and real-world examples.
+        Structure it in a way that's suitable for audio narration.
+        """
+
+
+def study_notes_prompt(topic, explanation):
+    return f"""
+        Based on this explanation about '{topic}':
+
+        {explanation}
+
+        Create structured study notes with the following:
+        1. Main concept definitions
+        2. Key points organized by subtopics
+        3. Important relationships between concepts
+        4. A logical hierarchy of information
+
+        Format it clearly with headers, bullet points, and numbering where appropriate.
+        """
+
+
+def summary_prompt(topic, explanation):
+    return f"""
+        Based on this explanation about '{topic}':
+
+        {explanation}
+
+        Create a concise bullet-point summary that captures the essential information.
+        Focus on the most important concepts, facts, and takeaways.
+        Keep each bullet point brief but informative.
+        """
+
+
+def quiz_prompt(topic, explanation, num_questions=5):
+    return f"""
+        Based on this explanation about '{topic}':
+
+        {explanation}
+
+        Create {num_questions} multiple-choice quiz questions to test understanding of key concepts.
+        For each question, provide 4 options and indicate the correct answer.
+        Format as:
+
+        Q1: [Question]
+        A. [Option A]
+        B. [Option B]
+        C. [Option C]
+        D. [Option D]
+        Correct Answer: [Letter]
+
+        Then repeat for Q2 through Q{num_questions}.
+        """
+
+
+def practice_problems_prompt(topic, explanation, difficulty="medium", num_problems=3):
+    return f"""
+        Based on this explanation about '{topic}':
+
+        {explanation}
+
+        Create {num_problems} {difficulty}-level practice problems or exercises that would help someone master this topic.
+        For each problem:
+        1. Clearly state the problem or exercise
+        2. Provide step-by-step solution or approach
+        3. Include any relevant tips or hints
+
+        Format with clear separation between problems, and clearly label the problem statement and solution parts.
+        """
+
+
+# Practice problem types and the fields each one needs besides question/hints/solution
+PRACTICE_TYPES = ("multiple_choice", "short_answer", "calculation", "essay")
+
+
+def practice_set_prompt(topic, difficulty="Intermediate", problem_type=None, num_problems=5):
+    kind = f"{problem_type.replace('_', ' ')} problems" if problem_type else \
+        "problems mixing multiple choice, short answer, calculation and essay types"
+    return f"""
+        Create {num_problems} {difficulty}-level practice {kind} about '{topic}'.
+
+        Respond with only a JSON array of practice problems, one object per problem:
+        [{{"type": "multiple_choice" | "short_answer" | "calculation" | "essay",
+           "question": "the full problem statement",
+           "options": ["four answer options, for multiple_choice only"],
+           "answer": "the correct option text (multiple_choice), the final number (calculation), a model answer (short_answer) or key points (essay)",
+           "tolerance": "allowed absolute error of a calculation answer, optional",
+           "hints": ["one or two hints that do not give the answer away"],
+           "solution": "a step-by-step worked solution"}}]
+        """
+
+
+def image_descriptions_prompt(topic, explanation, num_images=3):
+    return f"""
+        Based on this explanation about '{topic}':
+
+        {explanation}
+
+        Create {num_images} detailed descriptions for educational diagrams or illustrations that would help visualize key concepts from this topic.
+        Each description should:
+        1. Focus on a single important concept from the topic
+        2. Be clear about what elements should be in the image
+        3. Emphasize educational value rather than artistic quality
+        4. Be suitable for a diagram, chart, or simple illustration
+
+        Format your response as a numbered list with only the descriptions, nothing else.
+        """
+
+
+def study_materials_prompt(topic, explanation, num_images=3, num_questions=0):
+    quiz_field = f"""
+          "quiz": [{num_questions} multiple-choice questions testing the key concepts, each as
+                   {{"question": "...", "options": {{"A": "...", "B": "...", "C": "...", "D": "..."}},
+                    "correct_answer": "A"}}],""" if num_questions else ""
+    return f"""
+        Based on this explanation about '{topic}':
+
+        {explanation}
+
+        Create the study materials for this explanation in a single JSON object with exactly these fields:
+        {{
+          "notes": "structured study notes in Markdown: main concept definitions, key points organized by subtopics, important relationships between concepts, with headers, bullet points and numbering",
+          "summary": "a concise Markdown bullet-point summary of the essential concepts, facts and takeaways",
+          "image_descriptions": [{num_images} strings, each describing one educational diagram or illustration of a single key concept and the elements it should contain],{quiz_field}
+        }}
+
+        Respond with the JSON object only, with no text before or after it.
+        """
+
+
+def grading_prompt(items):
+    """items: (question, expected answer or model solution, student answer) tuples"""
+    listing = "\n\n".join(
+        f"Problem {i}:\n{question}\nExpected answer: {expected or 'not given'}\nStudent answer: {answer or '(blank)'}"
+        for i, (question, expected, answer) in enumerate(items, 1)
+    )
+    return f"""
+        You are grading a student's practice answers.
+
+        {listing}
+
+        Grade every problem. A response is correct if it reaches the expected answer or an equivalent one,
+        even if worded differently. Give one or two sentences of feedback explaining what is right or missing.
+        Respond with only a JSON array with one object per problem, in order:
+        [{{"problem": 1, "correct": true, "feedback": "..."}}]
+        """
+
+
+def mind_map_prompt(topic, explanation="", seeds=(), depth=3):
+    source = f"""
+        Base it on this explanation about '{topic}':
+
+        {explanation}
+        """ if explanation else f"The topic is '{topic}'."
+    seed_line = f"Include these key concepts among the first-level branches: {', '.join(seeds)}." if seeds else ""
+    return f"""
+        Build a mind map of the key concepts about '{topic}'.
+        {source}
+        {seed_line}
+
+        The mind map is a tree {depth} level(s) deep below the central topic.
+        Labels are short noun phrases of at most five words.
+        Respond with only a JSON object for the mind map tree:
+        {{"label": "{topic}", "children": [{{"label": "...", "children": [...]}}]}}
+        """
+
+
+def chat_prompt(user_message, topic, persona, history, study_material):
+    return f"""
+        You are a tutor acting as a {persona}.
+        The current learning topic is '{topic or 'not set'}'.
+
+        Relevant excerpts from the student's own study materials:
+        {study_material or 'None available.'}
+
+        Conversation so far:
+        {history}
+
+        Reply to the student's latest message: {user_message}
+        Prefer the study material excerpts when they are relevant, and keep the answer clear and concise.
+        """
+
+
+def parse_numbered_list(text):
+    """Split a numbered list response into its items"""
+    pattern = r'\d+\.\s+(.*?)(?=\d+\.|$)'
+    matches = re.findall(pattern, text, re.DOTALL)
+    if matches:
+        return [match.strip() for match in matches]
+    # Fallback: just split by lines and filter
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    return [line.split('. ', 1)[1] if '. ' in line else line for line in lines]
+
+
+# Questions, options and answers in the format requested by quiz_prompt().
+# It is matched one question block at a time: run over the whole text, a block
+# without an answer line makes the lazy groups backtrack across every later
+# question, which took seconds for a malformed 8-question quiz.
+_QUESTION_START = re.compile(r'(?=Q\d+:)')
+_QUIZ_PATTERN = re.compile(
+    r'Q(\d+):\s*(.*?)\s*(?:(?:A|a)\.)\s*(.*?)\s*(?:(?:B|b)\.)\s*(.*?)\s*(?:(?:C|c)\.)\s*(.*?)\s*(?:(?:D|d)\.)\s*(.*?)'
+    r'\s*(?:Correct Answer:|Correct:|Answer:)\s*([A-Da-d])',
+    re.DOTALL
+)
+
+
+def parse_quiz(quiz_text):
+    """Parse Q1:/A.-D./Correct Answer: quiz text into question dicts"""
+    questions = []
+    blocks = _QUESTION_START.split(quiz_text)
+    matches = (_QUIZ_PATTERN.match(block) for block in blocks)
+
+    for match in filter(None, matches):
+        q_num, question, option_a, option_b, option_c, option_d, correct = match.groups()
+
+        questions.append({
+            'question_number': int(q_num),
+            'question': question.strip(),
+            'options': {
+                'A': option_a.strip(),
+                'B': option_b.strip(),
+                'C': option_c.strip(),
+                'D': option_d.strip()
+            },
+            'correct_answer': correct.strip().upper()
+        })
+
+    return questions
+
+
+def format_quiz(questions):
+    """Render question dicts in the quiz_prompt() text format (the inverse of parse_quiz)"""
+    return "\n\n".join(
+        f"Q{i}: {q['question']}\n"
+        + "".join(f"{letter}. {q['options'][letter]}\n" for letter in "ABCD")
+        + f"Correct Answer: {q['correct_answer']}"
+        for i, q in enumerate(questions, 1)
+    )
+
+
+def _extract_json_object(text):
+    """Decode the outermost JSON object in a reply, tolerating code fences and stray prose"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("no JSON object in response")
+    return json.loads(text[start:end + 1])
+
+
+def _markdown_section(value):
+    if isinstance(value, list):
+        value = "\n".join(f"- {item}" for item in value if isinstance(item, str) and item.strip())
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("missing or empty")
+    return value.strip()
+
+
+def _validate_descriptions(value, num_images):
+    if not isinstance(value, list):
+        raise ValueError("expected a list of descriptions")
+    descriptions = [item.strip() for item in value if isinstance(item, str) and item.strip()]
+    if len(descriptions) < num_images:
+        raise ValueError(f"expected {num_images} descriptions, got {len(descriptions)}")
+    return descriptions[:num_images]
+
+
+def _validate_quiz(value, num_questions):
+    if not isinstance(value, list):
+        raise ValueError("expected a list of questions")
+    questions = []
+    for item in value:
+        options = item.get("options") if isinstance(item, dict) else None
+        answer = str(item.get("correct_answer", "")).strip().upper()[:1] if isinstance(item, dict) else ""
+        if (isinstance(options, dict) and all(str(options.get(letter, "")).strip() for letter in "ABCD")
+                and str(item.get("question", "")).strip() and answer in ("A", "B", "C", "D")):
+            questions.append({
+                "question": str(item["question"]).strip(),
+                "options": {letter: str(options[letter]).strip() for letter in "ABCD"},
+                "correct_answer": answer,
+            })
+    if len(questions) < num_questions:
+        raise ValueError(f"expected {num_questions} well-formed questions, got {len(questions)}")
+    return format_quiz(questions[:num_questions])
+
+
+def parse_study_materials(text, num_images=3, num_questions=0):
+    """Validate a study_materials_prompt() reply into a GenerationResult per section"""
+    sections = ["notes", "summary", "image_descriptions"] + (["quiz"] if num_questions else [])
+    try:
+        data = _extract_json_object(text)
+        if not isinstance(data, dict):
+            raise ValueError("response is not a JSON object")
+    except ValueError as e:
+        return {section: GenerationResult(error=f"invalid JSON: {e}") for section in sections}
+
+    validators = {
+        "notes": _markdown_section,
+        "summary": _markdown_section,
+        "image_descriptions": lambda value: _validate_descriptions(value, num_images),
+        "quiz": lambda value: _validate_quiz(value, num_questions),
+    }
+    results = {}
+    for section in sections:
+        try:
+            results[section] = GenerationResult(value=validators[section](data.get(section)))
+        except (ValueError, TypeError, AttributeError) as e:
+            results[section] = GenerationResult(error=f"{section}: {e}")
+    return results
+
+
+def parse_grades(text, count):
+    """Decode a grading_prompt() reply into `count` {correct, feedback} dicts (None where missing)"""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        raise ValueError("no JSON array in response")
+    grades = [None] * count
+    for position, item in enumerate(json.loads(text[start:end + 1])):
+        if not isinstance(item, dict) or not isinstance(item.get("correct"), bool):
+            continue
+        index = item.get("problem", position + 1)
+        if isinstance(index, int) and 1 <= index <= count:
+            grades[index - 1] = {"correct": item["correct"], "feedback": str(item.get("feedback", "")).strip()}
+    return grades
+
+
+def _validate_problem(item, problem_type=None):
+    """One practice problem dict in canonical form, or ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError("problem is not an object")
+    kind = str(item.get("type", "")).strip().lower().replace(" ", "_").replace("-", "_")
+    question = str(item.get("question", "")).strip()
+    answer = item.get("answer")
+    if kind not in PRACTICE_TYPES or (problem_type and kind != problem_type):
+        raise ValueError(f"unexpected type {kind!r}")
+    if not question or answer in (None, ""):
+        raise ValueError("missing question or answer")
+
+    problem = {"type": kind, "question": question, "answer": answer}
+    if kind == "multiple_choice":
+        options = [str(option).strip() for option in item.get("options") or [] if str(option).strip()]
+        if len(options) < 2:
+            raise ValueError("multiple choice needs options")
+        letter = str(answer).strip().upper()
+        if len(letter) == 1 and "A" <= letter < chr(ord("A") + len(options)):
+            answer = options[ord(letter) - ord("A")]
+        elif str(answer).strip() not in options:
+            raise ValueError("answer is not one of the options")
+        problem.update(options=options, answer=str(answer).strip())
+    elif kind == "calculation":
+        if parse_number(answer) is None:
+            raise ValueError("calculation answer is not a number")
+        tolerance = parse_number(item.get("tolerance")) if item.get("tolerance") not in (None, "") else None
+        if tolerance is not None:
+            problem["tolerance"] = abs(tolerance)
+    hints = item.get("hints") or []
+    problem["hints"] = [str(hint).strip() for hint in (hints if isinstance(hints, list) else [hints])
+                        if str(hint).strip()]
+    problem["solution"] = str(item.get("solution") or "").strip()
+    return problem
+
+
+def parse_practice_problems(text, problem_type=None):
+    """Valid problems from a practice_set_prompt() reply (invalid entries are dropped)"""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        raise ValueError("no JSON array in response")
+    problems = []
+    for item in json.loads(text[start:end + 1]):
+        try:
+            problems.append(_validate_problem(item, problem_type))
+        except (ValueError, TypeError):
+            continue
+    return problems
+
+
+# Children kept per node at each depth below the root, and the overall node budget,
+# so deep maps stay readable
+MIND_MAP_BRANCHING = (7, 5, 4, 3, 3)
+MIND_MAP_MAX_NODES = 80
+
+
+def parse_mind_map(text, topic, depth=3):
+    """Decode a mind_map_prompt() reply into a {label, children} tree clipped to depth and size"""
+    data = _extract_json_object(text)
+    budget = [MIND_MAP_MAX_NODES - 1]
+
+    def clean(node, level):
+        label = " ".join(str(node.get("label", "")).split())[:60] if isinstance(node, dict) else ""
+        children, seen = [], set()
+        if level < depth and isinstance(node, dict) and isinstance(node.get("children"), list):
+            for child in node["children"][:MIND_MAP_BRANCHING[min(level, len(MIND_MAP_BRANCHING) - 1)]]:
+                if budget[0] <= 0:
+                    break
+                cleaned = clean(child, level + 1)
+                if cleaned and cleaned["label"].lower() not in seen:
+                    seen.add(cleaned["label"].lower())
+                    budget[0] -= 1
+                    children.append(cleaned)
+        return {"label": label, "children": children} if label else None
+
+    tree = clean(data, 0)
+    if not tree or not tree["children"]:
+        raise ValueError("mind map has no branches")
+    tree["label"] = topic
+    return tree
+
+
+def format_chat_history(messages):
+    """Render chat messages as a Student/Tutor transcript"""
+    return "\n".join(
+        f"{'Student' if msg['role'] == 'user' else 'Tutor'}: {msg['content']}" for msg in messages
+    )
+
+
+class GenerationService:
+    """Prompt building and response handling for every generated artifact"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def generate_text(self, prompt, kind="text"):
+        """Send a prompt to the client and wrap the reply or the failure"""
+        try:
+            with span("model.generate", kind=kind):
+                response = self.client.generate_content(prompt)
+            count_tokens(response, prompt)
+            return GenerationResult(value=response.text)
+        except Exception as e:
+            return GenerationResult(value="", error=str(e))
+
+    def explanation(self, topic, detail_level="medium"):
+        return self.generate_text(explanation_prompt(topic, detail_level), "explanation")
+
+    def study_notes(self, topic, explanation):
+        return self.generate_text(study_notes_prompt(topic, explanation), "notes")
+
+    def summary(self, topic, explanation):
+        return self.generate_text(summary_prompt(topic, explanation), "summary")
+
+    def quiz(self, topic, explanation, num_questions=5):
+        return self.generate_text(quiz_prompt(topic, explanation, num_questions), "quiz")
+
+    def practice_problems(self, topic, explanation, difficulty="medium", num_problems=3):
+        return self.generate_text(practice_problems_prompt(topic, explanation, difficulty, num_problems),
+                                  "practice")
+
+    def practice_set(self, topic, difficulty="Intermediate", problem_type=None, num_problems=5):
+        """Schema-validated practice problem dicts (see PRACTICE_TYPES)"""
+        result = self.generate_text(practice_set_prompt(topic, difficulty, problem_type, num_problems), "practice")
+        if not result.ok:
+            return GenerationResult(value=[], error=result.error)
+        try:
+            problems = parse_practice_problems(result.value, problem_type)
+        except ValueError as e:
+            return GenerationResult(value=[], error=f"unreadable practice problems: {e}")
+        if not problems:
+            return GenerationResult(value=[], error="no valid practice problems in response")
+        return GenerationResult(value=problems)
+
+    def image_descriptions(self, topic, explanation, num_images=3):
+        result = self.generate_text(image_descriptions_prompt(topic, explanation, num_images), "images")
+        if not result.ok:
+            return GenerationResult(value=[], error=result.error)
+        return GenerationResult(value=parse_numbered_list(result.value)[:num_images])
+
+    def study_materials(self, topic, explanation, num_images=3, num_questions=0):
+        """Notes, summary, image descriptions and (optionally) a quiz from one model call.
+
+        The explanation is sent once instead of once per artifact; only sections
+        missing or malformed in the combined reply are generated separately.
+        Returns a dict mapping each section to its GenerationResult.
+        """
+        combined = self.generate_text(
+            study_materials_prompt(topic, explanation, num_images, num_questions), "materials")
+        if combined.ok:
+            results = parse_study_materials(combined.value, num_images, num_questions)
+        else:
+            results = {section: combined for section in ("notes", "summary", "image_descriptions", "quiz")
+                       if section != "quiz" or num_questions}
+
+        fallbacks = {
+            "notes": lambda: self.study_notes(topic, explanation),
+            "summary": lambda: self.summary(topic, explanation),
+            "image_descriptions": lambda: self.image_descriptions(topic, explanation, num_images),
+            "quiz": lambda: self.quiz(topic, explanation, num_questions),
+        }
+        for section, result in results.items():
+            if not result.ok:
+                increment("combined_generation_fallbacks_total", section=section)
+                results[section] = fallbacks[section]()
+        return results
+
+    def grade_answers(self, items):
+        """Grade (question, expected, answer) tuples in one call; value is a list of dicts or None"""
+        result = self.generate_text(grading_prompt(items), "grading")
+        if not result.ok:
+            return GenerationResult(value=[None] * len(items), error=result.error)
+        try:
+            return GenerationResult(value=parse_grades(result.value, len(items)))
+        except ValueError as e:
+            return GenerationResult(value=[None] * len(items), error=f"unreadable grading reply: {e}")
+
+    def mind_map(self, topic, explanation="", seeds=(), depth=3):
+        """A validated concept tree (see parse_mind_map) for the topic"""
+        result = self.generate_text(mind_map_prompt(topic, explanation, seeds, depth), "mind_map")
+        if not result.ok:
+            return GenerationResult(value=None, error=result.error)
+        try:
+            return GenerationResult(value=parse_mind_map(result.value, topic, depth))
+        except ValueError as e:
+            return GenerationResult(value=None, error=f"unreadable mind map: {e}")
+
+    def chat_response(self, user_message, topic="", persona="Helpful Guide", chat_history=(), study_material=""):
+        return self.generate_text(
+            chat_prompt(user_message, topic, persona, format_chat_history(chat_history), study_material), "chat"
+        )
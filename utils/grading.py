@@ -0,0 +1,180 @@
+# utils/grading.py - Practice answer grading
+#
+# Multiple-choice, numeric and exactly matching short answers are graded here
+# without a model call. Everything else in a submission goes to the model in a
+# single batched request. Grades are memoized by a hash of the problem and the
+# normalized answer, so re-checking an answer or submitting answers that were
+# already checked costs nothing.
+
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from utils.metrics import record_cache
+
+# Grades kept across all users
+GRADE_CACHE_SIZE = 4096
+
+# Numeric answers within 1% of the expected value count as correct unless the problem sets "tolerance"
+RELATIVE_TOLERANCE = 0.01
+
+_NUMBER = re.compile(r'[-+]?(?:\d[\d,]*)?\.?\d+(?:[eE][-+]?\d+)?(?:\s*/\s*\d+(?:\.\d+)?)?\s*%?')
+_LETTER_PREFIX = re.compile(r'^\(?([A-Za-z])[).:]\s+')
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+@dataclass
+class Grade:
+    """Verdict for one answer; graded_by is "local", "model" or "none" (could not be graded)"""
+    correct: bool
+    feedback: str
+    graded_by: str = "local"
+
+
+def normalize_answer(text):
+    """Lowercase, collapse whitespace and strip surrounding punctuation"""
+    return re.sub(r'\s+', ' ', str(text or '')).strip().strip('.!?;:').strip().lower()
+
+
+def parse_number(text):
+    """Last number in a string (handles 1,000 / 1/2 / 2.5e3 / 40%); None if there is none"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    matches = _NUMBER.findall(str(text or ''))
+    if not matches:
+        return None
+    token = matches[-1].replace(',', '').replace(' ', '')
+    scale = 0.01 if token.endswith('%') else 1.0
+    token = token.rstrip('%')
+    try:
+        if '/' in token:
+            numerator, denominator = token.split('/')
+            return float(numerator) / float(denominator) * scale
+        return float(token) * scale
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def expected_answer(problem):
+    """The answer key of a problem as text (falls back to its worked solution)"""
+    answer = problem.get("answer", problem.get("correct_answer"))
+    if answer is None or answer == "":
+        return problem.get("solution", "")
+    return str(answer)
+
+
+def _option_index(options, value):
+    """Index of the option a value refers to, by letter ("B", "b)") or by option text"""
+    text = str(value or '').strip()
+    if len(text) == 1 and text.isalpha():
+        index = ord(text.upper()) - ord('A')
+        return index if index < len(options) else None
+    normalized = normalize_answer(text)
+    for index, option in enumerate(options):
+        if normalize_answer(option) == normalized:
+            return index
+    match = _LETTER_PREFIX.match(text)
+    if match:
+        return _option_index(options, match.group(1))
+    return None
+
+
+def _with_solution(feedback, problem):
+    solution = problem.get("solution")
+    return f"{feedback} {solution}" if solution else feedback
+
+
+def grade_locally(problem, answer):
+    """Grade without a model where the answer key makes it unambiguous; None otherwise"""
+    if not str(answer or '').strip():
+        return Grade(False, _with_solution("No answer given.", problem))
+
+    key = problem.get("answer", problem.get("correct_answer"))
+    options = problem.get("options") or []
+    if problem.get("type") == "multiple_choice" and options and key not in (None, ""):
+        expected = _option_index(options, key)
+        if expected is not None:
+            if _option_index(options, answer) == expected:
+                return Grade(True, "")
+            return Grade(False, _with_solution(f"The correct answer is: {options[expected]}.", problem))
+
+    expected_value = parse_number(key) if key not in (None, "") else None
+    if expected_value is not None and (problem.get("type") == "calculation" or isinstance(key, (int, float))):
+        value = parse_number(answer)
+        if value is None:
+            return Grade(False, _with_solution(f"Expected a numeric answer ({key}).", problem))
+        tolerance = problem.get("tolerance")
+        tolerance = float(tolerance) if tolerance is not None else abs(expected_value) * RELATIVE_TOLERANCE
+        if abs(value - expected_value) <= max(tolerance, 1e-9):
+            return Grade(True, "")
+        return Grade(False, _with_solution(f"The expected answer is {key}.", problem))
+
+    if key not in (None, "") and normalize_answer(answer) == normalize_answer(key):
+        return Grade(True, "")
+    return None
+
+
+def grade_key(problem, answer):
+    """Memoization key for a (problem, answer) pair"""
+    payload = json.dumps([problem.get("question"), problem.get("type"), problem.get("options"),
+                          expected_answer(problem), normalize_answer(answer)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        grade = _cache.get(key)
+        if grade is not None:
+            _cache.move_to_end(key)
+    record_cache("grading", grade is not None)
+    return grade
+
+
+def _cache_put(key, grade):
+    with _cache_lock:
+        _cache[key] = grade
+        _cache.move_to_end(key)
+        while len(_cache) > GRADE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def grade_answers(service, responses):
+    """Grade (problem, answer) pairs: from the memo, locally, then the rest in one model call.
+
+    `service` is a GenerationService (or None to grade locally only). Answers the
+    model could not grade come back with graded_by="none" and are not memoized.
+    """
+    grades = [None] * len(responses)
+    keys = [grade_key(problem, answer) for problem, answer in responses]
+    pending = []
+    for i, (problem, answer) in enumerate(responses):
+        grades[i] = _cache_get(keys[i])
+        if grades[i] is None:
+            grades[i] = grade_locally(problem, answer)
+            if grades[i] is not None:
+                _cache_put(keys[i], grades[i])
+            else:
+                pending.append(i)
+
+    error = None
+    if pending and service is not None:
+        result = service.grade_answers([
+            (responses[i][0].get("question", ""), expected_answer(responses[i][0]), responses[i][1])
+            for i in pending
+        ])
+        error = result.error
+        for i, verdict in zip(pending, result.value):
+            if verdict is not None:
+                grades[i] = Grade(verdict["correct"], verdict["feedback"], "model")
+                _cache_put(keys[i], grades[i])
+
+    for i in pending:
+        if grades[i] is None:
+            reason = f"Could not grade automatically ({error})." if error else "Could not grade automatically."
+            grades[i] = Grade(False, _with_solution(reason, responses[i][0]), "none")
+    return grades
@@ -0,0 +1,122 @@
+# utils/keyphrases.py - Local key-concept extraction
+#
+# Candidate phrases are RAKE-style runs of content words between stopwords and
+# punctuation. Each word scores degree / frequency (words that occur inside
+# longer phrases score higher), weighted by its inverse document frequency over
+# the student's indexed sessions, so words common to everything they study rank
+# lower. Phrase counts are kept in a ConceptTracker, so a growing text such as a
+# chat conversation only processes the messages added since the last call.
+
+import re
+from collections import Counter
+
+from utils.bootstrap import lazy_import
+from utils.metrics import timed
+from utils.retrieval import _STOPWORDS, get_vector_index
+from utils.storage import user_session_ids
+
+np = lazy_import("numpy")
+
+# Longer runs of content words are cut into phrases of at most this many words
+MAX_PHRASE_WORDS = 3
+
+# Function words and conversational filler that break candidate phrases
+PHRASE_STOPWORDS = _STOPWORDS | frozenset("""
+able above after again against all also am among any because been before being below between both but can
+could each either else even ever every example explain few first further get gets give go going good got had
+has have having he help her here hers him his however if into its itself just know let like lot make makes
+many may me might more most much must my need new no nor not now one only other our ours out over own please
+question questions really right same say see she should show since so some something such sure tell than
+thank thanks their theirs them then there these they thing things think those though through too under
+understand until up us use used using very want way we well were whether while will would yes yet
+""".split())
+
+_FRAGMENT_BREAK = re.compile(r"[.,;:!?()\[\]{}\"“”]|\s[-–—]\s|\n")
+_WORD = re.compile(r"[A-Za-z0-9]+(?:['’-][A-Za-z0-9]+)*")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def candidate_phrases(text):
+    """(lowercase word tuple, surface text) for each candidate phrase in the text"""
+    phrases = []
+    for fragment in _FRAGMENT_BREAK.split(text):
+        run = []
+        for match in list(_WORD.finditer(fragment)) + [None]:
+            word = match.group().lower().replace("’", "'") if match else None
+            if word is not None and word not in PHRASE_STOPWORDS and not word.isdigit() and len(word) > 1:
+                run.append(match)
+                if len(run) < MAX_PHRASE_WORDS:
+                    continue
+            # Every sub-run is a candidate, so "Calvin cycle" is counted inside "Calvin cycle uses"
+            for start in range(len(run)):
+                for end in range(start + 1, len(run) + 1):
+                    words = tuple(w for m in run[start:end] for w in _TOKEN.findall(m.group().lower()))
+                    phrases.append((words, fragment[run[start].start():run[end - 1].end()]))
+            run = []
+    return phrases
+
+
+def corpus_idf(words, user_id):
+    """Inverse document frequency of each word over the user's indexed sessions (all ones if none are)"""
+    documents, frequencies = get_vector_index().document_frequencies(user_session_ids(user_id))
+    if not documents:
+        return np.ones(len(words))
+    df = np.fromiter((frequencies.get(word, 0) for word in words), dtype=np.float64, count=len(words))
+    return np.log((1 + documents) / (1 + df)) + 1
+
+
+class ConceptTracker:
+    """Running phrase counts over a growing text; top() ranks them on demand"""
+
+    def __init__(self):
+        self.counts = Counter()   # word tuple -> occurrences
+        self.surface = {}         # word tuple -> first spelling seen
+        self.updates = 0
+        self.last_text = None
+
+    def update(self, text):
+        """Add a piece of text (e.g. one chat message) to the counts"""
+        for words, surface in candidate_phrases(text):
+            self.counts[words] += 1
+            self.surface.setdefault(words, surface)
+        self.updates += 1
+        self.last_text = text
+        return self
+
+    @timed("keyphrases.rank")
+    def top(self, max_concepts=5, user_id=None):
+        """The highest scoring phrases, skipping any that overlap one already chosen (IDF over user_id's sessions)"""
+        if not self.counts or max_concepts <= 0:
+            return []
+        phrases = list(self.counts)
+        vocabulary = {}
+        word_ids = np.fromiter((vocabulary.setdefault(w, len(vocabulary)) for p in phrases for w in p),
+                               dtype=np.int64)
+        lengths = np.fromiter((len(p) for p in phrases), dtype=np.int64, count=len(phrases))
+        counts = np.fromiter((self.counts[p] for p in phrases), dtype=np.float64, count=len(phrases))
+        owner = np.repeat(np.arange(len(phrases)), lengths)
+
+        frequency = np.bincount(word_ids, weights=counts[owner], minlength=len(vocabulary))
+        degree = np.bincount(word_ids, weights=(counts * lengths)[owner], minlength=len(vocabulary))
+        word_scores = degree / frequency
+        if user_id is not None:
+            word_scores *= corpus_idf(list(vocabulary), user_id)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        # Repetition across the text matters as well as phrase structure
+        scores = np.add.reduceat(word_scores[word_ids], starts) * np.log2(1 + counts)
+
+        chosen, covered = [], []
+        for i in np.argsort(-scores, kind="stable"):
+            words = set(phrases[i])
+            if any(words <= other or other <= words for other in covered):
+                continue
+            chosen.append(self.surface[phrases[i]])
+            covered.append(words)
+            if len(chosen) == max_concepts:
+                break
+        return chosen
+
+
+def extract_key_concepts(text, max_concepts=5, user_id=None):
+    """Key phrases of a text, best first"""
+    return ConceptTracker().update(text or "").top(max_concepts, user_id)
@@ -0,0 +1,344 @@
+# utils/metrics.py - In-process latency, size and cache metrics
+#
+# Every stage (Gemini calls, TTS, image rendering, session JSON I/O, search,
+# analytics caches, page runs) reports into one process-wide registry of
+# counters and fixed-bucket histograms. Recording is a perf_counter call plus a
+# dict lookup and a bisect under a lock, so it stays on in production; set
+# METRICS_ENABLED=0 to turn it into a no-op. The registry can be rendered in the
+# Prometheus text format (optionally served on METRICS_PORT) or dumped as JSONL.
+
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+# Metrics cover every user of the server, so the Settings page only shows them (and their reset) to admins
+ADMIN_PANEL = os.environ.get("METRICS_ADMIN", "0") == "1"
+
+# Histogram upper bounds: seconds for latencies, bytes for payload sizes
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Recent finished spans kept for the admin panel and JSONL traces
+TRACE_BUFFER = 200
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running sum and count"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters, histograms and recent spans"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.spans = deque(maxlen=TRACE_BUFFER)
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def record_span(self, stage, seconds, error=None, **labels):
+        self.observe("stage_duration_seconds", seconds, stage=stage, **labels)
+        if error:
+            self.increment("stage_errors_total", stage=stage, error=error)
+        entry = {"ts": round(time.time(), 3), "stage": stage, "seconds": round(seconds, 6), **labels}
+        if error:
+            entry["error"] = error
+        with self._lock:
+            self.spans.append(entry)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Copy of the registry that can be read without holding the lock"""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+            spans = list(self.spans)
+        return counters, histograms, spans
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+def increment(name, value=1, **labels):
+    """Add to a counter (e.g. tokens, cache hits)"""
+    if ENABLED:
+        _registry.increment(name, value, **labels)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Record one value in a histogram"""
+    if ENABLED:
+        _registry.observe(name, value, buckets, **labels)
+
+
+def observe_size(name, nbytes, **labels):
+    """Record a payload size in bytes"""
+    if ENABLED:
+        _registry.observe(name, nbytes, SIZE_BUCKETS, **labels)
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup as a hit or a miss"""
+    if ENABLED:
+        _registry.increment("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def record_span(stage, seconds, **labels):
+    """Record an already-measured stage duration"""
+    if ENABLED:
+        _registry.record_span(stage, seconds, **labels)
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time a block of work as one stage; exceptions are counted and re-raised"""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        # Streamlit's rerun/stop signals are control flow, not failures
+        if type(e).__module__.startswith("streamlit"):
+            raise
+        error = type(e).__name__
+        raise
+    finally:
+        _registry.record_span(stage, time.perf_counter() - start, error, **labels)
+
+
+def timed(stage, **labels):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_tokens(response, prompt):
+    """Record prompt/response token counts, using usage metadata when the API returns it"""
+    if not ENABLED:
+        return
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens is None:
+        # Roughly four characters per token for English text
+        prompt_tokens = len(prompt) // 4
+    if output_tokens is None:
+        output_tokens = len(getattr(response, "text", "") or "") // 4
+    _registry.increment("model_tokens_total", prompt_tokens, kind="prompt")
+    _registry.increment("model_tokens_total", output_tokens, kind="output")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    counters, histograms, _ = _registry.snapshot()
+    lines = []
+    for name in sorted({key[0] for key in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    for name in sorted({key[0] for key in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def iter_jsonl():
+    """Yield one JSON line per counter, histogram and recent span"""
+    counters, histograms, spans = _registry.snapshot()
+    now = round(time.time(), 3)
+    for (name, labels), value in sorted(counters.items()):
+        yield json.dumps({"ts": now, "type": "counter", "name": name, "labels": dict(labels), "value": value})
+    for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+        yield json.dumps({"ts": now, "type": "histogram", "name": name, "labels": dict(labels),
+                          "buckets": list(buckets), "counts": counts, "sum": total, "count": count})
+    for entry in spans:
+        yield json.dumps({"type": "span", **entry})
+
+
+def export_jsonl(path):
+    """Append the current metrics to a JSONL file"""
+    with open(path, "a") as f:
+        for line in iter_jsonl():
+            f.write(line + "\n")
+    return path
+
+
+def stage_summary():
+    """Per-stage call counts, error counts and latency figures for the admin panel"""
+    counters, histograms, _ = _registry.snapshot()
+    errors = {}
+    for (name, labels), value in counters.items():
+        if name == "stage_errors_total":
+            stage = dict(labels)["stage"]
+            errors[stage] = errors.get(stage, 0) + value
+
+    rows = []
+    for (name, labels), (buckets, counts, total, count) in histograms.items():
+        if name != "stage_duration_seconds" or not count:
+            continue
+        histogram = Histogram(buckets)
+        histogram.counts, histogram.count = counts, count
+        label_dict = dict(labels)
+        stage = label_dict.pop("stage")
+        rows.append({
+            "stage": stage + "".join(f" [{k}={v}]" for k, v in sorted(label_dict.items())),
+            "calls": count,
+            "errors": errors.get(stage, 0),
+            "mean_ms": round(total / count * 1000, 2),
+            "p50_ms": round(histogram.quantile(0.5) * 1000, 2),
+            "p95_ms": round(histogram.quantile(0.95) * 1000, 2),
+            "total_s": round(total, 3),
+        })
+    return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+
+def counter_values(name):
+    """Values of one counter keyed by a readable label string"""
+    counters, _, _ = _registry.snapshot()
+    return {
+        ", ".join(f"{k}={v}" for k, v in labels) or name: value
+        for (metric, labels), value in sorted(counters.items()) if metric == name
+    }
+
+
+def recent_spans(limit=50):
+    """Most recent finished spans, newest first"""
+    _, _, spans = _registry.snapshot()
+    return spans[::-1][:limit]
+
+
+def cache_hit_rates():
+    """Hit rate per cache name"""
+    counters, _, _ = _registry.snapshot()
+    totals = {}
+    for (name, labels), value in counters.items():
+        if name == "cache_requests_total":
+            label_dict = dict(labels)
+            hits, total = totals.get(label_dict["cache"], (0, 0))
+            totals[label_dict["cache"]] = (hits + (value if label_dict["result"] == "hit" else 0), total + value)
+    return {cache: round(hits / total, 3) for cache, (hits, total) in totals.items() if total}
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port, addr="127.0.0.1"):
+    """Serve render_prometheus() at /metrics from a daemon thread (idempotent)"""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((addr, port), Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+if ENABLED and os.environ.get("METRICS_PORT"):
+    try:
+        start_http_server(int(os.environ["METRICS_PORT"]))
+    except (OSError, ValueError):
+        # Another Streamlit process already owns the port
+        pass
@@ -0,0 +1,265 @@
+# utils/mind_map.py - Mind-map layout, SVG rendering and the laid-out map cache
+#
+# A mind map is a {label, children} tree. Layout happens here on the server, once
+# per distinct tree and style: with Graphviz installed the DOT source goes through
+# dot/twopi/circo, otherwise a built-in tidy-tree, radial or circular layout is
+# used. The resulting SVG is stored under <data dir>/mind_maps/<graph hash>.svg,
+# so re-displaying a map (on a rerun or from Saved Visuals) is a file read and
+# the browser never lays out a graph.
+
+import os
+import math
+import json
+import shutil
+import hashlib
+import textwrap
+import threading
+import subprocess
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from utils.storage import ensure_data_dir, atomic_write
+from utils.metrics import span, record_cache
+
+STYLES = ("Hierarchical", "Radial", "Circular")
+_GRAPHVIZ_ENGINES = {"Hierarchical": "dot", "Radial": "twopi", "Circular": "circo"}
+
+# Fill colours by depth (root first); deeper levels reuse the last one
+PALETTE = ("#1a3d7c", "#3b6fc4", "#7aa5e6", "#b9d3f5", "#e3edfb")
+
+WRAP_CHARS = 18
+CHAR_WIDTH = 7.2
+LINE_HEIGHT = 16
+H_GAP = 24
+LEVEL_GAP = 110
+RING_GAP = 170
+
+# SVGs kept in memory across all users (the on-disk cache is unbounded but content-addressed)
+MEMORY_CACHE_SIZE = 64
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def graph_hash(tree, style):
+    """Content hash identifying a laid-out map"""
+    payload = json.dumps({"tree": tree, "style": style}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def seed_tree(topic, concepts):
+    """One-level map from locally extracted concepts (used when the model is unavailable)"""
+    return {"label": topic, "children": [{"label": concept, "children": []} for concept in concepts]}
+
+
+def _nodes(tree):
+    """(node id, parent id, depth, label) in depth-first order"""
+    out = []
+
+    def walk(node, parent, depth):
+        node_id = len(out)
+        out.append((node_id, parent, depth, node["label"]))
+        for child in node.get("children", []):
+            walk(child, node_id, depth + 1)
+
+    walk(tree, None, 0)
+    return out
+
+
+def to_dot(tree, style="Hierarchical"):
+    """Graphviz DOT source for a mind map"""
+    lines = [
+        "digraph MindMap {",
+        f'  graph [layout={_GRAPHVIZ_ENGINES.get(style, "dot")}, overlap=false, splines=true, bgcolor="transparent"];',
+        '  node [shape=box, style="rounded,filled", fontname="Helvetica", fontsize=11];',
+        '  edge [color="#8aa4c8", arrowhead=none];',
+    ]
+    for node_id, parent, depth, label in _nodes(tree):
+        colour = PALETTE[min(depth, len(PALETTE) - 1)]
+        font = "white" if depth < 2 else "#102040"
+        text = "\\n".join(textwrap.wrap(label.replace('"', "'"), WRAP_CHARS)) or label
+        lines.append(f'  n{node_id} [label="{text}", fillcolor="{colour}", fontcolor="{font}"];')
+        if parent is not None:
+            lines.append(f"  n{parent} -> n{node_id};")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+# --- built-in layouts ---------------------------------------------------------
+
+def _box(label):
+    lines = textwrap.wrap(label, WRAP_CHARS) or [label]
+    return lines, max(len(line) for line in lines) * CHAR_WIDTH + 20, len(lines) * LINE_HEIGHT + 12
+
+
+def _children_map(nodes):
+    children = {node_id: [] for node_id, _, _, _ in nodes}
+    for node_id, parent, _, _ in nodes:
+        if parent is not None:
+            children[parent].append(node_id)
+    return children
+
+
+def _leaf_counts(nodes, children):
+    counts = {}
+    for node_id, _, _, _ in reversed(nodes):
+        counts[node_id] = sum(counts[c] for c in children[node_id]) or 1
+    return counts
+
+
+def layout_hierarchical(nodes, boxes):
+    """Top-down tidy tree: leaves side by side, parents centred over their children"""
+    children = _children_map(nodes)
+    positions, cursor = {}, [0.0]
+
+    def place(node_id, depth):
+        if not children[node_id]:
+            width = boxes[node_id][1]
+            positions[node_id] = (cursor[0] + width / 2, depth * LEVEL_GAP)
+            cursor[0] += width + H_GAP
+            return
+        for child in children[node_id]:
+            place(child, depth + 1)
+        xs = [positions[c][0] for c in children[node_id]]
+        positions[node_id] = ((xs[0] + xs[-1]) / 2, depth * LEVEL_GAP)
+
+    place(0, 0)
+    return positions
+
+
+def layout_radial(nodes, boxes):
+    """Root in the centre, each level on a ring, angular space shared by leaf count"""
+    children = _children_map(nodes)
+    leaves = _leaf_counts(nodes, children)
+    positions = {}
+
+    def place(node_id, depth, start, end):
+        angle = (start + end) / 2
+        positions[node_id] = (depth * RING_GAP * math.cos(angle), depth * RING_GAP * math.sin(angle))
+        for child in children[node_id]:
+            share = (end - start) * leaves[child] / leaves[node_id]
+            place(child, depth + 1, start, start + share)
+            start += share
+
+    place(0, 0, 0.0, 2 * math.pi)
+    return positions
+
+
+def layout_circular(nodes, boxes):
+    """Every node on one circle in depth-first order, so branches stay contiguous"""
+    perimeter = sum(box[1] + H_GAP for box in boxes.values())
+    radius = max(RING_GAP, perimeter / (2 * math.pi))
+    count = len(nodes)
+    return {
+        node_id: (radius * math.cos(2 * math.pi * i / count - math.pi / 2),
+                  radius * math.sin(2 * math.pi * i / count - math.pi / 2))
+        for i, (node_id, _, _, _) in enumerate(nodes)
+    }
+
+
+_LAYOUTS = {"Hierarchical": layout_hierarchical, "Radial": layout_radial, "Circular": layout_circular}
+
+
+def render_svg(tree, style="Hierarchical"):
+    """Lay out a mind map with the built-in layouts and draw it as a standalone SVG"""
+    nodes = _nodes(tree)
+    boxes = {node_id: _box(label) for node_id, _, _, label in nodes}
+    positions = _LAYOUTS.get(style, layout_hierarchical)(nodes, boxes)
+
+    min_x = min(positions[n][0] - boxes[n][1] / 2 for n in positions) - 20
+    max_x = max(positions[n][0] + boxes[n][1] / 2 for n in positions) + 20
+    min_y = min(positions[n][1] - boxes[n][2] / 2 for n in positions) - 20
+    max_y = max(positions[n][1] + boxes[n][2] / 2 for n in positions) + 20
+    width, height = max_x - min_x, max_y - min_y
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{min_x:.0f} {min_y:.0f} {width:.0f} {height:.0f}" '
+             f'width="{width:.0f}" height="{height:.0f}" font-family="Helvetica, Arial, sans-serif" font-size="12">']
+    for node_id, parent, _, _ in nodes:
+        if parent is None:
+            continue
+        (x1, y1), (x2, y2) = positions[parent], positions[node_id]
+        if style == "Hierarchical":
+            mid = (y1 + y2) / 2
+            parts.append(f'<path d="M{x1:.1f},{y1:.1f} C{x1:.1f},{mid:.1f} {x2:.1f},{mid:.1f} {x2:.1f},{y2:.1f}" '
+                         'fill="none" stroke="#8aa4c8" stroke-width="1.5"/>')
+        else:
+            parts.append(f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}" '
+                         'stroke="#8aa4c8" stroke-width="1.5"/>')
+    for node_id, _, depth, _ in nodes:
+        lines, box_width, box_height = boxes[node_id]
+        x, y = positions[node_id]
+        fill = PALETTE[min(depth, len(PALETTE) - 1)]
+        colour = "#ffffff" if depth < 2 else "#102040"
+        parts.append(f'<rect x="{x - box_width / 2:.1f}" y="{y - box_height / 2:.1f}" width="{box_width:.1f}" '
+                     f'height="{box_height:.1f}" rx="8" fill="{fill}" stroke="#1a3d7c" stroke-width="0.8"/>')
+        top = y - (len(lines) - 1) * LINE_HEIGHT / 2 + 4
+        spans = "".join(f'<tspan x="{x:.1f}" y="{top + i * LINE_HEIGHT:.1f}">{escape(line)}</tspan>'
+                        for i, line in enumerate(lines))
+        weight = ' font-weight="bold"' if depth == 0 else ""
+        parts.append(f'<text text-anchor="middle" fill="{colour}"{weight}>{spans}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def _graphviz_svg(tree, style):
+    """SVG from the Graphviz binaries, or None when they are not installed or fail"""
+    engine = _GRAPHVIZ_ENGINES.get(style, "dot")
+    if shutil.which(engine) is None:
+        return None
+    try:
+        completed = subprocess.run([engine, "-Tsvg"], input=to_dot(tree, style).encode(),
+                                   capture_output=True, timeout=30)
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    return completed.stdout.decode() if completed.returncode == 0 else None
+
+
+# --- cache --------------------------------------------------------------------
+
+def _cache_dir():
+    data_dir, _ = ensure_data_dir()
+    path = os.path.join(data_dir, "mind_maps")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _remember(key, svg):
+    with _memory_lock:
+        _memory_cache[key] = svg
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def cached_svg(map_hash):
+    """The laid-out SVG for a map hash, or None if it has not been rendered on this server"""
+    with _memory_lock:
+        svg = _memory_cache.get(map_hash)
+    if svg is None:
+        path = os.path.join(_cache_dir(), f"{map_hash}.svg")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                svg = f.read()
+            _remember(map_hash, svg)
+    record_cache("mind_map", svg is not None)
+    return svg
+
+
+def layout_mind_map(tree, style="Hierarchical"):
+    """Return (map hash, SVG), laying the map out only if this tree and style were never rendered"""
+    map_hash = graph_hash(tree, style)
+    svg = cached_svg(map_hash)
+    if svg is None:
+        with span("mind_map.layout", style=style):
+            svg = _graphviz_svg(tree, style) or render_svg(tree, style)
+        atomic_write(os.path.join(_cache_dir(), f"{map_hash}.svg"), svg)
+        _remember(map_hash, svg)
+    return map_hash, svg
+
+
+def saved_map_svg(content):
+    """SVG for a saved mind map record ({hash, style, tree}); re-lays it out if the cache was cleared"""
+    svg = cached_svg(content["hash"]) if content.get("hash") else None
+    if svg is None:
+        _, svg = layout_mind_map(content["tree"], content.get("style", "Hierarchical"))
+    return svg
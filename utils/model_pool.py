@@ -0,0 +1,101 @@
+# utils/model_pool.py
+import hashlib
+import functools
+import threading
+
+from utils.bootstrap import lazy_import
+
+genai = lazy_import("google.generativeai")
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# Keep idle HTTP/2 connections to the API open so requests skip TCP/TLS setup
+KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+_clients = {}
+_models = {}
+_lock = threading.Lock()
+# Model that replaces Gemini for every caller (see install_model)
+_installed_model = None
+
+
+def credential_key(api_key):
+    """Fingerprint an API key so raw keys are never used as registry keys"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def _make_client(api_key):
+    """Create a thread-safe generative service client on a keep-alive gRPC channel"""
+    from google.ai import generativelanguage as glm
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc import (
+        GenerativeServiceGrpcTransport
+    )
+
+    def keepalive_channel(host, **kwargs):
+        kwargs["options"] = list(kwargs.get("options") or []) + KEEPALIVE_OPTIONS
+        return GenerativeServiceGrpcTransport.create_channel(host, **kwargs)
+
+    return glm.GenerativeServiceClient(
+        transport=functools.partial(GenerativeServiceGrpcTransport, channel=keepalive_channel),
+        client_options={"api_key": api_key}
+    )
+
+
+def get_client(api_key):
+    """Return the process-wide client for an API key, creating it on first use"""
+    key = credential_key(api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = _make_client(api_key)
+    return client
+
+
+def get_model(api_key, model_name=DEFAULT_MODEL):
+    """Return a shared GenerativeModel bound to the pooled client for this API key.
+
+    Models hold no per-request state, so one instance is safely shared by every
+    session and worker thread using the same credentials.
+    """
+    if _installed_model is not None:
+        return _installed_model
+
+    key = (credential_key(api_key), model_name)
+    model = _models.get(key)
+    if model is None:
+        client = get_client(api_key)
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                # Route calls through the pooled client instead of genai's global default
+                model._client = client
+                _models[key] = model
+    return model
+
+
+def install_model(model):
+    """Serve every get_model() call with this model (used by offline harnesses); None restores Gemini"""
+    global _installed_model
+    _installed_model = model
+
+
+def pool_stats():
+    """Number of pooled clients and models in this process"""
+    return {"clients": len(_clients), "models": len(_models)}
+
+
+def close_all():
+    """Close every pooled client (used on shutdown and in tests)"""
+    with _lock:
+        for client in _clients.values():
+            client.transport.close()
+        _clients.clear()
+        _models.clear()
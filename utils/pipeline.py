@@ -0,0 +1,81 @@
+# utils/pipeline.py - The topic generation pipeline shared by app.py and headless jobs
+import os
+import hashlib
+from datetime import datetime
+
+from utils.storage import ensure_data_dir
+
+# Choices offered by app.py; pre-generated materials are keyed on them
+TOPIC_TYPES = ("Topic", "Chapter", "Book")
+DETAIL_LEVELS = ("basic", "medium", "advanced")
+
+
+def pregenerated_session_id(topic, topic_type="Topic", detail_level="medium"):
+    """Deterministic session id under which pre-generated materials for a topic are stored"""
+    key = f"{topic.strip().lower()}|{topic_type}|{detail_level}"
+    return f"pregen_{hashlib.sha256(key.encode()).hexdigest()[:16]}"
+
+
+# Ask for notes, summary, image descriptions and quiz in one JSON reply
+# (LEARNMATE_COMBINED_GENERATION=0 restores one call per artifact)
+COMBINED_GENERATION = os.environ.get("LEARNMATE_COMBINED_GENERATION", "1") != "0"
+
+
+def generate_learning_materials(service, topic, topic_type="Topic", detail_level="medium",
+                                num_images=3, num_questions=0, combined=None):
+    """Generate explanation, notes, summary, image descriptions and (optionally) a quiz.
+
+    Returns (session_data, errors) where errors maps a stage name to its error
+    message. If the explanation fails, nothing else is generated and session_data
+    is empty, so failures never cascade into empty notes and summaries.
+    """
+    errors = {}
+    explanation = service.explanation(topic, detail_level)
+    if not explanation.ok or not explanation.value:
+        errors["explanation"] = explanation.error or "empty response"
+        return {}, errors
+
+    if COMBINED_GENERATION if combined is None else combined:
+        stages = service.study_materials(topic, explanation.value, num_images, num_questions)
+    else:
+        stages = {
+            "notes": service.study_notes(topic, explanation.value),
+            "summary": service.summary(topic, explanation.value),
+            "image_descriptions": service.image_descriptions(topic, explanation.value, num_images),
+        }
+        if num_questions:
+            stages["quiz"] = service.quiz(topic, explanation.value, num_questions)
+
+    session_data = {
+        "topic": topic,
+        "topic_type": topic_type,
+        "explanation": explanation.value,
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "detail_level": detail_level
+    }
+    for stage, result in stages.items():
+        if not result.ok:
+            errors[stage] = result.error
+        session_data[stage] = result.value
+    return session_data, errors
+
+
+def get_audio_dir(session_id):
+    """Directory holding persistent narration files for a session"""
+    data_dir, _ = ensure_data_dir()
+    audio_dir = os.path.join(data_dir, "audio", session_id)
+    os.makedirs(audio_dir, exist_ok=True)
+    return audio_dir
+
+
+def pregenerate_audio(session_id, text, voice="en-US", tts_factory=None):
+    """Synthesize narration for every chunk of text into the session's audio directory"""
+    from utils.audio_utils import split_text_into_chunks, synthesize_speech
+
+    audio_dir = get_audio_dir(session_id)
+    paths = []
+    for i, chunk in enumerate(split_text_into_chunks(text)):
+        path = os.path.join(audio_dir, f"part_{i + 1}.mp3")
+        synthesize_speech(chunk, path, voice, tts_factory=tts_factory)
+        paths.append(path)
+    return paths
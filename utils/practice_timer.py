@@ -0,0 +1,122 @@
+# utils/practice_timer.py
+import time
+import uuid
+
+from utils.storage import connect_db
+
+# Submissions this many seconds past the deadline still count as on time (network and click latency)
+GRACE_SECONDS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS timed_attempts (
+    attempt_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    started_ts REAL NOT NULL,
+    deadline_ts REAL NOT NULL,
+    submitted_ts REAL
+);
+CREATE INDEX IF NOT EXISTS timed_attempts_by_user ON timed_attempts (user_id);
+CREATE INDEX IF NOT EXISTS timed_attempts_by_deadline ON timed_attempts (deadline_ts);
+"""
+
+
+_COUNTDOWN_HTML = """
+<div id="countdown" style="font-family: sans-serif; font-size: 1.1rem; padding: 0.4rem 0.8rem;
+     border-radius: 0.5rem; background: #e8f0fe; color: #1a3d7c; display: inline-block;"></div>
+<script>
+  // Counts down locally from the server's remaining time; never talks back to the server
+  const end = Date.now() + REMAINING_MS;
+  const box = document.getElementById("countdown");
+  function tick() {
+    const left = Math.max(0, end - Date.now());
+    const minutes = Math.floor(left / 60000);
+    const seconds = Math.floor((left % 60000) / 1000);
+    if (left === 0) {
+      box.textContent = "Time's up - submit your answers now";
+      box.style.background = "#fde8e8";
+      box.style.color = "#8a1c1c";
+      return;
+    }
+    box.textContent = "Time left: " + minutes + ":" + String(seconds).padStart(2, "0");
+    setTimeout(tick, 250);
+  }
+  tick();
+</script>
+"""
+
+
+def _connect():
+    """Return this thread's connection to the timed attempt database"""
+    return connect_db("practice_timer.db", _SCHEMA)
+
+
+def start_attempt(user_id, duration_seconds, now=None):
+    """Record a timed attempt and its deadline; returns (attempt_id, deadline_ts)"""
+    now = time.time() if now is None else now
+    attempt_id = uuid.uuid4().hex
+    deadline = now + duration_seconds
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO timed_attempts (attempt_id, user_id, started_ts, deadline_ts) VALUES (?, ?, ?, ?)",
+            (attempt_id, user_id, now, deadline)
+        )
+    return attempt_id, deadline
+
+
+def get_attempt(attempt_id):
+    row = _connect().execute(
+        "SELECT user_id, started_ts, deadline_ts, submitted_ts FROM timed_attempts WHERE attempt_id = ?",
+        (attempt_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(("user_id", "started_ts", "deadline_ts", "submitted_ts"), row))
+
+
+def seconds_remaining(attempt_id, now=None):
+    """Seconds until the recorded deadline (negative once it has passed); None for unknown attempts"""
+    attempt = get_attempt(attempt_id)
+    if attempt is None:
+        return None
+    return attempt["deadline_ts"] - (time.time() if now is None else now)
+
+
+def submit_attempt(attempt_id, user_id, now=None):
+    """Close an attempt against its stored deadline.
+
+    Returns (accepted, overdue_seconds): accepted is False for unknown, foreign or
+    already submitted attempts; overdue_seconds is 0 for on-time submissions.
+    The submission is recorded atomically, so double submits are rejected.
+    """
+    now = time.time() if now is None else now
+    conn = _connect()
+    with conn:
+        updated = conn.execute(
+            "UPDATE timed_attempts SET submitted_ts = ? "
+            "WHERE attempt_id = ? AND user_id = ? AND submitted_ts IS NULL",
+            (now, attempt_id, user_id)
+        ).rowcount
+    if not updated:
+        return False, 0.0
+    overdue = now - get_attempt(attempt_id)["deadline_ts"]
+    return True, overdue if overdue > GRACE_SECONDS else 0.0
+
+
+def delete_attempts(user_id=None, before_ts=None):
+    """Delete timed attempts of one user and/or whose deadline passed before a time"""
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if before_ts is not None:
+        clauses.append("deadline_ts < ?")
+        params.append(before_ts)
+    conn = _connect()
+    with conn:
+        return conn.execute(f"DELETE FROM timed_attempts WHERE {' AND '.join(clauses) or '1'}", params).rowcount
+
+
+def countdown_html(remaining_seconds):
+    """Self-contained countdown widget for st.components.v1.html (it triggers no reruns)"""
+    return _COUNTDOWN_HTML.replace("REMAINING_MS", str(max(0, int(remaining_seconds * 1000))))
@@ -0,0 +1,112 @@
+# utils/preferences.py - Per-user preferences
+#
+# Preferences are stored as one JSON file per user under <data dir>/preferences/,
+# replaced atomically on save. Each user's file is read once per process and kept
+# in memory with a version number that every save bumps; a session remembers the
+# version it last applied, so sync_preferences() costs a dict lookup on a rerun
+# and other open sessions of the same user pick up a change on their next rerun.
+
+import os
+import json
+import itertools
+import threading
+
+import streamlit as st
+
+from utils.storage import ensure_data_dir, atomic_write
+from utils.metrics import record_cache
+
+DEFAULT_PREFERENCES = {
+    "default_difficulty": "Intermediate",
+    "learning_style": "Visual",
+    "session_length": 30,
+    "study_reminder": False,
+    "favorite_subjects": [],
+    "learning_goals": "",
+    "theme": "Light",
+    "font_size": "Medium",
+    "layout": "Compact",
+    "animations": True,
+    "email_notifications": False,
+    "browser_notifications": True,
+    "enable_audio": False,
+    "voice_type": "Friendly",
+    "speech_speed": 1.0,
+    "volume": 80,
+    "text_highlight": True,
+    "background_music": False,
+}
+
+# Settings labels -> the font-size keys used by the theme CSS
+FONT_SIZES = {"Small": "small", "Medium": "medium", "Large": "large", "Extra Large": "x-large"}
+
+# Settings difficulty -> the quiz generator's difficulty levels
+QUIZ_DIFFICULTY = {"Beginner": "easy", "Intermediate": "medium", "Advanced": "hard"}
+
+_cache = {}     # user id -> (version, preferences)
+_versions = itertools.count(1)
+_lock = threading.Lock()
+
+
+def _preferences_path(user_id):
+    data_dir, _ = ensure_data_dir()
+    prefs_dir = os.path.join(data_dir, "preferences")
+    os.makedirs(prefs_dir, exist_ok=True)
+    return os.path.join(prefs_dir, f"{user_id}.json")
+
+
+def _read(user_id):
+    path = _preferences_path(user_id)
+    stored = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            stored = json.load(f)
+    return {**DEFAULT_PREFERENCES, **stored}
+
+
+def load_preferences(user_id):
+    """(version, preferences) for a user, reading their file only the first time"""
+    with _lock:
+        entry = _cache.get(user_id)
+        record_cache("preferences", entry is not None)
+        if entry is None:
+            entry = _cache[user_id] = (next(_versions), _read(user_id))
+        return entry
+
+
+def save_preferences(user_id, changes):
+    """Merge changes into a user's preferences and write them atomically; returns the new version"""
+    with _lock:
+        entry = _cache.get(user_id)
+        preferences = {**(entry[1] if entry else _read(user_id)), **changes}
+        atomic_write(_preferences_path(user_id), json.dumps(preferences, indent=2))
+        version = next(_versions)
+        _cache[user_id] = (version, preferences)
+        return version
+
+
+def forget_preferences(user_id):
+    """Delete a user's stored preferences (they fall back to the defaults)"""
+    with _lock:
+        _cache.pop(user_id, None)
+        try:
+            os.remove(_preferences_path(user_id))
+        except FileNotFoundError:
+            pass
+
+
+def sync_preferences():
+    """The current user's preferences, copied into session state when they changed since the last rerun"""
+    user_id = st.session_state.get('user_id', 'anonymous')
+    version, preferences = load_preferences(user_id)
+    if st.session_state.get('preferences_version') != (user_id, version):
+        st.session_state.preferences = preferences
+        st.session_state.dark_mode = preferences["theme"] == "Dark"
+        st.session_state.font_size = FONT_SIZES.get(preferences["font_size"], "medium")
+        st.session_state.preferences_version = (user_id, version)
+    return st.session_state.preferences
+
+
+def preference(name):
+    """One of the current user's preferences (its default if never set)"""
+    return sync_preferences().get(name, DEFAULT_PREFERENCES.get(name))
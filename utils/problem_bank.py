@@ -0,0 +1,167 @@
+# utils/problem_bank.py
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.storage import connect_db
+from utils.metrics import increment
+
+# Labels shown on the practice page -> problem types in the bank (None = any type)
+PROBLEM_TYPES = {
+    "Mixed": None,
+    "Multiple Choice": "multiple_choice",
+    "Short Answer": "short_answer",
+    "Calculation": "calculation",
+    "Essay": "essay",
+}
+
+# A background refill is started when a user has fewer unseen problems than
+# REFILL_FACTOR times the set size; each refill asks for REFILL_BATCH problems
+REFILL_FACTOR = 2
+REFILL_BATCH = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS problems (
+    problem_id TEXT PRIMARY KEY,
+    topic_key TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS problems_lookup ON problems (topic_key, difficulty, type);
+CREATE TABLE IF NOT EXISTS served (
+    user_id TEXT NOT NULL,
+    problem_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    PRIMARY KEY (user_id, problem_id)
+);
+CREATE INDEX IF NOT EXISTS served_by_ts ON served (ts);
+"""
+
+_refills = set()
+_refills_lock = threading.Lock()
+_executor = None
+
+
+def _connect():
+    """Return this thread's connection to the problem bank database"""
+    return connect_db("problem_bank.db", _SCHEMA)
+
+
+def topic_key(topic):
+    return " ".join(topic.lower().split())
+
+
+def problem_id(topic, difficulty, question):
+    """Stable id so the same question is only banked once per topic and difficulty"""
+    key = f"{topic_key(topic)}\n{difficulty}\n{' '.join(question.split())}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def add_problems(topic, difficulty, problems):
+    """Bank validated problem dicts; returns how many were new"""
+    conn = _connect()
+    now = time.time()
+    with conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO problems (problem_id, topic_key, topic, difficulty, type, data, created_ts) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(problem_id(topic, difficulty, p["question"]), topic_key(topic), topic, difficulty, p["type"],
+              json.dumps(p), now) for p in problems]
+        )
+        return conn.total_changes - before
+
+
+def _unseen_query(columns, problem_type):
+    query = (f"SELECT {columns} FROM problems p WHERE p.topic_key = ? AND p.difficulty = ? "
+             "AND NOT EXISTS (SELECT 1 FROM served s WHERE s.user_id = ? AND s.problem_id = p.problem_id)")
+    return query + (" AND p.type = ?" if problem_type else "")
+
+
+def unseen_count(user_id, topic, difficulty, problem_type=None):
+    """Banked problems for this topic/difficulty/type the user has not been served"""
+    params = [topic_key(topic), difficulty, user_id] + ([problem_type] if problem_type else [])
+    return _connect().execute(_unseen_query("COUNT(*)", problem_type), params).fetchone()[0]
+
+
+def draw_problems(user_id, topic, difficulty, problem_type=None, count=5, rng=random):
+    """Sample up to `count` problems the user has never been served and mark them served"""
+    conn = _connect()
+    params = [topic_key(topic), difficulty, user_id] + ([problem_type] if problem_type else [])
+    rows = conn.execute(_unseen_query("p.problem_id, p.data", problem_type), params).fetchall()
+    chosen = rng.sample(rows, min(count, len(rows)))
+    now = time.time()
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO served (user_id, problem_id, ts) VALUES (?, ?, ?)",
+                         [(user_id, pid, now) for pid, _ in chosen])
+    return [json.loads(data) for _, data in chosen]
+
+
+def forget_served(user_id=None, before_ts=None):
+    """Forget which problems were served (to one user and/or before a time) so they can be drawn again"""
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if before_ts is not None:
+        clauses.append("ts < ?")
+        params.append(before_ts)
+    conn = _connect()
+    with conn:
+        return conn.execute(f"DELETE FROM served WHERE {' AND '.join(clauses) or '1'}", params).rowcount
+
+
+def _refill(service, topic, difficulty, problem_type, key):
+    try:
+        result = service.practice_set(topic, difficulty, problem_type, REFILL_BATCH)
+        added = add_problems(topic, difficulty, result.value) if result.ok else 0
+        increment("problem_bank_refills_total", result="ok" if result.ok else "error")
+        increment("problem_bank_problems_added_total", added)
+    finally:
+        with _refills_lock:
+            _refills.discard(key)
+
+
+def schedule_refill(service, topic, difficulty, problem_type=None):
+    """Top up the bank for a topic on a background thread (at most one refill per key at a time)"""
+    global _executor
+    key = (topic_key(topic), difficulty, problem_type)
+    with _refills_lock:
+        if key in _refills:
+            return False
+        _refills.add(key)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="problem-bank")
+    _executor.submit(_refill, service, topic, difficulty, problem_type, key)
+    return True
+
+
+def serve_problems(service, user_id, topic, difficulty, problem_type=None, count=5, background_service=None):
+    """A practice set for a user: unseen banked problems first, generated ones for any shortfall.
+
+    Returns (problems, error). `service` generates the shortfall while the student
+    waits; `background_service` (default: the same service) refills the bank
+    afterwards so the next set is served straight from it.
+    """
+    problems = draw_problems(user_id, topic, difficulty, problem_type, count)
+    increment("problem_bank_served_total", len(problems), source="bank")
+    error = None
+
+    if len(problems) < count:
+        result = service.practice_set(topic, difficulty, problem_type, count - len(problems))
+        error = result.error
+        if result.ok:
+            add_problems(topic, difficulty, result.value)
+            fresh = draw_problems(user_id, topic, difficulty, problem_type, count - len(problems))
+            increment("problem_bank_served_total", len(fresh), source="generated")
+            problems += fresh
+
+    if unseen_count(user_id, topic, difficulty, problem_type) < REFILL_FACTOR * count:
+        schedule_refill(background_service or service, topic, difficulty, problem_type)
+    return problems, error
@@ -0,0 +1,200 @@
+# utils/resilience.py - Rate limiting, retries and request coalescing for model calls
+import os
+import time
+import heapq
+import random
+import hashlib
+import itertools
+import threading
+from concurrent.futures import Future
+
+from utils.metrics import increment, observe
+
+# Priority classes: lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Default client-side budget per API key (raise GEMINI_REQUESTS_PER_MINUTE on paid tiers)
+REQUESTS_PER_MINUTE = int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", 60))
+BURST = 10
+
+# Fraction of the bucket kept back for interactive requests
+INTERACTIVE_RESERVE = 0.2
+
+# Retry policy
+MAX_ATTEMPTS = 5
+BASE_DELAY = 0.5
+MAX_DELAY = 20.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_NAMES = {"TooManyRequests", "ResourceExhausted", "ServiceUnavailable", "InternalServerError",
+                    "BadGateway", "GatewayTimeout", "DeadlineExceeded"}
+_RETRYABLE_GRPC = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED"}
+
+
+class RateLimiter:
+    """Token bucket shared by all threads, serving waiters in priority order.
+
+    Background requests may only take a token while more than INTERACTIVE_RESERVE
+    of the bucket is left, so pre-generation never starves students' chat.
+    """
+
+    def __init__(self, rate_per_second, burst, reserve=INTERACTIVE_RESERVE, clock=time.monotonic):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self.reserve = reserve * burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _threshold(self, priority):
+        return 1.0 + (self.reserve if priority > PRIORITY_INTERACTIVE else 0.0)
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """Block until a token is available for this priority; return False on timeout"""
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    self._refill()
+                    needed = self._threshold(priority)
+                    if self._waiters[0] == ticket and self._tokens >= needed:
+                        self._tokens -= 1
+                        return True
+                    wait = max((needed - self._tokens) / self.rate, 0.001)
+                    if deadline is not None:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+
+def _status_retryable(exc):
+    # google.api_core errors carry the HTTP status in .code and the gRPC one in .grpc_status_code
+    for attr in ("code", "status_code"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int) and code in RETRYABLE_STATUS:
+            return True
+    grpc_code = getattr(exc, "grpc_status_code", None)
+    if getattr(grpc_code, "name", None) in _RETRYABLE_GRPC:
+        return True
+    return type(exc).__name__ in _RETRYABLE_NAMES
+
+
+def is_retryable(exc):
+    """True for rate-limit (429) and transient server (5xx) errors, judged by type and status code"""
+    # A client library may wrap the transport error it caught
+    return _status_retryable(exc) or (exc.__cause__ is not None and _status_retryable(exc.__cause__))
+
+
+def decorrelated_jitter(previous, base=BASE_DELAY, cap=MAX_DELAY, rng=random):
+    """Next backoff delay: uniform between base and three times the previous delay, capped"""
+    return min(cap, rng.uniform(base, previous * 3))
+
+
+def retry_call(fn, max_attempts=MAX_ATTEMPTS, base=BASE_DELAY, cap=MAX_DELAY, sleep=time.sleep,
+               retryable=is_retryable):
+    """Call fn(), retrying retryable failures with decorrelated-jitter backoff"""
+    delay = base
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_attempts or not retryable(e):
+                raise
+            delay = decorrelated_jitter(delay, base, cap)
+            sleep(delay)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+                increment("coalesced_requests_total")
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+
+_limiters = {}
+_flights = SingleFlight()
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(key):
+    """Return the process-wide limiter for a credential key"""
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(REQUESTS_PER_MINUTE / 60.0, BURST)
+        return limiter
+
+
+class ResilientClient:
+    """Wrap a model client with coalescing, rate limiting and retries.
+
+    Identical in-flight prompts share one upstream call; each upstream attempt
+    takes a token from the shared limiter at this client's priority.
+    """
+
+    def __init__(self, client, limiter_key="default", priority=PRIORITY_INTERACTIVE, flights=None):
+        self.client = client
+        self.limiter = get_rate_limiter(limiter_key)
+        self.limiter_key = limiter_key
+        self.priority = priority
+        self.flights = flights or _flights
+
+    def _call_upstream(self, prompt):
+        attempts = 0
+
+        def attempt():
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1:
+                increment("model_retries_total")
+            waited = time.perf_counter()
+            self.limiter.acquire(self.priority)
+            observe("rate_limit_wait_seconds", time.perf_counter() - waited, priority=self.priority)
+            return self.client.generate_content(prompt)
+        return retry_call(attempt)
+
+    def generate_content(self, prompt):
+        key = hashlib.sha256(f"{self.limiter_key}\n{prompt}".encode()).hexdigest()
+        return self.flights.do(key, lambda: self._call_upstream(prompt))
@@ -0,0 +1,262 @@
+# utils/retention.py - Deleting user data and keeping stored data bounded
+#
+# delete_user_data removes whole categories of a user's data with bulk deletes
+# against each store and cascades to what was derived from it: full-text and
+# vector index entries, visual assets, study events and their rollups. apply_retention runs the periodic policies: raw
+# events past their retention period are dropped (the daily and per-topic
+# rollups keep their totals), old log records and bookkeeping rows are pruned,
+# and the indexes are compacted once enough of them is dead.
+#
+# Policies that delete a student's own data (events, practice and chat history)
+# are off unless their LEARNMATE_RETENTION_*_DAYS variable is set; only
+# bookkeeping (served problems, timed attempts) expires by default. app.py
+# starts the worker with start_retention_worker().
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+from utils.storage import ensure_data_dir
+from utils.metrics import span, increment
+from utils.events import (EVENT_GENERATION, EVENT_AUDIO_PLAY, EVENT_QUIZ_ANSWER, EVENT_PRACTICE_SUBMIT,
+                          EVENT_CHAT_TURN)
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def _days(name, default):
+    return float(os.environ.get(name, default))
+
+
+# Retention periods in days; 0 keeps data forever
+RETENTION_DAYS = {
+    "events": _days("LEARNMATE_RETENTION_EVENT_DAYS", 0),
+    "practice_history": _days("LEARNMATE_RETENTION_PRACTICE_DAYS", 0),
+    "chat_history": _days("LEARNMATE_RETENTION_CHAT_DAYS", 0),
+    "served_problems": _days("LEARNMATE_RETENTION_SERVED_DAYS", 365),
+    "timed_attempts": _days("LEARNMATE_RETENTION_ATTEMPT_DAYS", 7),
+}
+RETENTION_INTERVAL = float(os.environ.get("LEARNMATE_RETENTION_INTERVAL", 6 * 3600))
+
+# The vector index is rewritten once this share of its chunks is tombstoned
+VECTOR_COMPACT_THRESHOLD = 0.2
+
+# Study events recorded for each category of user data
+CATEGORY_EVENTS = {
+    "Learning history": (EVENT_GENERATION, EVENT_AUDIO_PLAY),
+    "Practice sessions": (EVENT_PRACTICE_SUBMIT,),
+    "Quiz results": (EVENT_QUIZ_ANSWER,),
+    "Chat history": (EVENT_CHAT_TURN,),
+    "Visual aids": (),
+}
+ALL_USER_DATA = "All user data"
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _delete_learning_history(user_id):
+    from utils.storage import user_session_ids
+    from utils.search_index import remove_sessions
+    from utils.retrieval import get_vector_index
+
+    # Only pre-generated sessions keep narration under <data dir>/audio/; a user's
+    # narration is scratch audio owned by their browser session and swept with it
+    _, user_sessions_dir = ensure_data_dir()
+    session_ids = user_session_ids(user_id)
+    for session_id in session_ids:
+        _remove_file(os.path.join(user_sessions_dir, f"{session_id}.json"))
+    if session_ids:
+        remove_sessions(session_ids)
+        get_vector_index().remove_sessions(session_ids)
+    return len(session_ids)
+
+
+def _delete_practice_sessions(user_id):
+    from utils.storage import iter_jsonl, log_lock, _practice_history_path
+    from utils.problem_bank import forget_served
+    from utils.practice_timer import delete_attempts
+
+    path = _practice_history_path(user_id)
+    with log_lock(path):
+        deleted = sum(1 for _ in iter_jsonl(path))
+        _remove_file(path)
+    forget_served(user_id)
+    delete_attempts(user_id)
+    return deleted
+
+
+def _delete_chat_history(user_id):
+    from utils.storage import iter_jsonl, log_lock, _chat_history_path
+
+    path = _chat_history_path(user_id)
+    with log_lock(path):
+        deleted = sum(1 for _ in iter_jsonl(path))
+        _remove_file(path)
+    return deleted
+
+
+def _delete_visual_aids(user_id):
+    from utils.visual_store import delete_user_visuals
+
+    return delete_user_visuals(user_id)
+
+
+_DELETERS = {
+    "Learning history": _delete_learning_history,
+    "Practice sessions": _delete_practice_sessions,
+    "Quiz results": lambda user_id: 0,  # quiz results are study events only
+    "Chat history": _delete_chat_history,
+    "Visual aids": _delete_visual_aids,
+}
+
+
+def delete_user_data(user_id, categories):
+    """Delete categories of a user's data (or ALL_USER_DATA) with everything derived from them.
+
+    Returns {category: records deleted}, where study events are counted under
+    "Study events".
+    """
+    from utils.events import delete_events
+    from utils.analytics import invalidate
+
+    everything = ALL_USER_DATA in categories
+    if everything:
+        categories = list(_DELETERS)
+    unknown = [c for c in categories if c not in _DELETERS]
+    if unknown:
+        raise ValueError(f"Unknown data categories: {', '.join(unknown)}")
+
+    counts = {}
+    with span("retention.delete_user_data"):
+        for category in categories:
+            counts[category] = _DELETERS[category](user_id)
+        if everything:
+            from utils.review_scheduler import remove_user_cards
+            from utils.preferences import forget_preferences
+            counts["Review cards"] = remove_user_cards(user_id)
+            forget_preferences(user_id)
+            counts["Study events"] = delete_events(user_id)
+        else:
+            event_types = [t for c in categories for t in CATEGORY_EVENTS[c]]
+            counts["Study events"] = delete_events(user_id, event_types) if event_types else 0
+        invalidate(user_id)
+    for category, count in counts.items():
+        increment("user_data_deleted_total", count, category=category)
+    return counts
+
+
+def _timestamp(line):
+    """The record's timestamp, or None for a line that does not parse (torn by a crash)"""
+    try:
+        return json.loads(line).get("timestamp", "")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+def _trim_jsonl_log(path, cutoff):
+    """Rewrite one log without records older than the cutoff (or unparseable); returns records dropped"""
+    from utils.storage import log_lock
+
+    # Held for the whole rewrite, so no append can land in the file being replaced
+    with log_lock(path):
+        with open(path, "rb") as source:
+            first = source.readline()
+        # Logs are append-only, so a file whose first record is recent needs no rewrite
+        first_ts = _timestamp(first)
+        if not first.strip() or (first_ts is not None and first_ts >= cutoff):
+            return 0
+        kept = dropped = 0
+        with open(path, "rb") as source, open(path + ".tmp", "wb") as target:
+            for line in source:
+                if not line.strip():
+                    continue
+                ts = _timestamp(line)
+                if ts is None or ts < cutoff:
+                    dropped += 1
+                    continue
+                target.write(line)
+                kept += 1
+        if kept:
+            os.replace(path + ".tmp", path)
+        else:
+            os.remove(path + ".tmp")
+            os.remove(path)
+        return dropped
+
+
+def _trim_jsonl_logs(kind, cutoff_ts):
+    """Rewrite each user's JSON Lines log under <data dir>/<kind>/ without records older than the cutoff"""
+    data_dir, _ = ensure_data_dir()
+    log_dir = os.path.join(data_dir, kind)
+    if not os.path.isdir(log_dir):
+        return 0
+    cutoff = datetime.fromtimestamp(cutoff_ts).strftime("%Y-%m-%d %H:%M:%S")
+    return sum(_trim_jsonl_log(os.path.join(log_dir, name), cutoff)
+               for name in os.listdir(log_dir) if name.endswith(".jsonl"))
+
+
+def apply_retention(now=None):
+    """Run every retention policy once; returns what each one removed"""
+    from utils.events import delete_events_before
+    from utils.problem_bank import forget_served
+    from utils.practice_timer import delete_attempts
+    from utils.retrieval import get_vector_index
+    from utils.search_index import optimize
+
+    now = time.time() if now is None else now
+
+    def cutoff(policy):
+        days = RETENTION_DAYS[policy]
+        return now - days * DAY_SECONDS if days > 0 else None
+
+    removed = {}
+    with span("retention.apply"):
+        if cutoff("events") is not None:
+            removed["events"] = delete_events_before(cutoff("events"))
+        for policy in ("practice_history", "chat_history"):
+            if cutoff(policy) is not None:
+                removed[policy] = _trim_jsonl_logs(policy, cutoff(policy))
+        if cutoff("served_problems") is not None:
+            removed["served_problems"] = forget_served(before_ts=cutoff("served_problems"))
+        if cutoff("timed_attempts") is not None:
+            removed["timed_attempts"] = delete_attempts(before_ts=cutoff("timed_attempts"))
+
+        index = get_vector_index()
+        if index.dead_fraction() > VECTOR_COMPACT_THRESHOLD:
+            index.compact()
+            removed["vector_index_compacted"] = 1
+        optimize()
+    for policy, count in removed.items():
+        increment("retention_removed_total", count, policy=policy)
+    return removed
+
+
+def _run(interval):
+    while True:
+        try:
+            apply_retention()
+        except Exception:
+            # Retried on the next pass
+            increment("retention_errors_total")
+        time.sleep(interval)
+
+
+def start_retention_worker(interval=RETENTION_INTERVAL):
+    """Apply the retention policies now and every `interval` seconds on a daemon thread (idempotent)"""
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            return
+        _worker = threading.Thread(target=_run, args=(interval,), name="retention", daemon=True)
+    _worker.start()
@@ -0,0 +1,354 @@
+# utils/retrieval.py
+import os
+import re
+import json
+import zlib
+import threading
+from collections import Counter
+
+from utils.storage import ensure_data_dir, atomic_write
+from utils.bootstrap import lazy_import
+from utils.metrics import timed
+
+np = lazy_import("numpy")
+
+# Dimension of the hashed bag-of-words vectors
+EMBEDDING_DIM = 512
+
+# Session fields that are chunked and indexed
+INDEXED_FIELDS = ("explanation", "notes", "summary")
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a about an and are as at be by did do does for from how i in is it learn of on or that the this to was
+what when where which who why with you your
+""".split())
+_embedders = {}
+_index = None
+_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercase text and split it into alphanumeric tokens, dropping stopwords"""
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def hashed_bow_embedder(texts, dim=EMBEDDING_DIM):
+    """Embed texts as L2-normalised hashed bag-of-words vectors (runs fully offline)"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        # Unigrams plus bigrams give a little word-order signal
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        if not features:
+            continue
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vectors[row], hashes % dim, signs)
+    # Sublinear term frequency, then normalise for cosine similarity
+    vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def register_embedder(name, embed_fn):
+    """Register a local embedding function mapping a list of texts to an (n, d) array"""
+    _embedders[name] = embed_fn
+
+
+def get_embedder(name="hashed"):
+    """Return a registered embedding function"""
+    return _embedders[name]
+
+
+register_embedder("hashed", hashed_bow_embedder)
+
+
+def chunk_text(text, max_length=800):
+    """Split text into paragraph-aligned chunks suitable for retrieval"""
+    from utils.audio_utils import split_text_into_chunks
+
+    return [chunk.strip() for chunk in split_text_into_chunks(text, max_length) if chunk.strip()]
+
+
+class VectorIndex:
+    """Append-only NumPy vector index with cosine top-k search.
+
+    Vectors are stored as raw float32 rows in ``vectors.f32`` and chunk metadata
+    as a journal in ``chunks.jsonl``, so adding a session only appends to disk.
+    Removed sessions are tombstoned and dropped on the next ``compact``.
+    """
+
+    def __init__(self, index_dir, embedder="hashed"):
+        self.index_dir = index_dir
+        self.embed = get_embedder(embedder)
+        self.vectors_file = os.path.join(index_dir, "vectors.f32")
+        self.journal_file = os.path.join(index_dir, "chunks.jsonl")
+        self._vectors = None
+        self._count = 0
+        self._chunks = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._session_df = {}   # session id -> (live chunks, Counter of token -> chunks containing it)
+        self._df_cache = {}     # frozenset of session ids (None for all) -> merged document frequencies
+        self._lock = threading.RLock()
+        os.makedirs(index_dir, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return int(self._alive[:self._count].sum())
+
+    def _load(self):
+        """Replay the on-disk journal into memory, repairing the files after a crash"""
+        rows = []
+        torn = False
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash; everything before it is valid
+                        torn = True
+                        break
+                    if entry.get("op") == "delete":
+                        for row in rows:
+                            if row["session_id"] == entry["session_id"]:
+                                row["alive"] = False
+                    else:
+                        entry["alive"] = entry.get("alive", True)
+                        rows.append(entry)
+
+        vectors = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        size = 0
+        if os.path.exists(self.vectors_file):
+            vectors = np.fromfile(self.vectors_file, dtype=np.float32)
+            size = vectors.size
+            vectors = vectors[:vectors.size - vectors.size % EMBEDDING_DIM].reshape(-1, EMBEDDING_DIM)
+
+        # Vectors and journal can disagree after a crash; keep the common prefix
+        count = min(len(rows), len(vectors))
+        self._chunks = rows[:count]
+        self._count = count
+        self._vectors = np.array(vectors[:count], dtype=np.float32)
+        self._alive = np.array([row["alive"] for row in self._chunks], dtype=bool)
+        self._session_df = {}
+        self._count_tokens(row for row in self._chunks if row["alive"])
+        if torn or count != len(rows) or size != count * EMBEDDING_DIM:
+            # Rewrite both files to the common prefix, so later appends line up row for row
+            self._write_files(self._vectors, self._chunks)
+
+    def _write_files(self, vectors, chunks):
+        """Atomically replace the index files with these rows (tombstones kept as "alive": false)"""
+        lines = []
+        for chunk in chunks:
+            entry = {k: v for k, v in chunk.items() if k != "alive"}
+            if not chunk["alive"]:
+                entry["alive"] = False
+            lines.append(json.dumps(entry) + "\n")
+        atomic_write(self.vectors_file, np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        atomic_write(self.journal_file, "".join(lines))
+
+    def _embed(self, texts):
+        """Embed texts, checking the embedder returns one EMBEDDING_DIM-wide row per text"""
+        vectors = np.asarray(self.embed(texts), dtype=np.float32)
+        if vectors.shape != (len(texts), EMBEDDING_DIM):
+            raise ValueError(f"embedder returned shape {vectors.shape}, "
+                             f"expected ({len(texts)}, {EMBEDDING_DIM}) to match the stored index")
+        return vectors
+
+    def _count_tokens(self, chunks):
+        """Add live chunks to the per-session document frequencies"""
+        for chunk in chunks:
+            documents, frequencies = self._session_df.get(chunk["session_id"], (0, Counter()))
+            frequencies.update(set(tokenize(chunk["text"])))
+            self._session_df[chunk["session_id"]] = (documents + 1, frequencies)
+        self._df_cache.clear()
+
+    def _append(self, vectors, chunks):
+        needed = self._count + len(vectors)
+        if needed > len(self._vectors):
+            capacity = max(needed, 2 * len(self._vectors), 64)
+            grown = np.zeros((capacity, EMBEDDING_DIM), dtype=np.float32)
+            grown[:self._count] = self._vectors[:self._count]
+            self._vectors = grown
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self._count] = self._alive[:self._count]
+            self._alive = alive
+        self._vectors[self._count:needed] = vectors
+        self._alive[self._count:needed] = True
+        self._chunks.extend(chunks)
+        self._count = needed
+        self._count_tokens(chunks)
+
+    def add_session(self, session_id, session_data):
+        """Chunk, embed and append the text fields of a saved session"""
+        chunks = []
+        for field in INDEXED_FIELDS:
+            for text in chunk_text(session_data.get(field) or ""):
+                chunks.append({
+                    "op": "add",
+                    "session_id": session_id,
+                    "topic": session_data.get("topic", ""),
+                    "field": field,
+                    "date": session_data.get("date", ""),
+                    "text": text
+                })
+        with self._lock:
+            if any(c["session_id"] == session_id for c in self._chunks):
+                self.remove_session(session_id)
+            if not chunks:
+                return 0
+            vectors = self._embed([c["text"] for c in chunks])
+            with open(self.vectors_file, 'ab') as f:
+                vectors.tofile(f)
+            with open(self.journal_file, 'a') as f:
+                for chunk in chunks:
+                    f.write(json.dumps(chunk) + "\n")
+            for chunk in chunks:
+                chunk["alive"] = True
+            self._append(vectors, chunks)
+        return len(chunks)
+
+    def remove_session(self, session_id):
+        """Tombstone every chunk belonging to a session"""
+        return self.remove_sessions([session_id])
+
+    def remove_sessions(self, session_ids):
+        """Tombstone the chunks of many sessions in one pass over the index"""
+        wanted = set(session_ids)
+        with self._lock:
+            rows = [i for i, c in enumerate(self._chunks) if c["alive"] and c["session_id"] in wanted]
+            if not rows:
+                return 0
+            removed = {self._chunks[i]["session_id"] for i in rows}
+            for i in rows:
+                self._chunks[i]["alive"] = False
+            self._alive[rows] = False
+            for session_id in removed:
+                self._session_df.pop(session_id, None)
+            self._df_cache.clear()
+            with open(self.journal_file, 'a') as f:
+                for session_id in removed:
+                    f.write(json.dumps({"op": "delete", "session_id": session_id}) + "\n")
+        return len(rows)
+
+    def dead_fraction(self):
+        """Share of stored chunks that are tombstoned (compact() reclaims them)"""
+        with self._lock:
+            return 1 - len(self) / self._count if self._count else 0.0
+
+    def compact(self):
+        """Rewrite the index files without tombstoned chunks"""
+        with self._lock:
+            keep = np.flatnonzero(self._alive[:self._count])
+            vectors = self._vectors[keep]
+            chunks = [self._chunks[i] for i in keep]
+            self._write_files(vectors, chunks)
+            self._vectors = np.array(vectors, dtype=np.float32)
+            self._chunks = chunks
+            self._count = len(chunks)
+            self._alive = np.ones(self._count, dtype=bool)
+
+    def document_frequencies(self, session_ids=None):
+        """(live chunk count, {token: chunks containing it}) over the given sessions (all if None)"""
+        key = None if session_ids is None else frozenset(session_ids)
+        with self._lock:
+            merged = self._df_cache.get(key)
+            if merged is None:
+                documents, frequencies = 0, Counter()
+                for session_id in self._session_df if key is None else key & self._session_df.keys():
+                    session_documents, session_frequencies = self._session_df[session_id]
+                    documents += session_documents
+                    frequencies.update(session_frequencies)
+                merged = self._df_cache[key] = (documents, frequencies)
+            return merged
+
+    @timed("search.vector")
+    def search(self, query, k=5, session_ids=None, min_score=0.0):
+        """Return the top-k chunks by cosine similarity to the query"""
+        with self._lock:
+            if self._count == 0:
+                return []
+            query_vector = self._embed([query])[0]
+            scores = self._vectors[:self._count] @ query_vector
+            mask = self._alive[:self._count].copy()
+            if session_ids is not None:
+                wanted = set(session_ids)
+                mask &= np.fromiter((c["session_id"] in wanted for c in self._chunks), dtype=bool,
+                                    count=self._count)
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top:
+                if scores[i] <= min_score:
+                    break
+                chunk = self._chunks[i]
+                results.append({
+                    "session_id": chunk["session_id"],
+                    "topic": chunk["topic"],
+                    "field": chunk["field"],
+                    "date": chunk["date"],
+                    "text": chunk["text"],
+                    "score": float(scores[i])
+                })
+            return results
+
+
+def get_vector_index():
+    """Return the process-wide vector index over saved sessions"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                data_dir, _ = ensure_data_dir()
+                _index = VectorIndex(os.path.join(data_dir, "vector_index"))
+    return _index
+
+
+def index_session(session_id, session_data):
+    """Add (or refresh) a saved session in the vector index"""
+    return get_vector_index().add_session(session_id, session_data)
+
+
+def retrieve_passages(query, k=4, session_ids=None):
+    """Retrieve the saved passages most relevant to the query"""
+    if not query:
+        return []
+    return get_vector_index().search(query, k=k, session_ids=session_ids)
+
+
+def build_context(query, user_id, k=4, max_chars=3000):
+    """Format passages of the user's own saved sessions as prompt context, capped at max_chars"""
+    from utils.storage import user_session_ids
+
+    parts = []
+    used = 0
+    for passage in retrieve_passages(query, k, session_ids=user_session_ids(user_id)):
+        block = f"[{passage['topic']} - {passage['field']}]\n{passage['text']}"
+        if used + len(block) > max_chars:
+            break
+        parts.append(block)
+        used += len(block)
+    return "\n\n".join(parts)
+
+
+def condense_for_prompt(query, text, max_chars=6000):
+    """Keep only the chunks of text most relevant to the query, in original order"""
+    if len(text) <= max_chars:
+        return text
+    chunks = chunk_text(text)
+    vectors = hashed_bow_embedder(chunks)
+    scores = vectors @ hashed_bow_embedder([query])[0]
+    selected = []
+    used = 0
+    for i in np.argsort(-scores):
+        if used + len(chunks[i]) > max_chars:
+            continue
+        selected.append(i)
+        used += len(chunks[i])
+    return "\n\n".join(chunks[i] for i in sorted(selected))
@@ -0,0 +1,288 @@
+# utils/review_scheduler.py
+import time
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+
+from utils.storage import connect_db
+
+CARD_TOPIC = "topic"
+CARD_QUESTION = "question"
+
+DAY_SECONDS = 24 * 60 * 60
+
+# SM-2 defaults
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+PASSING_QUALITY = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    user_id TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    label TEXT NOT NULL,
+    session_id TEXT,
+    ease REAL NOT NULL,
+    interval_days REAL NOT NULL,
+    repetitions INTEGER NOT NULL,
+    lapses INTEGER NOT NULL,
+    due_ts REAL NOT NULL,
+    last_review_ts REAL,
+    PRIMARY KEY (user_id, card_id)
+);
+CREATE INDEX IF NOT EXISTS cards_due ON cards (user_id, due_ts);
+"""
+
+_CARD_FIELDS = ("card_id", "kind", "topic", "label", "session_id", "ease", "interval_days",
+                "repetitions", "lapses", "due_ts", "last_review_ts")
+
+# Users whose queues are kept in memory; the least recently used are reloaded from SQLite on demand
+MAX_CACHED_QUEUES = 256
+
+_queues = OrderedDict()
+_queues_lock = threading.Lock()
+
+
+def _connect():
+    """Return this thread's connection to the review schedule database"""
+    return connect_db("review_schedule.db", _SCHEMA)
+
+
+def topic_card_id(topic):
+    """Card id for reviewing a whole topic"""
+    return f"{CARD_TOPIC}:{topic.strip().lower()}"
+
+
+def question_card_id(topic, question):
+    """Stable card id for a single quiz or practice question"""
+    digest = hashlib.sha1(f"{topic.strip().lower()}\n{question.strip()}".encode()).hexdigest()[:16]
+    return f"{CARD_QUESTION}:{digest}"
+
+
+def sm2_update(card, quality, now):
+    """Apply one SM-2 review with quality 0-5 and return the updated card"""
+    card = dict(card)
+    if quality < PASSING_QUALITY:
+        card["repetitions"] = 0
+        card["interval_days"] = 1
+        if card["last_review_ts"] is not None:
+            card["lapses"] += 1
+    else:
+        card["repetitions"] += 1
+        if card["repetitions"] == 1:
+            card["interval_days"] = 1
+        elif card["repetitions"] == 2:
+            card["interval_days"] = 6
+        else:
+            card["interval_days"] = round(card["interval_days"] * card["ease"], 1)
+    card["ease"] = max(MIN_EASE, card["ease"] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    card["last_review_ts"] = now
+    card["due_ts"] = now + card["interval_days"] * DAY_SECONDS
+    return card
+
+
+def score_to_quality(fraction_correct):
+    """Map a 0-1 score onto the SM-2 0-5 quality scale"""
+    return max(0, min(5, round(fraction_correct * 5)))
+
+
+class ReviewQueue:
+    """Due-time min-heaps over one user's cards, backed by the SQLite card table.
+
+    Each card kind has its own heap. Heaps use lazy deletion: rescheduling a card
+    pushes a new entry and stale entries are discarded when they reach the top,
+    so every update and pop is O(log n).
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._lock = threading.Lock()
+        rows = _connect().execute(
+            f"SELECT {', '.join(_CARD_FIELDS)} FROM cards WHERE user_id = ?", (user_id,)
+        ).fetchall()
+        self._cards = {row[0]: dict(zip(_CARD_FIELDS, row)) for row in rows}
+        self._heaps = {}
+        for card_id, card in self._cards.items():
+            self._heaps.setdefault(card["kind"], []).append((card["due_ts"], card_id))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def _save(self, cards):
+        conn = _connect()
+        with conn:
+            conn.executemany(f"""
+                INSERT OR REPLACE INTO cards (user_id, {', '.join(_CARD_FIELDS)})
+                VALUES ({', '.join('?' * (len(_CARD_FIELDS) + 1))})
+            """, [(self.user_id, *(card[f] for f in _CARD_FIELDS)) for card in cards])
+
+    def _push(self, card):
+        heapq.heappush(self._heaps.setdefault(card["kind"], []), (card["due_ts"], card["card_id"]))
+
+    def _top(self, kind):
+        """Return the valid top entry of a kind's heap, discarding stale entries"""
+        heap = self._heaps.get(kind, [])
+        while heap:
+            due_ts, card_id = heap[0]
+            card = self._cards.get(card_id)
+            if card is not None and card["due_ts"] == due_ts:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def _next_kind(self, kind):
+        """Pick the heap holding the earliest due card (restricted to `kind` if given)"""
+        kinds = [kind] if kind is not None else list(self._heaps)
+        tops = [(self._top(k), k) for k in kinds]
+        tops = [(top, k) for top, k in tops if top is not None]
+        return min(tops)[1] if tops else None
+
+    def add_card(self, card_id, kind, topic, label, session_id=None, now=None):
+        """Register a new card due one day from now; existing cards keep their schedule"""
+        with self._lock:
+            card = self._cards.get(card_id)
+            if card is not None:
+                if session_id and card["session_id"] != session_id:
+                    card["session_id"] = session_id
+                    self._save([card])
+                return dict(card)
+            now = now or time.time()
+            card = {
+                "card_id": card_id, "kind": kind, "topic": topic, "label": label,
+                "session_id": session_id, "ease": INITIAL_EASE, "interval_days": 1,
+                "repetitions": 0, "lapses": 0, "due_ts": now + DAY_SECONDS, "last_review_ts": None
+            }
+            self._cards[card_id] = card
+            self._push(card)
+            self._save([card])
+            return dict(card)
+
+    def review(self, reviews, now=None):
+        """Apply (card_id, quality, kind, topic, label) reviews in one write"""
+        now = now or time.time()
+        updated = []
+        with self._lock:
+            for card_id, quality, kind, topic, label in reviews:
+                card = self._cards.get(card_id) or {
+                    "card_id": card_id, "kind": kind, "topic": topic, "label": label,
+                    "session_id": None, "ease": INITIAL_EASE, "interval_days": 0,
+                    "repetitions": 0, "lapses": 0, "due_ts": now, "last_review_ts": None
+                }
+                card = sm2_update(card, quality, now)
+                self._cards[card_id] = card
+                self._push(card)
+                updated.append(card)
+            self._save(updated)
+        return updated
+
+    def pop_due(self, now=None, kind=None):
+        """Remove and return the most overdue card (optionally of one kind), or None.
+
+        A popped card leaves the queue until it is reviewed.
+        """
+        now = now or time.time()
+        with self._lock:
+            next_kind = self._next_kind(kind)
+            if next_kind is None or self._heaps[next_kind][0][0] > now:
+                return None
+            _, card_id = heapq.heappop(self._heaps[next_kind])
+            return dict(self._cards[card_id])
+
+    def peek(self, limit=3, kind=None, now=None):
+        """Return up to `limit` next cards in due order without removing them"""
+        with self._lock:
+            taken = []
+            cards = []
+            while len(cards) < limit:
+                next_kind = self._next_kind(kind)
+                if next_kind is None:
+                    break
+                entry = heapq.heappop(self._heaps[next_kind])
+                taken.append((next_kind, entry))
+                cards.append(dict(self._cards[entry[1]]))
+            for next_kind, entry in taken:
+                heapq.heappush(self._heaps[next_kind], entry)
+        if now is not None:
+            cards = [card for card in cards if card["due_ts"] <= now]
+        return cards
+
+    def remove_topic(self, topic):
+        """Delete every card of a topic"""
+        with self._lock:
+            doomed = [cid for cid, card in self._cards.items() if card["topic"] == topic]
+            for card_id in doomed:
+                del self._cards[card_id]
+            conn = _connect()
+            with conn:
+                conn.execute("DELETE FROM cards WHERE user_id = ? AND topic = ?", (self.user_id, topic))
+        return len(doomed)
+
+
+def get_review_queue(user_id):
+    """Return the process-wide review queue for a user, loading it on first use"""
+    with _queues_lock:
+        queue = _queues.get(user_id)
+        if queue is None:
+            queue = _queues[user_id] = ReviewQueue(user_id)
+            while len(_queues) > MAX_CACHED_QUEUES:
+                _queues.popitem(last=False)
+        else:
+            _queues.move_to_end(user_id)
+        return queue
+
+
+def remove_user_cards(user_id):
+    """Delete all of a user's cards and drop their cached queue"""
+    with _queues_lock:
+        _queues.pop(user_id, None)
+        conn = _connect()
+        with conn:
+            return conn.execute("DELETE FROM cards WHERE user_id = ?", (user_id,)).rowcount
+
+
+def add_topic(user_id, topic, session_id=None):
+    """Schedule a newly studied topic for its first review"""
+    return get_review_queue(user_id).add_card(topic_card_id(topic), CARD_TOPIC, topic, topic, session_id)
+
+
+def record_quiz_results(user_id, topic, questions, user_answers):
+    """Update question cards and the topic card from a finished quiz"""
+    reviews = []
+    correct = 0
+    for index, question in enumerate(questions):
+        is_correct = user_answers.get(index) == question["correct_answer"]
+        correct += is_correct
+        reviews.append((question_card_id(topic, question["question"]), 5 if is_correct else 1,
+                        CARD_QUESTION, topic, question["question"]))
+    if questions:
+        reviews.append((topic_card_id(topic), score_to_quality(correct / len(questions)),
+                        CARD_TOPIC, topic, topic))
+    return get_review_queue(user_id).review(reviews)
+
+
+def record_practice_results(user_id, topic, results):
+    """Update problem cards and the topic card from graded practice results"""
+    reviews = [
+        (question_card_id(topic, result["question"]), 5 if result["correct"] else 1,
+         CARD_QUESTION, topic, result["question"])
+        for result in results if result.get("question")
+    ]
+    if results:
+        fraction = sum(1 for result in results if result["correct"]) / len(results)
+        reviews.append((topic_card_id(topic), score_to_quality(fraction), CARD_TOPIC, topic, topic))
+    return get_review_queue(user_id).review(reviews)
+
+
+def get_due_reviews(user_id, limit=3, kind=CARD_TOPIC):
+    """Return the cards due for review now, most overdue first"""
+    return get_review_queue(user_id).peek(limit, kind=kind, now=time.time())
+
+
+def get_upcoming_reviews(user_id, limit=3, kind=CARD_TOPIC):
+    """Return the next cards to review in due order, including ones not due yet"""
+    return get_review_queue(user_id).peek(limit, kind=kind)
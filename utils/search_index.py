@@ -0,0 +1,215 @@
+# utils/search_index.py
+import os
+import re
+import json
+import threading
+
+from utils.storage import ensure_data_dir, connect_db
+from utils.metrics import span
+
+# Columns of the full-text index, in the order bm25 weights are given
+SEARCH_FIELDS = ("topic", "explanation", "notes", "summary")
+FIELD_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+
+# Private-use markers that cannot appear in generated study text
+_MATCH_START = "\ue000"
+_MATCH_END = "\ue001"
+
+_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+    session_id UNINDEXED,
+    date UNINDEXED,
+    topic_type UNINDEXED,
+    {', '.join(SEARCH_FIELDS)},
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS session_rows (
+    row_id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL UNIQUE
+);
+"""
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def get_index_path():
+    """Return the path of the SQLite full-text index"""
+    data_dir, _ = ensure_data_dir()
+    return os.path.join(data_dir, "search_index.db")
+
+
+def _connect():
+    """Return this thread's connection to the index, creating the schema on first use"""
+    conn = connect_db("search_index.db", _SCHEMA)
+    path = get_index_path()
+    if path not in _initialized:
+        with _init_lock:
+            if path not in _initialized:
+                _initialized.add(path)
+                if conn.execute("SELECT count(*) FROM sessions_fts").fetchone()[0] == 0:
+                    _backfill(conn)
+                elif conn.execute("SELECT count(*) FROM session_rows").fetchone()[0] == 0:
+                    _map_rows(conn)
+    return conn
+
+
+def _backfill(conn):
+    """Index session files saved before the search index existed"""
+    _, user_sessions_dir = ensure_data_dir()
+    rows = []
+    for filename in os.listdir(user_sessions_dir):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(user_sessions_dir, filename), 'r') as f:
+                rows.append(_row(filename[:-len('.json')], json.load(f)))
+        except (OSError, json.JSONDecodeError):
+            continue
+    _insert(conn, rows)
+
+
+def _row(session_id, session_data):
+    return (
+        session_id,
+        session_data.get("date", ""),
+        session_data.get("topic_type", "Topic"),
+        *(session_data.get(field) or "" for field in SEARCH_FIELDS)
+    )
+
+
+def _map_rows(conn):
+    """Build the session id -> rowid map for an index created before it existed"""
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO session_rows (row_id, session_id) "
+                     "SELECT rowid, session_id FROM sessions_fts ORDER BY rowid DESC")
+        # Duplicates of a session left by interrupted re-saves; the newest row is kept
+        conn.execute("DELETE FROM sessions_fts WHERE rowid NOT IN (SELECT row_id FROM session_rows)")
+
+
+def _insert(conn, rows):
+    """Add or replace index rows, addressing existing ones by rowid (session_id is not indexed)"""
+    if not rows:
+        return
+    with conn:
+        for row in rows:
+            conn.execute("INSERT OR IGNORE INTO session_rows (session_id) VALUES (?)", (row[0],))
+            row_id = conn.execute("SELECT row_id FROM session_rows WHERE session_id = ?", (row[0],)).fetchone()[0]
+            conn.execute("DELETE FROM sessions_fts WHERE rowid = ?", (row_id,))
+            conn.execute(
+                f"INSERT INTO sessions_fts (rowid, session_id, date, topic_type, {', '.join(SEARCH_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * (3 + len(SEARCH_FIELDS)))})", (row_id, *row)
+            )
+
+
+def index_session(session_id, session_data):
+    """Add or replace a saved session in the full-text index"""
+    _insert(_connect(), [_row(session_id, session_data)])
+
+
+def remove_sessions(session_ids, batch_size=500):
+    """Remove sessions from the full-text index, looking their rows up by session id"""
+    session_ids = list(session_ids)
+    conn = _connect()
+    removed = 0
+    with conn:
+        for start in range(0, len(session_ids), batch_size):
+            batch = session_ids[start:start + batch_size]
+            placeholders = ', '.join('?' * len(batch))
+            row_ids = [(row_id,) for row_id, in conn.execute(
+                f"SELECT row_id FROM session_rows WHERE session_id IN ({placeholders})", batch
+            )]
+            conn.executemany("DELETE FROM sessions_fts WHERE rowid = ?", row_ids)
+            conn.execute(f"DELETE FROM session_rows WHERE session_id IN ({placeholders})", batch)
+            removed += len(row_ids)
+    return removed
+
+
+def optimize():
+    """Merge the full-text index segments (after bulk deletes)"""
+    conn = _connect()
+    with conn:
+        conn.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('optimize')")
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 query that ranks documents matching any term"""
+    terms = _TOKEN_PATTERN.findall(query)
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def _split_highlights(marked_text):
+    """Strip match markers from text and return it with (start, end) highlight offsets"""
+    plain = []
+    offsets = []
+    position = 0
+    start = None
+    for char in marked_text:
+        if char == _MATCH_START:
+            start = position
+        elif char == _MATCH_END:
+            if start is not None:
+                offsets.append((start, position))
+            start = None
+        else:
+            plain.append(char)
+            position += 1
+    return "".join(plain), offsets
+
+
+def search_sessions(query, user_id, limit=20, snippet_tokens=24):
+    """Search the user's saved sessions and return ranked hits with snippets and highlight offsets"""
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    weights = ", ".join(["0", "0", "0", *(str(w) for w in FIELD_WEIGHTS)])
+    with span("search.fulltext"):
+        rows = _connect().execute(f"""
+            SELECT session_id, date, topic_type, topic,
+                   snippet(sessions_fts, -1, ?, ?, '…', ?),
+                   bm25(sessions_fts, {weights}) AS rank
+            FROM sessions_fts
+            WHERE sessions_fts MATCH ? AND rowid IN (
+                SELECT row_id FROM session_rows WHERE session_id >= ? AND session_id < ?
+            )
+            ORDER BY rank
+            LIMIT ?
+        """, (_MATCH_START, _MATCH_END, snippet_tokens, match,
+              # Session ids start with "<user id>_"; "`" is the character after "_"
+              f"{user_id}_", f"{user_id}`", limit)).fetchall()
+
+    results = []
+    for session_id, date, topic_type, topic, marked_snippet, rank in rows:
+        snippet, highlights = _split_highlights(marked_snippet)
+        results.append({
+            "session_id": session_id,
+            "topic": topic,
+            "date": date,
+            "type": topic_type,
+            "snippet": snippet,
+            "highlights": highlights,
+            # bm25() is lower-is-better; flip it so larger scores rank higher
+            "score": -rank
+        })
+    return results
+
+
+def highlight_markdown(text, highlights):
+    """Bold the highlighted spans of a snippet for display with st.markdown"""
+    parts = []
+    last = 0
+    for start, end in highlights:
+        parts.append(text[last:start])
+        parts.append(f"**{text[start:end]}**")
+        last = end
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def find_matches(text, term):
+    """Return case-insensitive (start, end) offsets of term within text"""
+    if not term:
+        return []
+    return [m.span() for m in re.finditer(re.escape(term), text, re.IGNORECASE)]
@@ -0,0 +1,193 @@
+# utils/session_memory.py - Per-session memory accounting and eviction for st.session_state
+#
+# Every session keeps its explanation, rendered images, quiz data and chat in
+# st.session_state for as long as the browser tab is open. Each page calls
+# manage_session_memory() with the heavy keys it reads: those are brought back
+# if they were evicted, and if the session is over its ceiling the largest
+# other evictable values are released until it fits. Rendered images are
+# re-rendered from their descriptions; everything else is pickled to the
+# session's spill directory. An evicted key keeps a falsy SpilledValue
+# placeholder, so `'key' in st.session_state` checks and init code still behave.
+
+import os
+import sys
+import uuid
+import pickle
+import shutil
+
+import streamlit as st
+
+from utils.metrics import increment, observe_size
+from utils.artifacts import get_artifact_manager
+
+# Ceiling for one session's state; LEARNMATE_SESSION_MEMORY_MB overrides it
+SESSION_MEMORY_LIMIT = int(float(os.environ.get("LEARNMATE_SESSION_MEMORY_MB", 16)) * 2 ** 20)
+
+# Keys that may be evicted and how they come back
+RENDER = "render"
+SPILL = "spill"
+EVICTABLE_KEYS = {
+    "images": RENDER,
+    "explanation": SPILL,
+    "notes": SPILL,
+    "summary": SPILL,
+    "text_chunks": SPILL,
+    "quiz_text": SPILL,
+    "quiz_questions": SPILL,
+    "quiz_results": SPILL,
+    "quiz_history": SPILL,
+    "messages": SPILL,
+    "problems": SPILL,
+}
+
+_SPILL_ID_KEY = "_spill_id"
+_SPILLED_KEY = "_spilled_keys"
+
+
+class SpilledValue:
+    """Stand-in for an evicted value: empty, falsy and printable as an empty string"""
+
+    def __init__(self, key):
+        self.key = key
+
+    def __bool__(self):
+        return False
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+    def __str__(self):
+        return ""
+
+    def __repr__(self):
+        return f"<spilled {self.key}>"
+
+
+def estimate_size(obj, _seen=None):
+    """Approximate bytes held by an object, following containers and counting image pixel buffers"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, SpilledValue):
+        return 0
+    if type(obj).__module__.startswith("PIL.") and hasattr(obj, "getbands"):
+        return sys.getsizeof(obj) + obj.width * obj.height * len(obj.getbands())
+    memory_usage = getattr(obj, "memory_usage", None)
+    if callable(memory_usage) and hasattr(obj, "columns"):
+        # pandas DataFrame
+        return int(memory_usage(deep=True).sum())
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        # numpy array
+        return nbytes
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    return size
+
+
+def session_memory_report(state=None):
+    """Bytes per session_state key, largest first, with eviction status"""
+    state = st.session_state if state is None else state
+    spilled = state.get(_SPILLED_KEY, {}) if hasattr(state, "get") else {}
+    rows = []
+    for key in list(state.keys()):
+        if key in (_SPILL_ID_KEY, _SPILLED_KEY):
+            continue
+        value = state[key]
+        rows.append({
+            "key": key,
+            "bytes": estimate_size(value),
+            "evictable": key in EVICTABLE_KEYS,
+            "evicted": isinstance(value, SpilledValue) and key in spilled,
+        })
+    return sorted(rows, key=lambda row: row["bytes"], reverse=True)
+
+
+def get_spill_dir(create=True):
+    """Directory holding this session's evicted values"""
+    spill_id = st.session_state.get(_SPILL_ID_KEY)
+    if spill_id is None:
+        spill_id = st.session_state[_SPILL_ID_KEY] = uuid.uuid4().hex
+    manager = get_artifact_manager()
+    if not create:
+        return os.path.join(manager.scratch_dir, "session_spill", spill_id)
+    # Tracked as a session-owned artifact, so it is swept once the session goes idle
+    return manager.scratch_subdir("session_spill", spill_id)
+
+
+def evict(key):
+    """Release one session_state value, spilling it to disk if it cannot be rebuilt"""
+    value = st.session_state.get(key)
+    if value is None or isinstance(value, SpilledValue):
+        return 0
+    size = estimate_size(value)
+    path = None
+    if EVICTABLE_KEYS.get(key) == SPILL:
+        path = os.path.join(get_spill_dir(), f"{key}.pkl")
+        with open(path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    spilled = st.session_state.get(_SPILLED_KEY, {})
+    spilled[key] = path
+    st.session_state[_SPILLED_KEY] = spilled
+    st.session_state[key] = SpilledValue(key)
+    increment("session_evictions_total", key=key)
+    return size
+
+
+def rehydrate(key):
+    """Bring an evicted value back into session_state (a value assigned since eviction wins)"""
+    spilled = st.session_state.get(_SPILLED_KEY, {})
+    if key not in spilled:
+        return
+    path = spilled.pop(key)
+    if isinstance(st.session_state.get(key), SpilledValue):
+        if EVICTABLE_KEYS.get(key) == RENDER:
+            from utils.image_utils import generate_placeholder_images
+            st.session_state[key] = generate_placeholder_images(st.session_state.get('image_descriptions') or [])
+        elif path and os.path.exists(path):
+            with open(path, "rb") as f:
+                st.session_state[key] = pickle.load(f)
+        else:
+            # Swept while the session was idle; let the page's init code start afresh
+            del st.session_state[key]
+            increment("session_spill_lost_total", key=key)
+            return
+        increment("session_rehydrations_total", key=key)
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def manage_session_memory(needed=(), limit=None):
+    """Rehydrate the keys this page reads, then evict other heavy keys while over the ceiling"""
+    limit = SESSION_MEMORY_LIMIT if limit is None else limit
+    get_artifact_manager().touch()
+    for key in needed:
+        rehydrate(key)
+
+    report = session_memory_report()
+    total = sum(row["bytes"] for row in report)
+    observe_size("session_state_bytes", total)
+    for row in report:
+        if total <= limit:
+            break
+        if row["evictable"] and not row["evicted"] and row["key"] not in needed:
+            total -= evict(row["key"])
+    return total
+
+
+def clear_spilled():
+    """Drop every evicted value of this session (e.g. when its data is deleted)"""
+    st.session_state[_SPILLED_KEY] = {}
+    spill_dir = get_spill_dir(create=False)
+    if os.path.isdir(spill_dir):
+        shutil.rmtree(spill_dir, ignore_errors=True)
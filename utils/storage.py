@@ -4,7 +4,12 @@ import os
 import json
 import streamlit as st
 from datetime import datetime
+from collections import deque
+import sqlite3
 import tempfile
+import threading
+
+from utils.metrics import span, observe_size
 
 
 # Create data directory if it doesn't exist
@@ -21,6 +26,42 @@ def ensure_data_dir():
     return data_dir, user_sessions_dir
 
 
+def atomic_write(path, data):
+    """Replace path with text or bytes through a private temporary file, so readers never see a partial file"""
+    binary = isinstance(data, bytes)
+    with tempfile.NamedTemporaryFile("wb" if binary else "w", dir=os.path.dirname(path),
+                                     prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False,
+                                     **({} if binary else {"encoding": "utf-8"})) as f:
+        tmp_path = f.name
+        try:
+            f.write(data)
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+_db_local = threading.local()
+
+
+def connect_db(name, schema):
+    """Return this thread's connection to the SQLite database <data dir>/<name>, creating its schema on first use"""
+    data_dir, _ = ensure_data_dir()
+    path = os.path.join(data_dir, name)
+    connections = getattr(_db_local, "connections", None)
+    if connections is None:
+        connections = _db_local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(schema)
+        connections[path] = conn
+    return conn
+
+
 def save_session(session_id, session_data):
     """Save session data to file"""
     try:
@@ -29,8 +70,13 @@ def save_session(session_id, session_data):
         # Create a file for this session
         session_file = os.path.join(user_sessions_dir, f"{session_id}.json")
 
-        with open(session_file, 'w') as f:
-            json.dump(session_data, f)
+        with span("storage.save"), open(session_file, 'w') as f:
+            payload = json.dumps(session_data)
+            f.write(payload)
+        observe_size("session_payload_bytes", len(payload), op="save")
+
+        # Keep the local indexes in sync with what was just saved
+        _index_saved_session(session_id, session_data)
 
         return True
     except Exception as e:
@@ -38,6 +84,27 @@ def save_session(session_id, session_data):
         return False
 
 
+def session_exists(session_id):
+    """Check whether a session has been saved"""
+    _, user_sessions_dir = ensure_data_dir()
+    return os.path.exists(os.path.join(user_sessions_dir, f"{session_id}.json"))
+
+
+def _index_saved_session(session_id, session_data):
+    """Update the search and retrieval indexes for a saved session without failing the save"""
+    try:
+        from utils.search_index import index_session
+        index_session(session_id, session_data)
+    except Exception as e:
+        st.warning(f"Could not index session for search: {e}")
+
+    try:
+        from utils.retrieval import index_session
+        index_session(session_id, session_data)
+    except Exception as e:
+        st.warning(f"Could not index session for retrieval: {e}")
+
+
 def load_session(session_id):
     """Load session data from file"""
     try:
@@ -50,8 +117,10 @@ def load_session(session_id):
             st.warning(f"Session file not found: {session_id}")
             return False
 
-        with open(session_file, 'r') as f:
-            session_data = json.load(f)
+        with span("storage.load"), open(session_file, 'r') as f:
+            payload = f.read()
+            session_data = json.loads(payload)
+        observe_size("session_payload_bytes", len(payload), op="load")
 
         # Update session state with loaded data
         st.session_state.current_topic = session_data.get('topic', '')
@@ -65,20 +134,35 @@ def load_session(session_id):
             st.session_state.image_descriptions = session_data['image_descriptions']
             st.session_state.images = generate_placeholder_images(session_data['image_descriptions'])
 
+        # Pre-generated quizzes can be taken without another model call
+        st.session_state.quiz_text = session_data.get('quiz', '')
+
+        # Reuse narration stored with the session when every part is still on disk
+        audio_files = session_data.get('audio_files') or []
+        if audio_files and all(os.path.exists(path) for path in audio_files):
+            from utils.audio_utils import split_text_into_chunks
+
+            st.session_state.audio_file = audio_files[0]
+            st.session_state.audio_files = audio_files
+            st.session_state.text_chunks = split_text_into_chunks(st.session_state.explanation)
+            st.session_state.has_multiple_chunks = len(audio_files) > 1
+
         # Generate fresh audio file based on the explanation
-        if st.session_state.explanation:
+        elif st.session_state.explanation:
             from utils.audio_utils import generate_audio, split_text_into_chunks
+            from utils.preferences import preference
 
             text = st.session_state.explanation
             text_chunks = split_text_into_chunks(text)
+            st.session_state.audio_files = []
 
             if len(text_chunks) == 1:
-                st.session_state.audio_file = generate_audio(text, "en-US", 1.0)
+                st.session_state.audio_file = generate_audio(text, "en-US", preference("speech_speed"))
                 st.session_state.has_multiple_chunks = False
             else:
                 # For longer text, only generate audio for the first chunk
                 first_chunk = text_chunks[0]
-                st.session_state.audio_file = generate_audio(first_chunk, "en-US", 1.0)
+                st.session_state.audio_file = generate_audio(first_chunk, "en-US", preference("speech_speed"))
                 st.session_state.text_chunks = text_chunks
                 st.session_state.has_multiple_chunks = True
 
@@ -115,4 +199,172 @@ def get_session_list():
         return sessions
     except Exception as e:
         st.error(f"Error listing sessions: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def get_usage_statistics(user_id=None):
+    """Get aggregated study statistics from the event log rollups"""
+    try:
+        from utils.analytics import get_usage_summary
+        return get_usage_summary(user_id or st.session_state.get('user_id', 'anonymous'))
+    except Exception as e:
+        st.error(f"Error loading usage statistics: {e}")
+        return {}
+
+
+def _user_log_path(kind, user_id):
+    """Per-user JSON Lines file under <data dir>/<kind>/"""
+    data_dir, _ = ensure_data_dir()
+    log_dir = os.path.join(data_dir, kind)
+    os.makedirs(log_dir, exist_ok=True)
+    return os.path.join(log_dir, f"{user_id}.jsonl")
+
+
+def _practice_history_path(user_id):
+    return _user_log_path("practice_history", user_id)
+
+
+def _chat_history_path(user_id):
+    return _user_log_path("chat_history", user_id)
+
+
+_log_locks = {}
+_log_locks_guard = threading.Lock()
+
+
+def log_lock(path):
+    """Lock held while appending to, rewriting or deleting a per-user JSON Lines log"""
+    with _log_locks_guard:
+        return _log_locks.setdefault(path, threading.Lock())
+
+
+def iter_jsonl(path):
+    """Yield the records of a JSON Lines file one at a time (nothing if it does not exist)"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A line torn by a crash mid-append
+                    continue
+
+
+def user_session_ids(user_id):
+    """Ids of the user's saved study sessions (session ids start with the user id)"""
+    _, user_sessions_dir = ensure_data_dir()
+    prefix = f"{user_id}_"
+    with os.scandir(user_sessions_dir) as entries:
+        return [entry.name[:-len('.json')] for entry in entries
+                if entry.name.startswith(prefix) and entry.name.endswith('.json')]
+
+
+def iter_user_sessions(user_id):
+    """Yield (session_id, session data) for the user's saved study sessions, one file at a time"""
+    _, user_sessions_dir = ensure_data_dir()
+    for session_id in user_session_ids(user_id):
+        try:
+            with open(os.path.join(user_sessions_dir, f"{session_id}.json"), 'r') as f:
+                yield session_id, json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+
+
+def save_practice_session(session_data, user_id=None):
+    """Append a graded practice session to the user's history"""
+    try:
+        path = _practice_history_path(user_id or st.session_state.get('user_id', 'anonymous'))
+        with log_lock(path), open(path, 'a') as f:
+            f.write(json.dumps(session_data) + "\n")
+        return True
+    except Exception as e:
+        st.error(f"Error saving practice session: {e}")
+        return False
+
+
+def get_practice_history(user_id=None):
+    """Get the user's graded practice sessions, oldest first"""
+    try:
+        path = _practice_history_path(user_id or st.session_state.get('user_id', 'anonymous'))
+        return list(iter_jsonl(path))
+    except Exception as e:
+        st.error(f"Error loading practice history: {e}")
+        return []
+
+
+def save_visual_aid(topic, visual_type, content, user_id=None):
+    """Save an image ("image") or mind map record ("mind_map") to the user's visuals; returns its id"""
+    try:
+        from utils.visual_store import save_visual
+        return save_visual(user_id or st.session_state.get('user_id', 'anonymous'), topic, visual_type, content)
+    except Exception as e:
+        st.error(f"Error saving visual: {e}")
+        return None
+
+
+def get_user_visuals(visual_type=None, page=0, page_size=None, user_id=None):
+    """One page of the user's saved visuals (metadata only, newest first) and the total count"""
+    try:
+        from utils.visual_store import list_visuals, PAGE_SIZE
+        return list_visuals(user_id or st.session_state.get('user_id', 'anonymous'), visual_type, page,
+                            page_size or PAGE_SIZE)
+    except Exception as e:
+        st.error(f"Error loading saved visuals: {e}")
+        return [], 0
+
+
+def delete_user_visual(visual_id, user_id=None):
+    """Delete one of the user's saved visuals"""
+    try:
+        from utils.visual_store import delete_visual
+        return delete_visual(user_id or st.session_state.get('user_id', 'anonymous'), visual_id)
+    except Exception as e:
+        st.error(f"Error deleting visual: {e}")
+        return False
+
+
+def save_chat_history(topic, messages, user_id=None):
+    """Append a chat conversation to the user's saved chats"""
+    try:
+        path = _chat_history_path(user_id or st.session_state.get('user_id', 'anonymous'))
+        record = {"topic": topic, "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "messages": messages}
+        with log_lock(path), open(path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        return True
+    except Exception as e:
+        st.error(f"Error saving chat: {e}")
+        return False
+
+
+def get_chat_history(user_id=None, limit=50):
+    """Get the user's most recently saved chats, newest first"""
+    try:
+        path = _chat_history_path(user_id or st.session_state.get('user_id', 'anonymous'))
+        recent = deque(iter_jsonl(path), maxlen=limit)
+        return list(reversed(recent))
+    except Exception as e:
+        st.error(f"Error loading chat history: {e}")
+        return []
+
+
+def get_user_preferences(user_id=None):
+    """Get the user's preferences, with defaults for anything never set"""
+    try:
+        from utils.preferences import load_preferences
+        return dict(load_preferences(user_id or st.session_state.get('user_id', 'anonymous'))[1])
+    except Exception as e:
+        st.error(f"Error loading preferences: {e}")
+        from utils.preferences import DEFAULT_PREFERENCES
+        return dict(DEFAULT_PREFERENCES)
+
+
+def save_user_preferences(preferences, user_id=None):
+    """Save changed preferences; open sessions of the user apply them on their next rerun"""
+    try:
+        from utils.preferences import save_preferences
+        save_preferences(user_id or st.session_state.get('user_id', 'anonymous'), preferences)
+        return True
+    except Exception as e:
+        st.error(f"Error saving preferences: {e}")
+        return False
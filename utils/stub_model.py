@@ -0,0 +1,169 @@
+# utils/stub_model.py - Offline stand-in for the Gemini model
+#
+# StubModel implements the ``generate_content(prompt)`` interface used by
+# GenerationService and answers with deterministic, correctly formatted text for
+# each prompt kind. It is used for headless runs, benchmarks and load tests;
+# benchmarks/stub_server.py installs it (and StubTTS) in a running app.
+
+import re
+import json
+import time
+import random
+import threading
+
+
+class ServiceUnavailable(RuntimeError):
+    """Injected transient failure, shaped like google.api_core's 503 error"""
+    code = 503
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _topic_of(prompt):
+    match = re.search(r"about '([^']*)'", prompt)
+    return match.group(1) if match else "the topic"
+
+
+def _count(prompt, pattern, default):
+    match = re.search(pattern, prompt)
+    return int(match.group(1)) if match else default
+
+
+def stub_quiz(topic, num_questions):
+    blocks = []
+    for i in range(1, num_questions + 1):
+        blocks.append(
+            f"Q{i}: Which statement about {topic} is correct (question {i})?\n"
+            f"A. The first key idea of {topic}\n"
+            f"B. An unrelated claim\n"
+            f"C. A common misconception\n"
+            f"D. None of the above\n"
+            f"Correct Answer: A"
+        )
+    return "\n\n".join(blocks)
+
+
+def stub_explanation(topic, paragraphs=6):
+    return "\n\n".join(
+        f"Part {i + 1} of {topic}: this section explains an important concept of {topic}, "
+        f"gives an example of how it is used, and connects it to the previous ideas."
+        for i in range(paragraphs)
+    )
+
+
+def stub_study_materials(topic, num_images, num_questions):
+    materials = {
+        "notes": f"# {topic}\n\n## Definitions\n- Core idea of {topic}\n\n## Key points\n1. First point\n2. Second point",
+        "summary": "\n".join(f"- Key takeaway {i} about {topic}" for i in range(1, 6)),
+        "image_descriptions": [f"A labelled diagram of concept {i} of {topic}" for i in range(1, num_images + 1)],
+    }
+    if num_questions:
+        materials["quiz"] = [
+            {"question": f"Which statement about {topic} is correct (question {i})?",
+             "options": {"A": f"The first key idea of {topic}", "B": "An unrelated claim",
+                         "C": "A common misconception", "D": "None of the above"},
+             "correct_answer": "A"}
+            for i in range(1, num_questions + 1)
+        ]
+    return "```json\n" + json.dumps(materials, indent=2) + "\n```"
+
+
+def stub_mind_map(topic, depth):
+    def branch(label, level):
+        children = [branch(f"{label}.{i}", level + 1) for i in range(1, 4)] if level < depth else []
+        return {"label": label, "children": children}
+    tree = branch(topic, 0)
+    for i, child in enumerate(tree["children"], 1):
+        child["label"] = f"Key concept {i} of {topic}"
+    return json.dumps(tree)
+
+
+def stub_practice_set(topic, num_problems, problem_type=None, batch=0):
+    kinds = {"multiple": "multiple_choice", "short": "short_answer", "calculation": "calculation", "essay": "essay"}
+    problem_type = kinds.get(problem_type, problem_type)
+    problems = []
+    for i in range(1, num_problems + 1):
+        kind = problem_type or ("multiple_choice", "short_answer", "calculation", "essay")[(i - 1) % 4]
+        problem = {"type": kind, "question": f"Problem {batch}.{i} about {topic} ({kind.replace('_', ' ')})",
+                   "hints": [f"Recall the definition used in part {i}."], "solution": "Work it through step by step."}
+        if kind == "multiple_choice":
+            problem.update(options=[f"The first key idea of {topic}", "An unrelated claim",
+                                    "A common misconception", "None of the above"], answer="A")
+        elif kind == "calculation":
+            problem.update(answer=str(i * 12.5), tolerance=0.1)
+        else:
+            problem["answer"] = f"The key idea of {topic}"
+        problems.append(problem)
+    return json.dumps(problems)
+
+
+class StubModel:
+    """Deterministic local model with optional latency and failure injection"""
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def respond(self, prompt):
+        """Build the canned reply for a prompt"""
+        topic = _topic_of(prompt)
+        if "single JSON object" in prompt:
+            return stub_study_materials(topic, _count(prompt, r'"image_descriptions": \[(\d+) ', 3),
+                                        _count(prompt, r'"quiz": \[(\d+) ', 0))
+        if "Build a mind map" in prompt:
+            return stub_mind_map(topic, _count(prompt, r"tree (\d+) level", 3))
+        if "JSON array of practice problems" in prompt:
+            kind = re.search(r"practice (\w+) problems", prompt)
+            return stub_practice_set(topic, _count(prompt, r"Create (\d+) ", 5),
+                                     kind.group(1) if kind and kind.group(1) != "problems" else None,
+                                     batch=self.calls)
+        if "multiple-choice quiz" in prompt:
+            return stub_quiz(topic, _count(prompt, r"Create (\d+) multiple-choice", 5))
+        if "descriptions for educational diagrams" in prompt:
+            count = _count(prompt, r"Create (\d+) detailed descriptions", 3)
+            return "\n".join(f"{i}. A labelled diagram of concept {i} of {topic}" for i in range(1, count + 1))
+        if "practice problems" in prompt:
+            count = _count(prompt, r"Create (\d+) ", 3)
+            return "\n\n".join(f"Problem {i}: Apply {topic} to a new case.\nSolution: Work it through step by step."
+                               for i in range(1, count + 1))
+        if "bullet-point summary" in prompt:
+            return "\n".join(f"- Key takeaway {i} about {topic}" for i in range(1, 6))
+        if "structured study notes" in prompt:
+            return f"# {topic}\n\n## Definitions\n- Core idea of {topic}\n\n## Key points\n1. First point\n2. Second point"
+        if "You are a tutor" in prompt:
+            return f"Good question! Here is a short answer about {topic}."
+        return stub_explanation(topic)
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ServiceUnavailable("503 Service Unavailable (stub)")
+        return StubResponse(self.respond(prompt))
+
+
+class StubTTS:
+    """gTTS-compatible stand-in that writes a tiny placeholder file instead of calling the TTS service"""
+
+    def __init__(self, text, lang="en", slow=False, latency=0.0):
+        self.text = text
+        self.lang = lang
+        self.slow = slow
+        self.latency = latency
+
+    def save(self, path):
+        if self.latency:
+            time.sleep(self.latency)
+        with open(path, "wb") as f:
+            f.write(b"ID3stub " + self.text[:64].encode("utf-8", "ignore"))
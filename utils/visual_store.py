@@ -0,0 +1,226 @@
+# utils/visual_store.py - Saved visual aids and mind maps
+#
+# Assets are stored once per content hash under <data dir>/visuals/<hash>.<ext>
+# (PNG for images, JSON {hash, style, tree} for mind maps), next to a small
+# thumbnail rendered at save time. Metadata lives in SQLite, indexed by user,
+# type and date, so the gallery lists one page of rows and reads only thumbnails;
+# the full asset is loaded when a single visual is opened.
+
+import io
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+
+from utils.storage import ensure_data_dir, connect_db, atomic_write
+from utils.bootstrap import lazy_import
+from utils.metrics import span
+
+Image = lazy_import("PIL.Image")
+
+VISUAL_TYPES = ("image", "mind_map")
+
+# Longest edge of image thumbnails, in pixels
+THUMBNAIL_SIZE = 320
+# Mind-map thumbnails show the root and its first level of branches
+THUMBNAIL_MAP_DEPTH = 1
+
+PAGE_SIZE = 12
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS visuals (
+    visual_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    type TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    created_ts REAL NOT NULL,
+    UNIQUE (user_id, type, content_hash)
+);
+CREATE INDEX IF NOT EXISTS visuals_by_user ON visuals (user_id, type, created_ts);
+"""
+
+
+def _connect():
+    """Return this thread's connection to the visual metadata database"""
+    return connect_db("visuals.db", _SCHEMA)
+
+
+def _assets_dir():
+    data_dir, _ = ensure_data_dir()
+    path = os.path.join(data_dir, "visuals")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _extensions(visual_type):
+    """(asset, thumbnail) file extensions for a visual type"""
+    return (".json", ".thumb.svg") if visual_type == "mind_map" else (".png", ".thumb.png")
+
+
+def asset_paths(content_hash, visual_type):
+    """(asset path, thumbnail path) for stored content"""
+    asset_ext, thumb_ext = _extensions(visual_type)
+    base = os.path.join(_assets_dir(), content_hash)
+    return base + asset_ext, base + thumb_ext
+
+
+def _prune(tree, depth):
+    """Copy of a mind-map tree cut off below the given depth"""
+    children = [_prune(child, depth - 1) for child in tree.get("children", [])] if depth > 0 else []
+    return {"label": tree["label"], "children": children}
+
+
+def _encode(visual_type, content):
+    """Serialized asset and its thumbnail"""
+    if visual_type == "mind_map":
+        from utils.mind_map import render_svg
+
+        record = {key: content[key] for key in ("hash", "style", "tree") if key in content}
+        thumbnail = render_svg(_prune(record["tree"], THUMBNAIL_MAP_DEPTH), record.get("style", "Hierarchical"))
+        return json.dumps(record, sort_keys=True).encode(), thumbnail
+
+    if isinstance(content, bytes):
+        image = Image.open(io.BytesIO(content))
+        data = content
+    else:
+        image = content
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        data = buffer.getvalue()
+    thumbnail = image.copy()
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="PNG", optimize=True)
+    return data, buffer.getvalue()
+
+
+def save_visual(user_id, topic, visual_type, content):
+    """Store a visual (PIL image / PNG bytes, or a mind map record); returns its id.
+
+    Saving the same content twice returns the existing id.
+    """
+    if visual_type not in VISUAL_TYPES:
+        raise ValueError(f"Unknown visual type: {visual_type}")
+    with span("visuals.save", type=visual_type):
+        data, thumbnail = _encode(visual_type, content)
+        content_hash = hashlib.sha256(data).hexdigest()[:32]
+        asset_path, thumb_path = asset_paths(content_hash, visual_type)
+        if not os.path.exists(asset_path):
+            atomic_write(thumb_path, thumbnail)
+            atomic_write(asset_path, data)
+
+        conn = _connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO visuals (user_id, topic, type, content_hash, created_ts) VALUES (?, ?, ?, ?, ?)",
+                (user_id, topic, visual_type, content_hash, time.time())
+            )
+        return conn.execute(
+            "SELECT visual_id FROM visuals WHERE user_id = ? AND type = ? AND content_hash = ?",
+            (user_id, visual_type, content_hash)
+        ).fetchone()[0]
+
+
+def _metadata(row):
+    visual_id, topic, visual_type, content_hash, created_ts = row
+    return {
+        "id": visual_id,
+        "topic": topic,
+        "type": visual_type,
+        "hash": content_hash,
+        "date": datetime.fromtimestamp(created_ts).strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+def list_visuals(user_id, visual_type=None, page=0, page_size=PAGE_SIZE):
+    """One page of a user's visuals (newest first) as metadata dicts, plus the total count"""
+    where = "user_id = ?" + (" AND type = ?" if visual_type else "")
+    params = [user_id] + ([visual_type] if visual_type else [])
+    conn = _connect()
+    total = conn.execute(f"SELECT COUNT(*) FROM visuals WHERE {where}", params).fetchone()[0]
+    rows = conn.execute(
+        f"SELECT visual_id, topic, type, content_hash, created_ts FROM visuals WHERE {where} "
+        "ORDER BY created_ts DESC, visual_id DESC LIMIT ? OFFSET ?",
+        params + [page_size, page * page_size]
+    ).fetchall()
+    return [_metadata(row) for row in rows], total
+
+
+def iter_visuals(user_id, batch_size=500):
+    """Yield metadata for all of a user's visuals oldest first, reading batch_size rows at a time"""
+    conn = _connect()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT visual_id, topic, type, content_hash, created_ts FROM visuals "
+            "WHERE user_id = ? AND visual_id > ? ORDER BY visual_id LIMIT ?",
+            (user_id, last_id, batch_size)
+        ).fetchall()
+        for row in rows:
+            yield _metadata(row)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+
+def load_thumbnail(visual):
+    """Thumbnail of a listed visual: SVG text for mind maps, PNG bytes for images (None if missing)"""
+    _, thumb_path = asset_paths(visual["hash"], visual["type"])
+    if not os.path.exists(thumb_path):
+        return None
+    if visual["type"] == "mind_map":
+        with open(thumb_path, encoding="utf-8") as f:
+            return f.read()
+    with open(thumb_path, "rb") as f:
+        return f.read()
+
+
+def load_visual(visual):
+    """Full asset of a listed visual: the mind map record or PNG bytes (None if missing)"""
+    asset_path, _ = asset_paths(visual["hash"], visual["type"])
+    if not os.path.exists(asset_path):
+        return None
+    with span("visuals.load", type=visual["type"]):
+        if visual["type"] == "mind_map":
+            with open(asset_path, encoding="utf-8") as f:
+                return json.load(f)
+        with open(asset_path, "rb") as f:
+            return f.read()
+
+
+def _remove_unreferenced(conn, assets):
+    """Delete the files of (content hash, type) pairs no saved visual refers to any more"""
+    for content_hash, visual_type in assets:
+        shared = conn.execute("SELECT 1 FROM visuals WHERE content_hash = ? AND type = ? LIMIT 1",
+                              (content_hash, visual_type)).fetchone()
+        if shared is None:
+            for path in asset_paths(content_hash, visual_type):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def delete_user_visuals(user_id):
+    """Delete all of a user's visuals in one statement, then the files nobody else saved"""
+    conn = _connect()
+    with conn:
+        assets = conn.execute("SELECT DISTINCT content_hash, type FROM visuals WHERE user_id = ?",
+                              (user_id,)).fetchall()
+        deleted = conn.execute("DELETE FROM visuals WHERE user_id = ?", (user_id,)).rowcount
+    _remove_unreferenced(conn, assets)
+    return deleted
+
+
+def delete_visual(user_id, visual_id):
+    """Delete one of a user's visuals, and its files once no saved visual refers to them"""
+    conn = _connect()
+    row = conn.execute("SELECT type, content_hash FROM visuals WHERE visual_id = ? AND user_id = ?",
+                       (visual_id, user_id)).fetchone()
+    if row is None:
+        return False
+    visual_type, content_hash = row
+    with conn:
+        conn.execute("DELETE FROM visuals WHERE visual_id = ?", (visual_id,))
+    _remove_unreferenced(conn, [(content_hash, visual_type)])
+    return True